@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark of record normalization for the CSV merge: the per-record
+process_record path against the column batches of lib.batch_normalizer.
+
+Usage: python benchmark_normalization.py [--records 200000] [--repeat 3]
+"""
+
+import argparse
+import csv
+import io
+import random
+import time
+from typing import Any, Callable, Dict, List
+
+from lib.batch_normalizer import (
+    URL_LIST_FIELDS,
+    iter_batches,
+    join_lists,
+    normalize_batch,
+)
+from merge_to_csv import process_record
+
+FIELDNAMES = [
+    "address",
+    "brochure_doc_urls",
+    "city",
+    "price",
+    "property_image_urls",
+    "source_url",
+    "sqft",
+    "state",
+]
+
+
+def make_records(count: int, seed: int = 7) -> List[Dict[str, Any]]:
+    """Synthetic records shaped like extracted listings across a few brokers."""
+    rng = random.Random(seed)
+    hosts = [f"https://www.broker{n}.com" for n in range(20)]
+    records = []
+    for index in range(count):
+        host = rng.choice(hosts)
+        images = [
+            rng.choice(
+                (
+                    f"/media/{index}/{n}.jpg",
+                    f"//cdn.example.com/{index}/{n}.jpg",
+                    f"https://images.example.com/{index}/{n}.jpg",
+                )
+            )
+            for n in range(rng.randint(0, 8))
+        ]
+        records.append(
+            {
+                "address": None if rng.random() < 0.05 else f"{index} Main St",
+                "city": "Austin",
+                "state": "TX",
+                "price": rng.choice((None, float(rng.randint(1, 9) * 100000))),
+                "sqft": rng.choice((None, float(rng.randint(500, 50000)))),
+                "property_image_urls": images,
+                "brochure_doc_urls": [f"/docs/{index}.pdf"],
+                "source_url": f"{host}/listings/{index}",
+            }
+        )
+    return records
+
+
+def per_record(records: List[Dict[str, Any]], out) -> int:
+    writer = csv.DictWriter(out, fieldnames=FIELDNAMES, extrasaction="ignore")
+    rows = 0
+    for record in records:
+        processed = process_record(record)
+        if processed:
+            writer.writerow(processed)
+            rows += 1
+    return rows
+
+
+def batched(records: List[Dict[str, Any]], out) -> int:
+    writer = csv.writer(out)
+    rows = 0
+    for batch in iter_batches(records):
+        normalized = normalize_batch(batch)
+        for name in URL_LIST_FIELDS:
+            if name in normalized.columns:
+                normalized.columns[name] = join_lists(normalized.columns[name])
+        writer.writerows(normalized.rows(FIELDNAMES))
+        rows += len(normalized)
+    return rows
+
+
+def best_time(function: Callable, records: List[Dict[str, Any]], repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        out = io.StringIO()
+        start = time.perf_counter()
+        rows = function(records, out)
+        best = min(best, time.perf_counter() - start)
+    return best, rows, out.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    records = make_records(args.records)
+    baseline, rows, expected = best_time(per_record, records, args.repeat)
+    candidate, batched_rows, output = best_time(batched, records, args.repeat)
+    assert rows == batched_rows and output == expected, "outputs differ"
+
+    print(f"Records: {args.records} ({rows} kept)")
+    print(f"  per-record: {baseline:.3f}s ({args.records / baseline:,.0f} records/s)")
+    print(f"  batched:    {candidate:.3f}s ({args.records / candidate:,.0f} records/s)")
+    print(f"  speedup:    {baseline / candidate:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
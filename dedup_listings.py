@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Script to merge the listings of all brokers into one record per property.
+Co-listings of the same property by several brokers are clustered and merged,
+keeping a reference to every source listing.
+"""
+
+import json
+import os
+import tempfile
+
+from lib.listing_dedup import ListingDeduplicator
+from merge_to_csv import find_data_files
+
+
+def dedup_listings(
+    output_file: str = "merged_listings.jsonl",
+    output_dir: str = "output",
+    max_image_block: int = 4,
+):
+    """
+    Write one JSON line per property, merged from every broker listing it.
+
+    Args:
+        output_file: The output JSONL file path
+        output_dir: The directory holding one subdirectory per key
+        max_image_block: Image URLs shared by more records are not used to match
+    """
+    data_files = find_data_files(output_dir)
+    if not data_files:
+        print("No extracted data files found in the output directory.")
+        return
+
+    sources = [
+        (os.path.basename(os.path.dirname(data_file)), data_file)
+        for data_file in data_files
+    ]
+    print(f"Clustering listings from {len(sources)} data files...")
+    deduplicator = ListingDeduplicator(sources, max_image_block=max_image_block)
+    deduplicator.build()
+    stats = deduplicator.stats
+    print(
+        f"  {stats['records']} listings; merged {stats['url']} by url, "
+        f"{stats['address']} by address and {stats['image']} by image"
+    )
+
+    output_path = os.path.abspath(output_file)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(output_path), suffix=".tmp")
+    properties = co_listed = 0
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for record in deduplicator.iter_merged():
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                properties += 1
+                co_listed += len({source["key"] for source in record["sources"]}) > 1
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    print(
+        f"Successfully created {output_file} with {properties} properties "
+        f"({co_listed} listed by several brokers)"
+    )
+
+
+if __name__ == "__main__":
+    dedup_listings()
@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, Deque, Dict, Optional
+from urllib.parse import urlparse
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+THROTTLE_STATUSES = {429, 503}
+THROTTLE_MARKERS = (
+    "429",
+    "rate limit",
+    "rate_limit",
+    "too many requests",
+    "overloaded",
+)
+# Retry-After values beyond this are treated as a misconfigured header
+MAX_RETRY_AFTER = 300.0
+# Latency spikes are measured against this quantile of the recent successes
+BASELINE_QUANTILE = 0.25
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a ``Retry-After`` header (delta seconds or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+def retry_after_from_exception(e: BaseException) -> Optional[float]:
+    """Read ``Retry-After`` from the HTTP response attached to an SDK error."""
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is None:
+        return None
+    return parse_retry_after(headers.get("retry-after"))
+
+
+def is_throttle_error(e: BaseException) -> bool:
+    """Whether ``e`` signals overload (timeouts, 429s, 503s) rather than a bug."""
+    if isinstance(e, asyncio.TimeoutError) or type(e).__name__ in (
+        "TimeoutError",
+        "ReadTimeout",
+        "ConnectTimeout",
+        "RateLimitError",
+    ):
+        return True
+    status = getattr(e, "status_code", None) or getattr(
+        getattr(e, "response", None), "status_code", None
+    )
+    if status in THROTTLE_STATUSES:
+        return True
+    message = str(e).lower()
+    return any(marker in message for marker in THROTTLE_MARKERS)
+
+
+class _DomainState:
+    def __init__(self, limit: float, latency_window: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.latency: Optional[float] = None
+        self.recent_latencies: Deque[float] = deque(maxlen=latency_window)
+        self.last_decrease = 0.0
+        self.successes = 0
+        self.throttled = 0
+        self.decreases = 0
+        self.condition: Optional[asyncio.Condition] = None
+
+
+class Slot:
+    """Handle for one in-flight request; call ``throttled`` on a 429/503 reply."""
+
+    def __init__(self):
+        self.throttle = False
+        self.failed = False
+        self.retry_after: Optional[float] = None
+
+    def throttled(self, retry_after: Optional[float] = None) -> None:
+        self.throttle = True
+        self.retry_after = retry_after
+
+
+class AdaptiveLimiter:
+    """
+    Per-domain in-flight limits tuned by additive increase, multiplicative decrease.
+
+    Each success under ``latency_tolerance`` times the baseline latency (the
+    lower quartile of the last ``latency_window`` successes) grows the domain's
+    limit by ``1 / limit`` (about one slot per round of requests, up to
+    ``max_limit``). A timeout, 429/503 or latency spike multiplies it by
+    ``decrease_factor`` (down to ``min_limit``), at most once per round trip so
+    one burst of failures counts once. ``Retry-After`` pauses the whole domain.
+
+    Requests of different kinds to one domain (e.g. plain HTTP and browser
+    renders) pass a ``channel`` to ``slot``, so each kind gets its own limit and
+    baseline and fast requests do not make every slow one look like a spike.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: float = 2.0,
+        min_limit: float = 1.0,
+        max_limit: float = 16.0,
+        decrease_factor: float = 0.5,
+        latency_tolerance: float = 3.0,
+        latency_window: int = 20,
+    ):
+        self.name = name
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.latency_window = latency_window
+        self._domains: Dict[str, _DomainState] = {}
+        # Retry-After applies to the host, whichever channel received it
+        self._blocked_until: Dict[str, float] = {}
+
+    @staticmethod
+    def domain_of(key: str) -> str:
+        """URLs are limited per host; any other key (e.g. a model) as is."""
+        return urlparse(key).netloc.lower() or key
+
+    def _state(self, name: str) -> _DomainState:
+        state = self._domains.get(name)
+        if state is None:
+            state = self._domains[name] = _DomainState(
+                self.initial_limit, self.latency_window
+            )
+        if state.condition is None:
+            state.condition = asyncio.Condition()
+        return state
+
+    @asynccontextmanager
+    async def slot(self, key: str, channel: Optional[str] = None):
+        """Hold one of the domain's slots for the duration of a request."""
+        domain = self.domain_of(key)
+        name = f"{domain} [{channel}]" if channel else domain
+        state = self._state(name)
+        while True:
+            pause = self._blocked_until.get(domain, 0.0) - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            async with state.condition:
+                if state.in_flight < max(int(state.limit), 1):
+                    state.in_flight += 1
+                    break
+                await state.condition.wait()
+
+        slot = Slot()
+        start = time.monotonic()
+        try:
+            yield slot
+        except Exception as e:
+            if is_throttle_error(e):
+                slot.throttled(retry_after_from_exception(e))
+            else:
+                slot.failed = True
+            raise
+        finally:
+            self._record(domain, name, state, time.monotonic() - start, slot)
+            async with state.condition:
+                state.in_flight -= 1
+                state.condition.notify_all()
+
+    def _record(
+        self, domain: str, name: str, state: _DomainState, latency: float, slot: Slot
+    ) -> None:
+        now = time.monotonic()
+        if slot.retry_after:
+            self._blocked_until[domain] = max(
+                self._blocked_until.get(domain, 0.0), now + slot.retry_after
+            )
+            logger.info(f"{self.name}: pausing {domain} for {slot.retry_after:.1f}s")
+        if slot.failed:
+            # Errors unrelated to load say nothing about the right limit
+            return
+
+        # A window rather than an all-time minimum, so one unusually fast reply
+        # or a lasting change of page weight does not make every reply a spike
+        recent = sorted(state.recent_latencies)
+        baseline = recent[int(len(recent) * BASELINE_QUANTILE)] if recent else None
+        spike = baseline is not None and latency > self.latency_tolerance * baseline
+        if not slot.throttle:
+            state.successes += 1
+            state.latency = (
+                latency
+                if state.latency is None
+                else 0.8 * state.latency + 0.2 * latency
+            )
+            state.recent_latencies.append(latency)
+        else:
+            state.throttled += 1
+
+        if slot.throttle or spike:
+            # One decrease per round trip, however many requests failed in it
+            if now - state.last_decrease >= (state.latency or latency):
+                state.limit = max(self.min_limit, state.limit * self.decrease_factor)
+                state.last_decrease = now
+                state.decreases += 1
+                logger.info(
+                    f"{self.name}: {name} limit down to {state.limit:.1f} "
+                    f"({'throttled' if slot.throttle else 'latency spike'})"
+                )
+        else:
+            state.limit = min(self.max_limit, state.limit + 1.0 / state.limit)
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {
+                "limit": round(state.limit, 2),
+                "in_flight": state.in_flight,
+                "latency_seconds": round(state.latency or 0.0, 3),
+                "successes": state.successes,
+                "throttled": state.throttled,
+                "decreases": state.decreases,
+            }
+            for name, state in self._domains.items()
+        }
+
+    def log_summary(self) -> None:
+        for domain, values in self.metrics().items():
+            logger.info(
+                f"{self.name} {domain}: limit {values['limit']}, "
+                f"{values['successes']} ok, {values['throttled']} throttled, "
+                f"{values['decreases']} decreases, "
+                f"latency {values['latency_seconds']}s"
+            )
+
+
+# Shared so that every run in the process backs off from the same domains
+default_fetch_limiter = AdaptiveLimiter("fetch", initial_limit=2.0, max_limit=8.0)
+# LLM latency grows with the response length, so only large spikes count
+default_llm_limiter = AdaptiveLimiter(
+    "llm", initial_limit=4.0, max_limit=32.0, latency_tolerance=6.0
+)
@@ -0,0 +1,210 @@
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+from urllib.parse import urljoin, urlsplit
+
+from lib.structured_data import (
+    NUMBER_PATTERN,
+    SQFT_PER_SQUARE_METRE,
+    SQUARE_METRE_UNITS,
+)
+
+URL_LIST_FIELDS = ("property_image_urls", "brochure_doc_urls")
+SQFT_PER_ACRE = 43560.0
+# "$1.2M", "450k": magnitude suffix right after the number
+MAGNITUDE_PATTERN = re.compile(r"\s*(k|m|mm|mil|million|b|bn|billion)\b", re.IGNORECASE)
+MAGNITUDES = {
+    "k": 1e3,
+    "m": 1e6,
+    "mm": 1e6,
+    "mil": 1e6,
+    "million": 1e6,
+    "b": 1e9,
+    "bn": 1e9,
+    "billion": 1e9,
+}
+ACRE_PATTERN = re.compile(r"\b(acres?|ac)\b", re.IGNORECASE)
+SQUARE_METRE_PATTERN = re.compile(
+    "|".join(re.escape(unit) for unit in sorted(SQUARE_METRE_UNITS, key=len)[::-1])
+    + r"|square met(?:re|er)s?",
+    re.IGNORECASE,
+)
+
+
+class ColumnBatch:
+    """
+    A batch of records stored as one list per field.
+
+    Normalization then runs a tight loop per column instead of a dict copy and
+    several lookups per record. Missing fields read as None.
+    """
+
+    def __init__(self, columns: Dict[str, List[Any]], length: int):
+        self.columns = columns
+        self.length = length
+
+    @classmethod
+    def from_records(cls, records: Sequence[Dict[str, Any]]) -> "ColumnBatch":
+        names = dict.fromkeys(name for record in records for name in record)
+        columns = {name: [record.get(name) for record in records] for name in names}
+        return cls(columns, len(records))
+
+    def __len__(self) -> int:
+        return self.length
+
+    def column(self, name: str) -> List[Any]:
+        return self.columns.get(name) or [None] * self.length
+
+    def filter(self, mask: Sequence[bool]) -> "ColumnBatch":
+        """Keep the rows where ``mask`` is true."""
+        keep = [index for index, flag in enumerate(mask) if flag]
+        if len(keep) == self.length:
+            return self
+        columns = {
+            name: [values[index] for index in keep]
+            for name, values in self.columns.items()
+        }
+        return ColumnBatch(columns, len(keep))
+
+    def rows(self, fieldnames: Sequence[str]) -> Iterator[tuple]:
+        """Rows as tuples in ``fieldnames`` order."""
+        return zip(*(self.column(name) for name in fieldnames))
+
+
+def iter_batches(
+    records: Iterable[Dict[str, Any]], batch_size: int = 5000
+) -> Iterator[ColumnBatch]:
+    batch = []
+    for record in records:
+        if isinstance(record, dict):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield ColumnBatch.from_records(batch)
+                batch = []
+    if batch:
+        yield ColumnBatch.from_records(batch)
+
+
+def base_url(source_url: str) -> str:
+    """Scheme and host of ``source_url``, as merge_to_csv's ``extract_base_url``."""
+    if not source_url:
+        return ""
+    # Memoize on everything before the path, which is shared by a whole site
+    if source_url.startswith(("http://", "https://")):
+        end = source_url.find("/", 8)
+        if end != -1:
+            source_url = source_url[:end]
+    return _base_url(source_url)
+
+
+@lru_cache(maxsize=65536)
+def _base_url(source_url: str) -> str:
+    parsed = urlsplit(source_url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+def resolve_url(url: str, base: str) -> str:
+    """Make ``url`` absolute against ``base``, leaving absolute URLs untouched."""
+    if not url or url.startswith(("http://", "https://")):
+        return url
+    if url.startswith("//"):
+        return f"{base.split(':', 1)[0]}:{url}"
+    # Root-relative paths without dot segments are what urljoin would return
+    if url[0] == "/" and "/." not in url and base.startswith("http"):
+        return base + url
+    return urljoin(base, url)
+
+
+def _parse_number(value: Any) -> Optional[float]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if not isinstance(value, str):
+        return None
+    return _parse_number_text(value)
+
+
+@lru_cache(maxsize=65536)
+def _parse_number_text(text: str) -> Optional[float]:
+    """First number in ``text``, scaled by a magnitude suffix such as "M"."""
+    match = NUMBER_PATTERN.search(text)
+    if not match:
+        return None
+    try:
+        number = float(match.group().replace(",", ""))
+    except ValueError:
+        return None
+    suffix = MAGNITUDE_PATTERN.match(text, match.end())
+    if suffix:
+        number *= MAGNITUDES[suffix.group(1).lower()]
+    return number
+
+
+def parse_price(value: Any) -> Optional[float]:
+    """USD amount of ``value``, e.g. ``"$1.2M"`` -> 1200000.0; None if absent."""
+    return _parse_number(value)
+
+
+def parse_sqft(value: Any) -> Optional[float]:
+    """Square feet of ``value``, converting acres and square metres."""
+    if not isinstance(value, str):
+        return _parse_number(value)
+    return _parse_sqft_text(value)
+
+
+@lru_cache(maxsize=65536)
+def _parse_sqft_text(text: str) -> Optional[float]:
+    number = _parse_number_text(text)
+    if number is None:
+        return None
+    if ACRE_PATTERN.search(text):
+        return round(number * SQFT_PER_ACRE, 2)
+    if SQUARE_METRE_PATTERN.search(text):
+        return round(number * SQFT_PER_SQUARE_METRE, 2)
+    return number
+
+
+def _normalize_numbers(values: List[Any], parse) -> List[Any]:
+    # Already numeric columns, the common case, pass through untouched
+    if all(value is None or type(value) is float for value in values):
+        return values
+    return [parse(value) for value in values]
+
+
+def _resolve_url_lists(values: List[Any], bases: List[str]) -> List[Any]:
+    resolved = []
+    for urls, base in zip(values, bases):
+        if isinstance(urls, list) and urls:
+            urls = [resolve_url(url, base) for url in urls]
+        resolved.append(urls)
+    return resolved
+
+
+def normalize_batch(batch: ColumnBatch) -> ColumnBatch:
+    """
+    Normalize a batch the way merge_to_csv's ``process_record`` does.
+
+    Rows without an address are dropped, relative image and brochure URLs are
+    resolved against the host of ``source_url``, and price and sqft strings are
+    parsed into numbers. Lists stay lists; joining them is up to the writer.
+    """
+    batch = batch.filter([bool(address) for address in batch.column("address")])
+    if not batch.length:
+        return batch
+
+    columns = dict(batch.columns)
+    bases = [base_url(url or "") for url in batch.column("source_url")]
+    for name in URL_LIST_FIELDS:
+        if name in columns:
+            columns[name] = _resolve_url_lists(columns[name], bases)
+    if "price" in columns:
+        columns["price"] = _normalize_numbers(columns["price"], parse_price)
+    if "sqft" in columns:
+        columns["sqft"] = _normalize_numbers(columns["sqft"], parse_sqft)
+    return ColumnBatch(columns, batch.length)
+
+
+def join_lists(values: List[Any], separator: str = "\n") -> List[Any]:
+    """Join list cells into strings for CSV output."""
+    return [
+        separator.join(value) if isinstance(value, list) else value for value in values
+    ]
@@ -1,14 +1,23 @@
 import asyncio
-import fcntl
 import logging
 import os
-import random
-from typing import List, Optional
+import time
+from typing import List, Optional, Tuple
 from urllib.parse import urljoin
 
-from playwright.async_api import Browser, ElementHandle, Page
+from playwright.async_api import Browser, BrowserContext, ElementHandle, Page
 
+from lib.crawl_checkpoint import (
+    CheckpointStore,
+    PaginationCheckpoint,
+    fingerprint_links,
+)
+from lib.incremental_crawl import IncrementalCrawlTracker
+from lib.request_interception import LIGHTWEIGHT_CONTEXT_OPTIONS, RequestInterceptor
 from lib.schema import WebElement, WebSearchSchema
+from lib.url_canonicalizer import CanonicalUrlIndex
+from lib.url_writer import UrlWriter
+from lib.wait_strategies import PageSettler
 
 # Configure logging
 logging.basicConfig(
@@ -17,31 +26,90 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 TIMEOUT = 30000
-
-FIVE_SECOND_WAIT = random.uniform(4, 6)
+# How long to wait for XHR pagination to replace the detail links after a
+# next page click before treating the page as a repeat
+PAGE_CHANGE_TIMEOUT = 10000
+
+# Resolves every detail link href in a single evaluate call, skipping empty,
+# fragment-only and javascript: links
+EXTRACT_HREFS_SCRIPT = """
+(xpath) => {
+    const result = document.evaluate(
+        xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null
+    );
+    const hrefs = [];
+    for (let i = 0; i < result.snapshotLength; i++) {
+        const node = result.snapshotItem(i);
+        const raw = node.getAttribute ? node.getAttribute("href") : null;
+        const href = raw ? raw.trim() : "";
+        if (!href || href === "#" || href.toLowerCase().startsWith("javascript:")) {
+            continue;
+        }
+        try {
+            hrefs.push(new URL(href, document.baseURI).href);
+        } catch (e) {
+            continue;
+        }
+    }
+    return { count: result.snapshotLength, hrefs: hrefs };
+}
+"""
 
 
 class BrowserAutomation:
     def __init__(
         self,
-        browser: Browser,
+        browser: Optional[Browser],
         schema: WebSearchSchema,
         output_path: str,
+        settler: Optional[PageSettler] = None,
+        context: Optional[BrowserContext] = None,
+        incremental: bool = False,
+        stop_after_known_pages: int = 3,
     ):
         self.schema = schema
         self.browser = browser
+        # A context supplied by the caller (e.g. a BrowserPool) is owned by it
+        self.context = context
+        self._owns_context = context is None
+        self.interceptor = RequestInterceptor(schema.resource_policy)
+        self.url_index = CanonicalUrlIndex(output_path)
+        self.url_writer = UrlWriter(
+            os.path.join(output_path, "extracted_urls.txt"),
+            canonicalize=self.url_index.canonical,
+        )
+        self.checkpoints = CheckpointStore(output_path)
+        # Refresh crawls start from page 1 and stop once pages hold only known URLs
+        self.incremental = (
+            IncrementalCrawlTracker(
+                self.url_writer.path,
+                stop_after_known_pages,
+                canonicalize=self.url_index.canonical,
+            )
+            if incremental
+            else None
+        )
         self.main_page = None
         self.output_path = output_path
+        self.settler = settler or PageSettler()
         self.logger = logger
 
     async def execute(self):
         try:
+            await self.url_writer.start()
             self.main_page = await self._create_new_page()
 
-            await self.execute_search_and_save()
+            await self.execute_search_and_save(resume=self.incremental is None)
         finally:
+            await self.url_writer.close()
+            if self.incremental:
+                self.incremental.save_report(self.output_path)
+            self.settler.log_summary()
+            self.interceptor.log_summary()
             if self.main_page:
                 await self.main_page.close()
+            if self._owns_context and self.context:
+                await self.context.close()
 
     async def click_element(
         self, web_element: WebElement, current_page: Optional[Page] = None
@@ -56,6 +124,7 @@ class BrowserAutomation:
                 f"Element not found for click: {web_element.element_description}"
             )
 
+        await self.settler.before_action(current_page.url)
         await element.click()
         await current_page.wait_for_load_state("domcontentloaded", timeout=TIMEOUT)
 
@@ -67,12 +136,13 @@ class BrowserAutomation:
         self,
         steps: List[WebElement],
     ):
+        # The page is settled after navigation and after every step, so no
+        # extra wait is needed before a step
         for step in steps:
-            await asyncio.sleep(FIVE_SECOND_WAIT)
             try:
                 self.logger.info(f"Executing step: {step}")
                 await self.click_element(step)
-                await asyncio.sleep(FIVE_SECOND_WAIT)
+                await self.settler.settle(self.main_page)
             except Exception as e:
                 self.logger.error(f"Error executing step {step}: {e!s}")
                 continue
@@ -81,8 +151,9 @@ class BrowserAutomation:
         self,
         schema: WebSearchSchema,
     ):
+        await self.settler.before_action(schema.search_page_url)
         await self.main_page.goto(schema.search_page_url)
-        await asyncio.sleep(FIVE_SECOND_WAIT)
+        await self.settler.settle(self.main_page)
         await self.execute_steps(schema.pre_search_steps)
         if schema.do_perform_search:
             await self.click_element(schema.submit_button)
@@ -102,14 +173,15 @@ class BrowserAutomation:
         limit: Optional[int] = None,
         start_page: Optional[int] = 1,
         max_concurrent: int = 10,  # Control concurrent processing
+        resume: bool = True,
     ):
         search_schema = self.schema
         detail_xpath = search_schema.detail_page_link.xpath
 
-        page = start_page
+        page = 1
         total_processed = 0
         retry_count = 0
-        previous_page_detail_link_hrefs = []
+        previous_fingerprint = None
         # if search_schema.is_search_paginated and (
         #     search_schema.start_date and search_schema.end_date
         # ):
@@ -117,6 +189,19 @@ class BrowserAutomation:
             schema=self.schema,
         )
         self.logger.info(f"Submitting search form for page {page}")
+        first_page_url = self.main_page.url
+        previous_page_url = first_page_url
+
+        checkpoint = self.checkpoints.load() if resume else None
+        if checkpoint and checkpoint.completed:
+            checkpoint = None
+        skip_through = max((start_page or 1) - 1, checkpoint.page if checkpoint else 0)
+        if skip_through:
+            page, previous_fingerprint = await self._resume_from(
+                checkpoint, skip_through
+            )
+            previous_page_url = self.main_page.url
+
         if True:
             while limit is None or total_processed < limit:
                 try:
@@ -124,12 +209,18 @@ class BrowserAutomation:
                     await self.main_page.wait_for_selector(
                         f"xpath={detail_xpath}", timeout=TIMEOUT
                     )
-                    detail_links = None
-                    # Get all detail links on current page
-                    detail_links = await self.main_page.query_selector_all(
-                        f"xpath={detail_xpath}"
-                    )
-                    total_links = len(detail_links)
+                    # Resolve and filter every href on the page in one round trip
+                    extracted = await self._extract_detail_hrefs(detail_xpath)
+                    if extracted is not None:
+                        total_links, hrefs = extracted
+                    else:
+                        self.logger.warning(
+                            "Bulk href extraction failed, falling back to element handles"
+                        )
+                        detail_links = await self.main_page.query_selector_all(
+                            f"xpath={detail_xpath}"
+                        )
+                        total_links = len(detail_links)
                     self.logger.info(f"Total links on page {page}: {total_links}")
 
                     if total_links == 0:
@@ -140,32 +231,59 @@ class BrowserAutomation:
 
                         if not next_button or not await next_button.is_visible():
                             self.logger.info("Reached last page")
+                            if self.incremental:
+                                self.incremental.reached_end = True
+                            self._save_checkpoint(
+                                page, previous_fingerprint, first_page_url, True
+                            )
                             break
                         page += 1
                         await self.click_element(search_schema.next_page_button)
+                        await self._wait_for_page_change(previous_fingerprint)
                         continue
 
-                    # Process links concurrently in batches
-                    for i in range(0, total_links, max_concurrent):
-                        if limit and total_processed >= limit:
-                            break
+                    fingerprint = (
+                        fingerprint_links(hrefs) if extracted is not None else None
+                    )
+                    if fingerprint and fingerprint == previous_fingerprint:
+                        # The links never changed after the next click, so the
+                        # button did not move us to a new page
+                        self.logger.info(f"Page {page} repeats the previous page")
+                        if self.incremental:
+                            self.incremental.reached_end = True
+                        self._save_checkpoint(
+                            page - 1, fingerprint, first_page_url, True
+                        )
+                        break
 
-                        batch = detail_links[i : min(i + max_concurrent, total_links)]
-                        tasks = []
-                        for link in batch:
+                    if extracted is not None:
+                        for href in hrefs:
                             if limit and total_processed >= limit:
                                 break
-
-                            task = asyncio.create_task(
-                                self.process_detail_link(
-                                    link_element=link,
-                                )
-                            )
-                            tasks.append(task)
+                            self._save_link(href)
                             total_processed += 1
+                    else:
+                        total_processed = await self._process_detail_links(
+                            detail_links, total_processed, limit, max_concurrent
+                        )
 
-                        # Wait for all tasks in the batch to complete
-                        await asyncio.gather(*tasks)
+                    self._save_checkpoint(
+                        page,
+                        fingerprint,
+                        first_page_url,
+                        False,
+                        url_addressable=page > 1
+                        and self.main_page.url != previous_page_url,
+                    )
+                    previous_fingerprint = fingerprint
+                    previous_page_url = self.main_page.url
+
+                    if self.incremental and self.incremental.end_page():
+                        self.logger.info(
+                            f"No new urls in the last "
+                            f"{self.incremental.stop_after_known_pages} pages, stopping"
+                        )
+                        break
 
                     # Move to next page
                     self.logger.info(f"Clicking next button on page {page}")
@@ -174,10 +292,14 @@ class BrowserAutomation:
                     )
                     if next_button:
                         await self.click_element(search_schema.next_page_button)
+                        await self._wait_for_page_change(fingerprint)
                         self.logger.info(f"Page {page + 1} loaded")
                         page += 1
                     else:
                         self.logger.info("Reached last page")
+                        if self.incremental:
+                            self.incremental.reached_end = True
+                        self._save_checkpoint(page, fingerprint, first_page_url, True)
                         break
 
                 except Exception as e:
@@ -187,6 +309,153 @@ class BrowserAutomation:
                         raise e
                     continue
 
+    async def _resume_from(
+        self, checkpoint: Optional[PaginationCheckpoint], skip_through: int
+    ) -> Tuple[int, Optional[str]]:
+        """
+        Move past the first ``skip_through`` results pages without harvesting them.
+
+        URL-addressable pagination jumps straight to the checkpointed page; other
+        sites are fast-forwarded with next-button clicks only. Returns the page
+        number now showing and the fingerprint of the last skipped page.
+        """
+        detail_xpath = self.schema.detail_page_link.xpath
+        page = 1
+        fingerprint = None
+
+        if (
+            checkpoint
+            and checkpoint.page == skip_through
+            and checkpoint.url_addressable
+            and checkpoint.url != self.main_page.url
+        ):
+            self.logger.info(f"Resuming at page {checkpoint.page} via {checkpoint.url}")
+            await self.settler.before_action(checkpoint.url)
+            await self.main_page.goto(checkpoint.url)
+            await self.settler.settle(self.main_page, selector=f"xpath={detail_xpath}")
+            extracted = await self._extract_detail_hrefs(detail_xpath)
+            fingerprint = fingerprint_links(extracted[1]) if extracted else None
+            if fingerprint != checkpoint.fingerprint:
+                # Listings shifted since the checkpoint; harvest this page again
+                self.logger.info("Checkpoint page changed, harvesting it again")
+                return checkpoint.page, None
+            page = checkpoint.page
+        else:
+            self.logger.info(f"Fast-forwarding through {skip_through} pages")
+            await self.settler.settle(self.main_page, selector=f"xpath={detail_xpath}")
+
+        while page <= skip_through:
+            extracted = await self._extract_detail_hrefs(detail_xpath)
+            fingerprint = fingerprint_links(extracted[1]) if extracted else None
+            await self.click_element(self.schema.next_page_button)
+            # A click before the results changed would not advance another page
+            await self._wait_for_page_change(fingerprint)
+            page += 1
+        return page, fingerprint
+
+    async def _wait_for_page_change(self, previous_fingerprint: Optional[str]) -> bool:
+        """
+        Poll until the detail links differ from the page fingerprinted as
+        ``previous_fingerprint``.
+
+        The next button may load results over XHR after ``domcontentloaded``, so
+        right after the click the links can still be the previous page's.
+        Returns False if they did not change within ``PAGE_CHANGE_TIMEOUT``.
+        """
+        if previous_fingerprint is None:
+            return True
+        detail_xpath = self.schema.detail_page_link.xpath
+        deadline = time.monotonic() + PAGE_CHANGE_TIMEOUT / 1000
+        while time.monotonic() < deadline:
+            extracted = await self._extract_detail_hrefs(detail_xpath)
+            if extracted is not None:
+                fingerprint = fingerprint_links(extracted[1])
+                if fingerprint and fingerprint != previous_fingerprint:
+                    return True
+            await asyncio.sleep(0.5)
+        self.logger.info("Detail links did not change after clicking next")
+        return False
+
+    def _save_checkpoint(
+        self,
+        page: int,
+        fingerprint: Optional[str],
+        first_page_url: str,
+        completed: bool,
+        url_addressable: bool = False,
+    ):
+        # URLs must be durable before the checkpoint claims their page is done
+        self.url_writer.flush()
+        if self.incremental:
+            # A partial refresh must not look like progress of a full crawl
+            return
+        self.checkpoints.save(
+            PaginationCheckpoint(
+                page=page,
+                url=self.main_page.url,
+                fingerprint=fingerprint,
+                first_page_url=first_page_url,
+                url_addressable=url_addressable,
+                completed=completed,
+            )
+        )
+
+    async def _process_detail_links(
+        self,
+        detail_links: List[ElementHandle],
+        total_processed: int,
+        limit: Optional[int],
+        max_concurrent: int,
+    ) -> int:
+        """Per-handle fallback used when the in-page href extraction fails."""
+        total_links = len(detail_links)
+        # Process links concurrently in batches
+        for i in range(0, total_links, max_concurrent):
+            if limit and total_processed >= limit:
+                break
+
+            batch = detail_links[i : min(i + max_concurrent, total_links)]
+            tasks = []
+            for link in batch:
+                if limit and total_processed >= limit:
+                    break
+
+                task = asyncio.create_task(
+                    self.process_detail_link(
+                        link_element=link,
+                    )
+                )
+                tasks.append(task)
+                total_processed += 1
+
+            # Wait for all tasks in the batch to complete
+            await asyncio.gather(*tasks)
+        return total_processed
+
+    async def _extract_detail_hrefs(
+        self, xpath: str
+    ) -> Optional[Tuple[int, List[str]]]:
+        """
+        Evaluate ``xpath`` in the page and return the match count and the
+        absolute, valid and de-duplicated hrefs, or None if evaluation failed.
+        """
+        try:
+            result = await self.main_page.evaluate(EXTRACT_HREFS_SCRIPT, xpath)
+        except Exception as e:
+            self.logger.error(f"Error extracting hrefs in page: {e!s}")
+            return None
+
+        return result["count"], self._filter_hrefs(result["hrefs"])
+
+    @staticmethod
+    def _filter_hrefs(hrefs: List[str]) -> List[str]:
+        # Order-preserving dedup plus the checks in-page resolution cannot cover
+        return [
+            href
+            for href in dict.fromkeys(hrefs)
+            if href.startswith(("http://", "https://"))
+        ]
+
     async def process_detail_link(
         self,
         link_element: ElementHandle,
@@ -227,8 +496,10 @@ class BrowserAutomation:
     async def _create_new_page(self) -> Page:
         """Create a new page with blocked resources"""
 
-        context = await self.browser.new_context()
-        new_page = await context.new_page()
+        if self.context is None:
+            self.context = await self.browser.new_context(**LIGHTWEIGHT_CONTEXT_OPTIONS)
+        await self.interceptor.install(self.context)
+        new_page = await self.context.new_page()
 
         return new_page
 
@@ -276,12 +547,9 @@ class BrowserAutomation:
         return True
 
     def _save_link(self, url):
-        file_path = os.path.join(
-            self.output_path,
-            "extracted_urls.txt",
-        )
-        with open(file_path, "a", encoding="utf-8") as file:
-            fcntl.flock(file, fcntl.LOCK_EX)
-            file.write(f"{url} \n")
-            fcntl.flock(file, fcntl.LOCK_UN)
-        self.logger.info(f"Saved url -> {url} to file_path : {file_path}")
+        if self.incremental:
+            self.incremental.record(url)
+        if self.url_writer.add(url):
+            self.logger.info(
+                f"Saved url -> {url} to file_path : {self.url_writer.path}"
+            )
@@ -0,0 +1,77 @@
+import hashlib
+import logging
+import os
+import tempfile
+from datetime import datetime
+from typing import Iterable, Optional
+
+from pydantic import BaseModel, Field
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+class PaginationCheckpoint(BaseModel):
+    page: int = Field(description="Last results page whose links were saved")
+    url: str = Field(description="URL of that results page")
+    fingerprint: Optional[str] = Field(
+        default=None, description="Fingerprint of the links found on that page"
+    )
+    first_page_url: Optional[str] = Field(
+        default=None, description="URL of the first results page"
+    )
+    url_addressable: bool = Field(
+        default=False, description="Whether results pages have distinct URLs"
+    )
+    completed: bool = Field(
+        default=False, description="Whether the crawl reached the last page"
+    )
+    updated_at: str = Field(default_factory=lambda: datetime.now().isoformat())
+
+
+def fingerprint_links(hrefs: Iterable[str]) -> Optional[str]:
+    """
+    Order-independent fingerprint of the links found on a results page.
+
+    None for a page without links, so two empty pages never look like the same
+    page.
+    """
+    hrefs = set(hrefs)
+    if not hrefs:
+        return None
+    digest = hashlib.sha1("\n".join(sorted(hrefs)).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+class CheckpointStore:
+    """Persists the pagination progress of a key to ``crawl_checkpoint.json``."""
+
+    def __init__(self, output_path: str):
+        self.path = os.path.join(output_path, "crawl_checkpoint.json")
+
+    def load(self) -> Optional[PaginationCheckpoint]:
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return PaginationCheckpoint.model_validate_json(f.read())
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable checkpoint {self.path}: {e!s}")
+            return None
+
+    def save(self, checkpoint: PaginationCheckpoint) -> None:
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            mode="w", dir=directory, delete=False, encoding="utf-8"
+        ) as temp_file:
+            temp_file.write(checkpoint.model_dump_json(indent=4))
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.replace(temp_file.name, self.path)
+
+    def clear(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,90 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional
+
+from lib.record_store import iter_records
+from lib.url_canonicalizer import CanonicalUrlIndex
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+class DoneIndex:
+    """
+    Set of URLs that already have an extracted record, keyed by canonical URL.
+
+    With a ``ttl`` a record older than the TTL is stale and its URL is extracted
+    again. Records written before ``extracted_at`` was stored have no age and
+    count as stale once a TTL is set.
+    """
+
+    def __init__(
+        self,
+        ttl: Optional[timedelta] = None,
+        canonicalize: Optional[Callable[[str], str]] = None,
+    ):
+        self.ttl = ttl
+        self.canonicalize = canonicalize or str.strip
+        self._extracted_at: Dict[str, Optional[datetime]] = {}
+
+    @classmethod
+    def from_record_store(
+        cls,
+        output_dir: str,
+        ttl: Optional[timedelta] = None,
+        url_index: Optional[CanonicalUrlIndex] = None,
+    ) -> "DoneIndex":
+        url_index = url_index or CanonicalUrlIndex(output_dir)
+        index = cls(ttl, canonicalize=url_index.canonical)
+        for record in iter_records(output_dir):
+            source_url = record.get("source_url")
+            if not source_url:
+                continue
+            extracted_at = _parse_timestamp(record.get("extracted_at"))
+            key = index.canonicalize(source_url)
+            previous = index._extracted_at.get(key)
+            if previous is None or (extracted_at and extracted_at > previous):
+                index._extracted_at[key] = extracted_at
+        logger.info(f"Done index holds {len(index)} urls for {output_dir}")
+        return index
+
+    def __len__(self) -> int:
+        return len(self._extracted_at)
+
+    def is_done(self, url: str, now: Optional[datetime] = None) -> bool:
+        key = self.canonicalize(url)
+        if key not in self._extracted_at:
+            return False
+        if self.ttl is None:
+            return True
+        extracted_at = self._extracted_at[key]
+        if extracted_at is None:
+            return False
+        return (now or datetime.now()) - extracted_at < self.ttl
+
+    def mark_done(self, url: str, extracted_at: Optional[datetime] = None) -> None:
+        self._extracted_at[self.canonicalize(url)] = extracted_at or datetime.now()
+
+    def pending(self, urls: Iterable[str]) -> List[str]:
+        """Return the URLs still to extract, without duplicates, in input order."""
+        now = datetime.now()
+        pending = {}
+        for url in urls:
+            url = url.strip()
+            if not url:
+                continue
+            key = self.canonicalize(url)
+            if key not in pending and not self.is_done(url, now):
+                pending[key] = url
+        return list(pending.values())
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
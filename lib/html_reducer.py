@@ -0,0 +1,260 @@
+import re
+from html import escape
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # Token counts fall back to a character based estimate
+    tiktoken = None
+
+# Subtrees that never hold listing data
+DROP_TAGS = {
+    "script",
+    "style",
+    "svg",
+    "noscript",
+    "iframe",
+    "template",
+    "canvas",
+    "object",
+    "embed",
+    "nav",
+    "footer",
+    "select",
+}
+VOID_TAGS = {
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "link",
+    "meta",
+    "source",
+    "track",
+    "wbr",
+}
+BLOCK_TAGS = {
+    "address",
+    "article",
+    "aside",
+    "blockquote",
+    "br",
+    "dd",
+    "div",
+    "dl",
+    "dt",
+    "figcaption",
+    "figure",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "header",
+    "hr",
+    "li",
+    "main",
+    "ol",
+    "p",
+    "section",
+    "table",
+    "td",
+    "th",
+    "tr",
+    "ul",
+}
+MAIN_REGION_TAGS = {"main", "article"}
+INLINE_SPACE_PATTERN = re.compile(r"[ \t]+")
+
+# Elements that wrap the page content; a banner class on them, such as
+# <body class="cookie-consent-shown">, describes page state, not a banner
+CONTENT_WRAPPER_TAGS = {"html", "body", "main", "article"}
+# Whole id/class tokens naming a banner container, such as "cookie-banner",
+# "gdpr-consent" or "onetrust-consent-sdk", but not "cookie-consent-shown"
+BANNER_TOKEN_PATTERN = re.compile(
+    r"(cookie|consent|gdpr|onetrust|newsletter)"
+    r"([-_](cookie|consent|banner|bar|notice|popup|modal|dialog|overlay|sdk|signup))*",
+    re.IGNORECASE,
+)
+# Dialogs and fixed overlays are banners if their id/class mentions these
+BANNER_KEYWORD_PATTERN = re.compile(
+    r"cookie|consent|gdpr|onetrust|newsletter", re.IGNORECASE
+)
+FIXED_POSITION_PATTERN = re.compile(r"position\s*:\s*fixed", re.IGNORECASE)
+ASSET_URL_PATTERN = re.compile(
+    r"\.(jpe?g|png|webp|gif|avif|pdf)(\?|#|$)|^(mailto|tel):", re.IGNORECASE
+)
+DATA_ATTRIBUTE_PATTERN = re.compile(
+    r"^data-.*(price|sqft|size|area|bed|bath|address|city|state|zip|lat|lng|lon|src)",
+    re.IGNORECASE,
+)
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Count tokens with tiktoken when installed, otherwise estimate them."""
+    if tiktoken is not None:
+        return len(
+            tiktoken.get_encoding("o200k_base").encode(text, disallowed_special=())
+        )
+    return len(text) // 4
+
+
+class _Reducer(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[Tuple[bool, str]] = []
+        self.found_main = False
+        self._skip_tag: Optional[str] = None
+        self._skip_depth = 0
+        self._in_json_ld = False
+        self._main_depth = 0
+        # Open non-void elements and whether their start tag was emitted
+        self._open: List[Tuple[str, bool]] = []
+
+    def handle_starttag(self, tag, attrs):
+        if self._skip_tag:
+            if tag == self._skip_tag:
+                self._skip_depth += 1
+            return
+
+        attributes = dict(attrs)
+        if tag == "script" and (attributes.get("type") or "").lower() == (
+            "application/ld+json"
+        ):
+            self._in_json_ld = True
+            self._emit('<script type="application/ld+json">', always=True)
+            return
+
+        if tag in DROP_TAGS or (tag not in VOID_TAGS and _is_banner(tag, attributes)):
+            if tag not in VOID_TAGS:
+                self._skip_tag = tag
+                self._skip_depth = 1
+            return
+
+        if tag in MAIN_REGION_TAGS:
+            self.found_main = True
+            self._main_depth += 1
+
+        if tag == "meta":
+            if attributes.get("content") and (
+                attributes.get("property")
+                or attributes.get("itemprop")
+                or attributes.get("name") in ("description", "keywords")
+            ):
+                self._emit(_render_tag(tag, attrs, keep_all=True), always=True)
+            return
+
+        kept = _render_tag(tag, attrs)
+        if kept:
+            self._emit(kept)
+        else:
+            self._emit("\n" if tag in BLOCK_TAGS else " ")
+        if tag not in VOID_TAGS:
+            self._open.append((tag, bool(kept)))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if self._skip_tag:
+            if tag == self._skip_tag:
+                self._skip_depth -= 1
+                if self._skip_depth == 0:
+                    self._skip_tag = None
+            return
+
+        if tag == "script" and self._in_json_ld:
+            self._in_json_ld = False
+            self._emit("</script>", always=True)
+            return
+
+        # Unclosed elements above the matching start tag are closed implicitly
+        if not any(open_tag == tag for open_tag, _ in self._open):
+            return
+        while self._open:
+            open_tag, kept = self._open.pop()
+            if kept:
+                self._emit(f"</{open_tag}>")
+            if open_tag in MAIN_REGION_TAGS and self._main_depth:
+                self._main_depth -= 1
+            if open_tag == tag:
+                break
+        self._emit("\n" if tag in BLOCK_TAGS else " ")
+
+    def handle_data(self, data):
+        if self._skip_tag:
+            return
+        text = WHITESPACE_PATTERN.sub(" ", data)
+        if text.strip():
+            self._emit(text, always=self._in_json_ld)
+
+    def _emit(self, text: str, always: bool = False):
+        # Parts marked as always are kept when focusing on the main region
+        self.parts.append((always or self._main_depth > 0, text))
+
+
+def _is_banner(tag: str, attributes: Dict[str, Optional[str]]) -> bool:
+    """Whether the element is a cookie, consent or newsletter banner."""
+    if tag in CONTENT_WRAPPER_TAGS:
+        return False
+    marker = f"{attributes.get('id') or ''} {attributes.get('class') or ''}"
+    if any(BANNER_TOKEN_PATTERN.fullmatch(token) for token in marker.split()):
+        return True
+    overlay = (attributes.get("role") or "").lower() in (
+        "dialog",
+        "alertdialog",
+    ) or FIXED_POSITION_PATTERN.search(attributes.get("style") or "")
+    return bool(overlay and BANNER_KEYWORD_PATTERN.search(marker))
+
+
+def _render_tag(tag: str, attrs, keep_all: bool = False) -> Optional[str]:
+    kept = []
+    for name, value in attrs:
+        if value is None:
+            continue
+        if keep_all or _keep_attribute(name, value, attrs):
+            kept.append(f'{name}="{escape(value)}"')
+    if not kept:
+        return None
+    return f"<{tag} {' '.join(kept)}>"
+
+
+def _keep_attribute(name: str, value: str, attrs) -> bool:
+    if name == "src":
+        return True
+    if name == "href":
+        return bool(ASSET_URL_PATTERN.search(value))
+    if name in ("itemprop", "itemtype"):
+        return True
+    if name == "content":
+        return any(attribute == "itemprop" for attribute, _ in attrs)
+    return bool(DATA_ATTRIBUTE_PATTERN.match(name))
+
+
+def reduce_html(html: str, focus_main: bool = False) -> str:
+    """
+    Shrink page HTML to the text and attributes relevant to ``PropertyData``.
+
+    Scripts (other than JSON-LD), styles, SVGs, navigation, footers and cookie
+    or newsletter banners are dropped, whitespace is collapsed and only image,
+    PDF, mailto and tel links, ``src``, microdata and listing-related ``data-*``
+    attributes are kept. With ``focus_main`` only the ``<main>``/``<article>``
+    region is kept when the page has one, along with meta tags and JSON-LD.
+    """
+    reducer = _Reducer()
+    reducer.feed(html)
+    reducer.close()
+
+    focus = focus_main and reducer.found_main
+    text = "".join(part for in_main, part in reducer.parts if in_main or not focus)
+    lines = (INLINE_SPACE_PATTERN.sub(" ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
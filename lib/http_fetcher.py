@@ -0,0 +1,255 @@
+import json
+import logging
+import os
+import re
+import tempfile
+from html.parser import HTMLParser
+from typing import Any, Dict, Optional
+from urllib.parse import urljoin, urlparse
+
+from lib.adaptive_limiter import THROTTLE_STATUSES, AdaptiveLimiter, parse_retry_after
+from lib.html_reducer import reduce_html
+from lib.structured_data import extract_structured_markup
+
+try:
+    import httpx
+except ImportError:  # Every domain keeps using the browser
+    httpx = None
+
+try:
+    import h2  # noqa: F401
+except ImportError:  # httpx falls back to HTTP/1.1 without the h2 package
+    h2 = None
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+FETCH_STRATEGY_FILENAME = "fetch_strategy.json"
+HTTP = "http"
+BROWSER = "browser"
+PROBE = "probe"
+
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+WORD_PATTERN = re.compile(r"\w{3,}")
+
+
+class _CanonicalLinkParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.href: Optional[str] = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag != "link" or self.href:
+            return
+        attributes = dict(attrs)
+        if "canonical" in (attributes.get("rel") or "").lower().split():
+            self.href = attributes.get("href")
+
+
+def find_canonical_link(html: str, base_url: str) -> Optional[str]:
+    """Return the absolute ``<link rel="canonical">`` target of ``html``, if any."""
+    parser = _CanonicalLinkParser()
+    parser.feed(html)
+    parser.close()
+    return urljoin(base_url, parser.href) if parser.href else None
+
+
+class HttpFetcher:
+    """Connection-pooled HTTP/2 client for pages that render without JavaScript."""
+
+    def __init__(
+        self,
+        max_connections: int = 20,
+        timeout: float = 20.0,
+        headers: Optional[Dict[str, str]] = None,
+        limiter: Optional[AdaptiveLimiter] = None,
+    ):
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.headers = headers or DEFAULT_HEADERS
+        self.limiter = limiter
+        self._client = None
+
+    @property
+    def available(self) -> bool:
+        return httpx is not None
+
+    async def start(self) -> None:
+        if httpx is None or self._client is not None:
+            return
+        self._client = httpx.AsyncClient(
+            http2=h2 is not None,
+            follow_redirects=True,
+            timeout=self.timeout,
+            headers=self.headers,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+            ),
+        )
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self) -> "HttpFetcher":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def fetch(self, url: str) -> Optional[str]:
+        """Return the HTML of ``url``, or None when it cannot be fetched as HTML."""
+        if self._client is None:
+            return None
+        try:
+            if self.limiter:
+                async with self.limiter.slot(url, channel="http") as slot:
+                    response = await self._client.get(url)
+                    if response.status_code in THROTTLE_STATUSES:
+                        slot.throttled(
+                            parse_retry_after(response.headers.get("retry-after"))
+                        )
+            else:
+                response = await self._client.get(url)
+        except Exception as e:
+            logger.warning(f"HTTP fetch of {url} failed: {e!s}")
+            return None
+        content_type = response.headers.get("content-type", "")
+        if response.status_code != 200 or "html" not in content_type:
+            logger.info(
+                f"HTTP fetch of {url} returned {response.status_code} {content_type}"
+            )
+            return None
+        return response.text
+
+
+def _words(html: str) -> set:
+    return set(WORD_PATTERN.findall(reduce_html(html).casefold()))
+
+
+def compare_fetches(http_html: Optional[str], rendered_html: str) -> Dict[str, Any]:
+    """
+    Compare a plain HTTP fetch with the rendered DOM of the same page.
+
+    Returns the share of the rendered page's words present in the HTTP response
+    and the structured fields the HTTP response is missing or disagrees on.
+    """
+    if not http_html:
+        return {"text_recall": 0.0, "missing_fields": ["<no response>"]}
+    rendered_words = _words(rendered_html)
+    recall = (
+        len(rendered_words & _words(http_html)) / len(rendered_words)
+        if rendered_words
+        else 1.0
+    )
+    rendered_fields = extract_structured_markup(rendered_html).fields
+    http_fields = extract_structured_markup(http_html).fields
+    missing = [
+        field
+        for field, value in rendered_fields.items()
+        if http_fields.get(field) != value
+    ]
+    return {"text_recall": round(recall, 3), "missing_fields": missing}
+
+
+class FetchStrategyStore:
+    """
+    Per-domain choice between plain HTTP fetches and the browser.
+
+    The first ``probe_samples`` pages of a domain are rendered in the browser
+    and also fetched over HTTP. The domain switches to HTTP only if every probe
+    has the rendered page's structured fields and at least ``min_text_recall``
+    of its words. After ``max_http_failures`` failed HTTP fetches in a row the
+    domain goes back to the browser. Decisions persist in ``fetch_strategy.json``.
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        probe_samples: int = 3,
+        min_text_recall: float = 0.95,
+        max_http_failures: int = 3,
+    ):
+        self.path = os.path.join(output_dir, FETCH_STRATEGY_FILENAME)
+        self.probe_samples = probe_samples
+        self.min_text_recall = min_text_recall
+        self.max_http_failures = max_http_failures
+        self.fetch_counts = {HTTP: 0, BROWSER: 0}
+        self.domains: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.domains = json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                logger.warning(f"Ignoring unreadable fetch strategy {self.path}: {e!s}")
+
+    @staticmethod
+    def _domain(url: str) -> str:
+        return urlparse(url).netloc.lower()
+
+    def strategy(self, url: str) -> str:
+        return self.domains.get(self._domain(url), {}).get("strategy", PROBE)
+
+    def record_probe(
+        self, url: str, http_html: Optional[str], rendered_html: str
+    ) -> None:
+        domain = self._domain(url)
+        entry = self.domains.setdefault(domain, {"strategy": PROBE, "probes": []})
+        if entry["strategy"] != PROBE:
+            return
+        result = compare_fetches(http_html, rendered_html)
+        entry["probes"].append({"url": url, **result})
+
+        passed = (
+            not result["missing_fields"]
+            and result["text_recall"] >= self.min_text_recall
+        )
+        if not passed:
+            entry["strategy"] = BROWSER
+        elif len(entry["probes"]) >= self.probe_samples:
+            entry["strategy"] = HTTP
+        if entry["strategy"] != PROBE:
+            logger.info(f"Fetch strategy for {domain}: {entry['strategy']}")
+            self.save()
+
+    def record_http_result(self, url: str, ok: bool) -> None:
+        """Send a domain back to the browser after repeated failed HTTP fetches."""
+        domain = self._domain(url)
+        entry = self.domains.get(domain)
+        if not entry or entry["strategy"] != HTTP:
+            return
+        entry["failures"] = 0 if ok else entry.get("failures", 0) + 1
+        if entry["failures"] >= self.max_http_failures:
+            self.domains[domain] = {"strategy": BROWSER, "probes": entry["probes"]}
+            logger.info(f"Fetch strategy for {domain}: {BROWSER}, HTTP fetches fail")
+            self.save()
+
+    def record_fetch(self, strategy: str) -> None:
+        self.fetch_counts[strategy] = self.fetch_counts.get(strategy, 0) + 1
+
+    def log_summary(self) -> None:
+        logger.info(
+            f"Fetched {self.fetch_counts[HTTP]} pages over HTTP and "
+            f"{self.fetch_counts[BROWSER]} in the browser"
+        )
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            mode="w", dir=directory, delete=False, encoding="utf-8"
+        ) as temp_file:
+            json.dump(self.domains, temp_file, indent=4)
+        os.replace(temp_file.name, self.path)
@@ -0,0 +1,76 @@
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+class IncrementalCrawlTracker:
+    """
+    Tracks new versus known URLs per results page during a refresh crawl.
+
+    Listings are usually sorted newest first, so once ``stop_after_known_pages``
+    consecutive pages yield no new URL the rest of the results are assumed to be
+    known already.
+    """
+
+    def __init__(
+        self,
+        urls_file: str,
+        stop_after_known_pages: int = 3,
+        canonicalize: Optional[Callable[[str], str]] = None,
+    ):
+        self.stop_after_known_pages = stop_after_known_pages
+        self.canonicalize = canonicalize or str.strip
+        self.known = set()
+        if os.path.exists(urls_file):
+            with open(urls_file, "r", encoding="utf-8") as f:
+                self.known = {self.canonicalize(line) for line in f if line.strip()}
+        self.found = set()
+        self.new = 0
+        self.pages = 0
+        self.reached_end = False
+        self._page_new = 0
+        self._known_pages = 0
+
+    def record(self, url: str) -> None:
+        url = self.canonicalize(url)
+        if url in self.found:
+            return
+        self.found.add(url)
+        if url not in self.known:
+            self.new += 1
+            self._page_new += 1
+
+    def end_page(self) -> bool:
+        """Close the current page and return True if crawling should stop."""
+        self.pages += 1
+        self._known_pages = 0 if self._page_new else self._known_pages + 1
+        self._page_new = 0
+        return self._known_pages >= self.stop_after_known_pages
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "finished_at": datetime.now().isoformat(),
+            "pages_crawled": self.pages,
+            "reached_last_page": self.reached_end,
+            "new": self.new,
+            "seen": len(self.found) - self.new,
+            # Only a full walk can tell which listings disappeared
+            "vanished": len(self.known - self.found) if self.reached_end else None,
+        }
+
+    def save_report(self, output_path: str) -> Optional[Dict[str, Any]]:
+        report = self.report()
+        with open(os.path.join(output_path, "incremental_report.json"), "w") as f:
+            json.dump(report, f, indent=4)
+        logger.info(
+            f"Incremental crawl: {report['new']} new, {report['seen']} seen, "
+            f"{report['vanished']} vanished over {report['pages_crawled']} pages"
+        )
+        return report
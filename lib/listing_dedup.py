@@ -0,0 +1,374 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from lib.batch_normalizer import base_url, resolve_url
+from lib.record_store import iter_record_file
+from lib.url_canonicalizer import CanonicalUrlIndex
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+STREET_ABBREVIATIONS = {
+    "street": "st",
+    "avenue": "ave",
+    "av": "ave",
+    "road": "rd",
+    "boulevard": "blvd",
+    "drive": "dr",
+    "lane": "ln",
+    "court": "ct",
+    "place": "pl",
+    "parkway": "pkwy",
+    "highway": "hwy",
+    "freeway": "fwy",
+    "expressway": "expy",
+    "circle": "cir",
+    "terrace": "ter",
+    "square": "sq",
+    "trail": "trl",
+    "suite": "ste",
+    "north": "n",
+    "south": "s",
+    "east": "e",
+    "west": "w",
+    "northeast": "ne",
+    "northwest": "nw",
+    "southeast": "se",
+    "southwest": "sw",
+}
+UNIT_PATTERN = re.compile(
+    r"(?:\b(?:suite|ste|unit|apt)\b\.?|#)\s*([\w-]+)", re.IGNORECASE
+)
+ZIP_PATTERN = re.compile(r"\b(\d{5})(?:-\d{4})?\b")
+URL_LIST_FIELDS = ("property_image_urls", "brochure_doc_urls")
+# Only the lead photos identify a listing; later ones are often stock images
+IMAGES_PER_RECORD = 3
+
+
+def normalize_address(address: Optional[str]) -> str:
+    """
+    Street part of ``address`` in a comparable form.
+
+    "123 North Main Street, Suite 200, Austin TX" -> "123 n main st ste 200".
+    Anything after the first comma that is not a unit is assumed to be city,
+    state or zip and dropped.
+    """
+    if not address:
+        return ""
+    parts = [part.strip() for part in str(address).lower().split(",")]
+    street = parts[0]
+    unit = UNIT_PATTERN.search(street)
+    if unit:
+        street = street[: unit.start()]
+    else:
+        unit = next(
+            filter(None, (UNIT_PATTERN.match(part) for part in parts[1:])), None
+        )
+    street = re.sub(r"[^a-z0-9]+", " ", street.replace("&", " and "))
+    tokens = [STREET_ABBREVIATIONS.get(token, token) for token in street.split()]
+    if unit:
+        tokens += ["ste", unit.group(1).lower()]
+    return " ".join(tokens)
+
+
+def zip5(record: Dict[str, Any]) -> str:
+    """Five-digit zip of the record, falling back to one after the street."""
+    address = str(record.get("address") or "")
+    for value in (str(record.get("zip") or ""), address.partition(",")[2]):
+        match = ZIP_PATTERN.search(value)
+        if match:
+            return match.group(1)
+    return ""
+
+
+def _hash(value: str) -> bytes:
+    return hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest()
+
+
+def address_key(record: Dict[str, Any]) -> Optional[bytes]:
+    """
+    Blocking key of normalized street address plus zip.
+
+    Falls back to city and state without a zip; None when neither is known, as a
+    bare street address is not unique enough to merge on.
+    """
+    street = normalize_address(record.get("address"))
+    if not street or not any(character.isdigit() for character in street):
+        return None
+    zip_code = zip5(record)
+    if zip_code:
+        return _hash(f"a|{street}|{zip_code}")
+    city = re.sub(r"[^a-z]+", " ", str(record.get("city") or "").lower()).strip()
+    state = str(record.get("state") or "").strip().lower()
+    if city and state:
+        return _hash(f"a|{street}|{city}|{state}")
+    return None
+
+
+def image_keys(record: Dict[str, Any]) -> List[bytes]:
+    """Hashes of the lead image URLs, ignoring scheme and query string."""
+    urls = record.get("property_image_urls") or []
+    if isinstance(urls, str):
+        urls = urls.split("\n")
+    keys = []
+    for url in urls[:IMAGES_PER_RECORD]:
+        url = str(url).split("?", 1)[0].split("#", 1)[0].lower()
+        url = url.split("://", 1)[-1].lstrip("/")
+        if url:
+            keys.append(_hash(f"i|{url}"))
+    return keys
+
+
+def _locality(record: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    """Zip and "city|state" of the record, either None when unknown."""
+    city = re.sub(r"[^a-z]+", " ", str(record.get("city") or "").lower()).strip()
+    state = str(record.get("state") or "").strip().lower()
+    return zip5(record) or None, f"{city}|{state}" if city and state else None
+
+
+def image_profile(
+    record: Dict[str, Any],
+) -> Tuple[bool, Optional[str], Optional[str], str]:
+    """What decides whether two records sharing an image may be one property."""
+    zip_code, city_state = _locality(record)
+    street = normalize_address(record.get("address")).split()
+    number = street[0] if street and street[0][0].isdigit() else ""
+    return address_key(record) is not None, zip_code, city_state, number
+
+
+def images_compatible(a: Tuple, b: Tuple) -> bool:
+    """
+    Whether two records sharing a lead image may be the same property.
+
+    A shared logo or placeholder must not merge listings in different places,
+    so the zip (else city and state) has to match, and so does the street
+    number when both have one. Records without either only match when neither
+    has an address key to compare.
+    """
+    a_keyed, a_zip, a_city_state, a_number = a
+    b_keyed, b_zip, b_city_state, b_number = b
+    if a_zip and b_zip:
+        same_place = a_zip == b_zip
+    elif a_city_state and b_city_state:
+        same_place = a_city_state == b_city_state
+    else:
+        same_place = not a_keyed and not b_keyed
+    return same_place and (not a_number or not b_number or a_number == b_number)
+
+
+class UnionFind:
+    """Disjoint sets over record ids 0..n-1, with the smallest id as the root."""
+
+    def __init__(self):
+        self._parent = array("q")
+
+    def add(self) -> int:
+        self._parent.append(len(self._parent))
+        return len(self._parent) - 1
+
+    def __len__(self) -> int:
+        return len(self._parent)
+
+    def find(self, item: int) -> int:
+        parent = self._parent
+        while parent[item] != item:
+            # Path halving keeps the trees flat without recursion
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def union(self, a: int, b: int) -> bool:
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return False
+        if root_b < root_a:
+            root_a, root_b = root_b, root_a
+        self._parent[root_b] = root_a
+        return True
+
+
+class ListingDeduplicator:
+    """
+    Clusters listings of the same property across brokers.
+
+    Records are blocked on three keys: the canonical listing URL, normalized
+    street address plus zip, and hashes of the lead image URLs. Records that
+    share a URL or address key are unioned, so clustering is one pass over the
+    data with a hash lookup per key instead of pairwise comparison. Records
+    sharing an image are only unioned when their locations agree (see
+    ``images_compatible``), and image URLs shared by more than
+    ``max_image_block`` records (logos, placeholders) are ignored.
+
+    Memory holds 8-byte key hashes and one integer per record; the records
+    themselves are streamed from disk and bucketed by cluster before merging,
+    so millions of listings fit.
+    """
+
+    def __init__(self, sources: Sequence[Tuple[str, str]], max_image_block: int = 4):
+        """``sources`` are ``(broker key, data file)`` pairs, read in order."""
+        self.sources = list(sources)
+        self.max_image_block = max_image_block
+        self.clusters = UnionFind()
+        self._built = False
+        self.stats = {"records": 0, "url": 0, "address": 0, "image": 0}
+
+    def _iter_records(
+        self, canonical_urls: bool = True
+    ) -> Iterator[Tuple[str, Dict[str, Any], str]]:
+        """Records with an address as ``(key, record, canonical url)``."""
+        indexes: Dict[str, CanonicalUrlIndex] = {}
+        for key, data_file in self.sources:
+            directory = os.path.dirname(data_file)
+            if directory not in indexes:
+                indexes[directory] = CanonicalUrlIndex(directory)
+            try:
+                for record in iter_record_file(data_file):
+                    if not isinstance(record, dict) or not record.get("address"):
+                        continue
+                    source_url = record.get("source_url")
+                    canonical = (
+                        indexes[directory].canonical(source_url)
+                        if source_url and canonical_urls
+                        else ""
+                    )
+                    # Relative URLs only match within their own site
+                    base = base_url(source_url or "")
+                    for field in URL_LIST_FIELDS:
+                        if isinstance(record.get(field), list):
+                            record[field] = [
+                                resolve_url(str(url), base) for url in record[field]
+                            ]
+                    yield key, record, canonical
+            except ValueError as e:
+                logger.warning(f"Skipping {data_file}: {e!s}")
+
+    def build(self) -> None:
+        """Assign every record to a cluster."""
+        image_counts: Dict[bytes, int] = {}
+        for _, record, _ in self._iter_records(canonical_urls=False):
+            for image in set(image_keys(record)):
+                image_counts[image] = image_counts.get(image, 0) + 1
+        image_counts = {
+            image: count
+            for image, count in image_counts.items()
+            if 1 < count <= self.max_image_block
+        }
+
+        first_seen: Dict[bytes, int] = {}
+        # At most max_image_block records per image, so pairwise checks are cheap
+        image_seen: Dict[bytes, List[Tuple[int, Tuple]]] = {}
+
+        def block(block_key: bytes, record_id: int, kind: str) -> None:
+            other = first_seen.setdefault(block_key, record_id)
+            if other != record_id and self.clusters.union(other, record_id):
+                self.stats[kind] += 1
+
+        for _, record, canonical in self._iter_records():
+            record_id = self.clusters.add()
+            if canonical:
+                block(_hash(f"u|{canonical}"), record_id, "url")
+            key = address_key(record)
+            if key is not None:
+                block(key, record_id, "address")
+            profile = None
+            for image in image_keys(record):
+                if image not in image_counts:
+                    continue
+                profile = profile or image_profile(record)
+                seen = image_seen.setdefault(image, [])
+                for other, other_profile in seen:
+                    if images_compatible(profile, other_profile) and (
+                        self.clusters.union(other, record_id)
+                    ):
+                        self.stats["image"] += 1
+                seen.append((record_id, profile))
+        self.stats["records"] = len(self.clusters)
+        self._built = True
+
+    def iter_merged(self, records_per_bucket: int = 100000) -> Iterator[Dict[str, Any]]:
+        """
+        Yield one merged record per cluster.
+
+        Records are spilled to bucket files by cluster so that at most one
+        bucket is held in memory while merging. The data files must not change
+        between ``build`` and this pass, as records are matched by position.
+        """
+        if not self._built:
+            self.build()
+        buckets = max(1, -(-len(self.clusters) // records_per_bucket))
+        with tempfile.TemporaryDirectory() as spill_dir:
+            paths = [os.path.join(spill_dir, f"{n}.jsonl") for n in range(buckets)]
+            files = [open(path, "w", encoding="utf-8") for path in paths]
+            try:
+                for record_id, (key, record, canonical) in enumerate(
+                    self._iter_records()
+                ):
+                    root = self.clusters.find(record_id)
+                    line = json.dumps([root, key, canonical, record])
+                    files[root % buckets].write(line + "\n")
+            finally:
+                for f in files:
+                    f.close()
+
+            for path in paths:
+                groups: Dict[int, List[Tuple[str, Dict[str, Any], str]]] = {}
+                with open(path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        root, key, canonical, record = json.loads(line)
+                        groups.setdefault(root, []).append((key, record, canonical))
+                for root in sorted(groups):
+                    yield merge_cluster(groups[root])
+
+
+def _completeness(record: Dict[str, Any]) -> Tuple[int, str]:
+    filled = sum(1 for value in record.values() if value not in (None, "", []))
+    return filled, str(record.get("extracted_at") or "")
+
+
+def merge_cluster(members: List[Tuple[str, Dict[str, Any], str]]) -> Dict[str, Any]:
+    """
+    Canonical record of one property from its ``(key, record, canonical url)``.
+
+    The most complete (then most recent) record is the base; fields it lacks
+    are filled from the others, URL lists are unioned, and ``sources`` lists
+    every broker listing the property came from.
+    """
+    ordered = sorted(members, key=lambda member: _completeness(member[1]), reverse=True)
+    merged = dict(ordered[0][1])
+    for _, record, _ in ordered[1:]:
+        for field, value in record.items():
+            if field in URL_LIST_FIELDS:
+                continue
+            if merged.get(field) in (None, "", []) and value not in (None, "", []):
+                merged[field] = value
+    for field in URL_LIST_FIELDS:
+        urls = [
+            url
+            for _, record, _ in ordered
+            if isinstance(record.get(field), list)
+            for url in record[field]
+        ]
+        if urls or field in merged:
+            merged[field] = list(dict.fromkeys(urls))
+
+    first_url = members[0][2] or members[0][1].get("source_url") or ""
+    merged["listing_id"] = hashlib.blake2b(
+        f"{members[0][0]}|{first_url}".encode("utf-8"), digest_size=8
+    ).hexdigest()
+    merged["sources"] = [
+        {
+            "key": key,
+            "source_url": record.get("source_url"),
+            "extracted_at": record.get("extracted_at"),
+        }
+        for key, record, _ in members
+    ]
+    return merged
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from lib.adaptive_limiter import AdaptiveLimiter
+from lib.html_reducer import estimate_tokens
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = "output/llm_cache.sqlite"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Inputs that change on every call without changing the answer
+VOLATILE_INPUTS = ("timestamp",)
+
+
+def describe_chain(chain: Any) -> Tuple[str, str]:
+    """Return the model and prompt template of a ``prompt | llm | parser`` chain."""
+    model = template = ""
+    for step in getattr(chain, "steps", [chain]):
+        name = getattr(step, "model_name", None) or getattr(step, "model", None)
+        if name and not model:
+            temperature = getattr(step, "temperature", None)
+            model = f"{type(step).__name__}:{name}:{temperature}"
+        elif hasattr(step, "pretty_repr") and not template:
+            template = step.pretty_repr()
+    return model, template
+
+
+def cache_key(model: str, template: str, inputs: Dict[str, Any]) -> str:
+    normalized = {k: v for k, v in inputs.items() if k not in VOLATILE_INPUTS}
+    payload = json.dumps(
+        [model, template, normalized], sort_keys=True, default=str, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.tokens_saved = 0
+
+    def summary(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "estimated_tokens_saved": self.tokens_saved,
+        }
+
+
+class LLMCache:
+    """
+    On-disk cache of parsed LLM responses, keyed by model, prompt and inputs.
+
+    Entries live in a SQLite file shared by every key and are evicted least
+    recently used first once they exceed ``max_bytes``. With ``bypass`` set,
+    lookups always miss but fresh responses are still stored, which refreshes
+    the cache. ``network_fs`` switches from WAL to rollback journaling, as for
+    ``WorkQueue``, so hosts sharing ``output/`` can share the file.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        bypass: bool = False,
+        network_fs: bool = False,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.bypass = bypass
+        self.stats = LLMCacheStats()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute(f"PRAGMA journal_mode={'DELETE' if network_fs else 'WAL'}")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Any]:
+        if self.bypass:
+            return None
+        row = self._conn.execute(
+            "SELECT response FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        self._conn.execute(
+            "UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key)
+        )
+        self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, model: str, response: Any) -> None:
+        payload = json.dumps(response, default=str, ensure_ascii=False)
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+            (key, model, payload, len(payload.encode("utf-8")), now, now),
+        )
+        self._conn.commit()
+        self._evict()
+
+    def invalidate(self, key: str) -> None:
+        """Drop ``key``, e.g. when its response failed validation."""
+        self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+        self._conn.commit()
+
+    def _evict(self) -> None:
+        (total,) = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at"
+        ).fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        self._conn.commit()
+        self.stats.evictions += len(evicted)
+
+    async def ainvoke(
+        self,
+        chain: Any,
+        inputs: Dict[str, Any],
+        limiter: Optional[AdaptiveLimiter] = None,
+    ) -> Tuple[Any, str]:
+        """
+        Return the cached response for ``inputs`` or invoke ``chain`` and store it.
+
+        Cache misses hold a ``limiter`` slot for the model while they call the
+        LLM. The cache key is returned as well so callers can ``invalidate`` a
+        response that turns out to be unusable.
+        """
+        model, template = describe_chain(chain)
+        key = cache_key(model, template, inputs)
+        cached = self.get(key)
+        if cached is not None:
+            self.stats.hits += 1
+            self.stats.tokens_saved += estimate_tokens(json.dumps(inputs, default=str))
+            return cached, key
+
+        self.stats.misses += 1
+        if limiter:
+            async with limiter.slot(model or "llm"):
+                response = await chain.ainvoke(inputs)
+        else:
+            response = await chain.ainvoke(inputs)
+        self.put(key, model, response)
+        return response, key
+
+    def log_summary(self) -> None:
+        summary = self.stats.summary()
+        logger.info(
+            f"LLM cache: {summary['hits']} hits, {summary['misses']} misses "
+            f"({summary['hit_rate']:.0%}), {summary['evictions']} evictions, "
+            f"~{summary['estimated_tokens_saved']} prompt tokens saved"
+        )
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class PipelineStats:
+    def __init__(self):
+        self.fetched = 0
+        self.skipped = 0
+        self.extracted = 0
+        self.failed: Dict[str, int] = {"fetch": 0, "extract": 0}
+        self.max_depth = 0
+        self.depth_total = 0
+        self.depth_samples = 0
+        # Time fetchers waited on a full queue and extractors on an empty one
+        self.fetch_blocked = 0.0
+        self.extract_idle = 0.0
+
+    def sample_depth(self, depth: int) -> None:
+        self.max_depth = max(self.max_depth, depth)
+        self.depth_total += depth
+        self.depth_samples += 1
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "fetched": self.fetched,
+            "skipped": self.skipped,
+            "extracted": self.extracted,
+            "failed": self.failed,
+            "queue_depth_avg": round(self.depth_total / self.depth_samples, 2)
+            if self.depth_samples
+            else 0.0,
+            "queue_depth_max": self.max_depth,
+            "fetch_blocked_seconds": round(self.fetch_blocked, 2),
+            "extract_idle_seconds": round(self.extract_idle, 2),
+        }
+
+
+class FetchExtractPipeline:
+    """
+    Runs ``fetch`` and ``extract`` as two stages joined by a bounded queue.
+
+    ``fetch`` renders an item and returns a snapshot (or None to skip it);
+    ``extract`` consumes snapshots. Each stage has its own concurrency limit, and
+    once ``queue_size`` snapshots are waiting the fetchers block until an
+    extractor catches up. Time fetchers spend blocked means extraction is the
+    bottleneck; time extractors spend idle means fetching is.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[Any], Awaitable[Optional[Any]]],
+        extract: Callable[[Any], Awaitable[None]],
+        fetch_concurrency: int = 4,
+        extract_concurrency: int = 10,
+        queue_size: Optional[int] = None,
+    ):
+        self.fetch = fetch
+        self.extract = extract
+        self.fetch_concurrency = fetch_concurrency
+        self.extract_concurrency = extract_concurrency
+        self.queue_size = queue_size or 2 * extract_concurrency
+        self.stats = PipelineStats()
+
+    async def run(self, items: Iterable[Any]) -> PipelineStats:
+        pending = iter(items)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+
+        async def fetch_worker():
+            for item in pending:
+                try:
+                    snapshot = await self.fetch(item)
+                except Exception as e:
+                    self.stats.failed["fetch"] += 1
+                    logger.error(f"Fetch stage failed for {item}: {e!s}")
+                    continue
+                if snapshot is None:
+                    self.stats.skipped += 1
+                    continue
+                self.stats.fetched += 1
+                start = time.monotonic()
+                await queue.put(snapshot)
+                self.stats.fetch_blocked += time.monotonic() - start
+                self.stats.sample_depth(queue.qsize())
+
+        async def extract_worker():
+            while True:
+                start = time.monotonic()
+                snapshot = await queue.get()
+                self.stats.extract_idle += time.monotonic() - start
+                self.stats.sample_depth(queue.qsize())
+                if snapshot is _DONE:
+                    return
+                try:
+                    await self.extract(snapshot)
+                    self.stats.extracted += 1
+                except Exception as e:
+                    self.stats.failed["extract"] += 1
+                    logger.error(f"Extract stage failed: {e!s}")
+
+        extractors = [
+            asyncio.create_task(extract_worker())
+            for _ in range(self.extract_concurrency)
+        ]
+        try:
+            await asyncio.gather(
+                *(fetch_worker() for _ in range(self.fetch_concurrency))
+            )
+            for _ in extractors:
+                await queue.put(_DONE)
+            await asyncio.gather(*extractors)
+        finally:
+            for task in extractors:
+                task.cancel()
+        return self.stats
+
+    def log_summary(self) -> None:
+        summary = self.stats.summary()
+        logger.info(
+            f"Pipeline: {summary['fetched']} fetched, {summary['skipped']} skipped, "
+            f"{summary['extracted']} extracted, failures {summary['failed']}, "
+            f"queue depth avg {summary['queue_depth_avg']} max "
+            f"{summary['queue_depth_max']}/{self.queue_size}, fetchers blocked "
+            f"{summary['fetch_blocked_seconds']}s, extractors idle "
+            f"{summary['extract_idle_seconds']}s"
+        )
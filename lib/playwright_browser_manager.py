@@ -1,9 +1,15 @@
 import asyncio
 import logging
 import os
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
 
-from playwright.async_api import Browser, async_playwright
+from playwright.async_api import Browser, BrowserContext, Playwright, async_playwright
+
+try:
+    import psutil
+except ImportError:  # Memory based recycling is disabled without psutil
+    psutil = None
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -96,3 +102,149 @@ class PlaywrightBrowserManager:
                 await self._run_command(["pkill", "-f", "chrome"])
             except Exception as e:
                 print(f"Warning: Failed to cleanup browser: {e!s}")
+
+
+class _PooledBrowser:
+    def __init__(self, browser: Browser):
+        self.browser = browser
+        self.contexts_served = 0
+        self.active_contexts = 0
+        self.retired = False
+
+
+class BrowserPool:
+    """
+    Keeps ``size`` long-lived browsers and hands out an isolated context per task.
+
+    A browser is retired after serving ``max_contexts_per_browser`` contexts, or
+    when the resident memory of the process tree exceeds ``max_memory_mb``. A
+    replacement is launched straight away and the retired browser is closed once
+    its last context is released.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_contexts_per_browser: int = 20,
+        max_memory_mb: Optional[int] = None,
+        headless: bool = False,
+    ):
+        self.size = size
+        self.max_contexts_per_browser = max_contexts_per_browser
+        self.max_memory_mb = max_memory_mb
+        self.headless = headless
+        self._manager = PlaywrightBrowserManager()
+        self._playwright: Optional[Playwright] = None
+        self._browsers: List[_PooledBrowser] = []
+        self._lock = asyncio.Lock()
+
+        if max_memory_mb and psutil is None:
+            logger.warning("psutil is not installed, memory based recycling disabled")
+
+    async def start(self) -> "BrowserPool":
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        return self
+
+    async def __aenter__(self) -> "BrowserPool":
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    @asynccontextmanager
+    async def context(self, **context_options) -> AsyncIterator[BrowserContext]:
+        """Yield a fresh browser context, closing it when the block exits."""
+        pooled = await self._acquire()
+        context = None
+        try:
+            context = await pooled.browser.new_context(**context_options)
+            yield context
+        finally:
+            if context:
+                try:
+                    await context.close()
+                except Exception as e:
+                    logger.warning(f"Failed to close browser context: {e!s}")
+            await self._release(pooled)
+
+    async def close(self) -> None:
+        """Close every browser and stop the Playwright driver."""
+        async with self._lock:
+            browsers, self._browsers = self._browsers, []
+        for pooled in browsers:
+            await self._close_browser(pooled)
+        if self._playwright:
+            await self._playwright.stop()
+            self._playwright = None
+        logger.info("Browser pool shut down")
+
+    async def _acquire(self) -> _PooledBrowser:
+        await self.start()
+        async with self._lock:
+            if self._memory_exceeded():
+                live = [b for b in self._browsers if not b.retired]
+                # Browsers that have only served one context are not worth churning
+                candidates = [b for b in live if b.contexts_served > 1]
+                if candidates:
+                    busiest = max(candidates, key=lambda b: b.contexts_served)
+                    logger.info("Memory threshold exceeded, recycling a browser")
+                    await self._retire(busiest)
+
+            live = [b for b in self._browsers if not b.retired]
+            if len(live) < self.size:
+                pooled = await self._launch()
+            else:
+                pooled = min(live, key=lambda b: b.active_contexts)
+                if pooled.contexts_served >= self.max_contexts_per_browser:
+                    await self._retire(pooled)
+                    pooled = await self._launch()
+
+            pooled.contexts_served += 1
+            pooled.active_contexts += 1
+            return pooled
+
+    async def _release(self, pooled: _PooledBrowser) -> None:
+        async with self._lock:
+            pooled.active_contexts -= 1
+            if not (pooled.retired and pooled.active_contexts == 0):
+                return
+            if pooled in self._browsers:
+                self._browsers.remove(pooled)
+        await self._close_browser(pooled)
+
+    async def _launch(self) -> _PooledBrowser:
+        browser = await self._playwright.chromium.launch(
+            **self._manager._get_browser_options(),
+            headless=self.headless,
+            timeout=60000,
+        )
+        pooled = _PooledBrowser(browser)
+        self._browsers.append(pooled)
+        logger.info(f"Launched pooled browser ({len(self._browsers)} open)")
+        return pooled
+
+    async def _retire(self, pooled: _PooledBrowser) -> None:
+        pooled.retired = True
+        logger.info(f"Retiring browser after {pooled.contexts_served} contexts")
+        if pooled.active_contexts == 0:
+            self._browsers.remove(pooled)
+            await self._close_browser(pooled)
+
+    async def _close_browser(self, pooled: _PooledBrowser) -> None:
+        try:
+            await pooled.browser.close()
+        except Exception as e:
+            logger.warning(f"Failed to close pooled browser: {e!s}")
+
+    def _memory_exceeded(self) -> bool:
+        if not self.max_memory_mb or psutil is None:
+            return False
+        process = psutil.Process()
+        rss = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                continue
+        return rss / (1024 * 1024) > self.max_memory_mb
@@ -0,0 +1,342 @@
+import fcntl
+import glob
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import ijson
+except ImportError:  # JSON arrays are streamed with json.JSONDecoder.raw_decode
+    ijson = None
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+JSON_ARRAY_FILENAME = "extracted_data.json"
+JSONL_FILENAME = "extracted_data.jsonl"
+# Per-worker shards are named extracted_data.<shard>.jsonl
+SHARD_PATTERN = "extracted_data.*.jsonl"
+READ_CHUNK_SIZE = 1 << 20
+
+
+class RecordSink:
+    """Destination for extracted records of a single key."""
+
+    def append(self, record: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Make every appended record durable."""
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class JsonlRecordSink(RecordSink):
+    """Append-only JSON Lines sink with batched fsync.
+
+    Every record is written as one line with a single ``write`` on a file opened
+    in append mode, so concurrent writers never interleave partial records and
+    nothing is ever re-read. ``fsync`` runs every ``fsync_every`` records or
+    ``fsync_interval`` seconds, whichever comes first.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fsync_every: int = 50,
+        fsync_interval: float = 5.0,
+    ):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def append(self, record: Dict[str, Any]) -> None:
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._pending += 1
+
+        if (
+            self._pending >= self.fsync_every
+            or time.monotonic() - self._last_sync >= self.fsync_interval
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        if self._file.closed:
+            return
+        self._file.flush()
+        if self._pending:
+            os.fsync(self._file.fileno())
+            self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+
+
+class JsonArrayRecordSink(RecordSink):
+    """Legacy sink that rewrites the whole JSON array on every append."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def append(self, record: Dict[str, Any]) -> None:
+        with open(self.lock_path, "w") as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                existing_data = []
+                if os.path.exists(self.path):
+                    try:
+                        with open(self.path, "r") as f:
+                            existing_data = json.load(f)
+                    except json.JSONDecodeError:
+                        logger.warning(
+                            f"Could not parse existing data from {self.path}, starting fresh"
+                        )
+
+                existing_data.append(record)
+                _atomic_write_json(self.path, existing_data)
+            finally:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+
+def shard_path(output_dir: str, shard: str) -> str:
+    safe_shard = re.sub(r"[^\w.-]", "_", shard)
+    return os.path.join(output_dir, f"extracted_data.{safe_shard}.jsonl")
+
+
+def open_record_sink(
+    output_dir: str, backend: str = "jsonl", shard: Optional[str] = None
+) -> RecordSink:
+    """
+    Open the record sink of a key directory, e.g. ``output/cbre``.
+
+    With a ``shard`` (e.g. a worker id) records go to a file of their own, so
+    workers on other processes or hosts never append to the same file.
+    """
+    if backend == "jsonl":
+        migrate_legacy_json(output_dir)
+        if shard:
+            return JsonlRecordSink(shard_path(output_dir, shard))
+        return JsonlRecordSink(os.path.join(output_dir, JSONL_FILENAME))
+    if backend == "json":
+        return JsonArrayRecordSink(os.path.join(output_dir, JSON_ARRAY_FILENAME))
+    raise ValueError(f"Unknown record sink backend: {backend}")
+
+
+def migrate_legacy_json(output_dir: str) -> None:
+    """Seed the JSONL store from an existing JSON array the first time it is used."""
+    jsonl_path = os.path.join(output_dir, JSONL_FILENAME)
+    json_path = os.path.join(output_dir, JSON_ARRAY_FILENAME)
+    if jsonl_paths(output_dir) or not os.path.exists(json_path):
+        return
+
+    try:
+        with open(json_path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+    except json.JSONDecodeError:
+        logger.warning(f"Could not parse legacy data from {json_path}, skipping import")
+        return
+
+    os.makedirs(output_dir, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        mode="w", dir=output_dir, delete=False, encoding="utf-8"
+    ) as temp_file:
+        for record in records:
+            temp_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        temp_file.flush()
+        os.fsync(temp_file.fileno())
+    os.replace(temp_file.name, jsonl_path)
+    logger.info(f"Imported {len(records)} legacy records from {json_path}")
+
+
+def jsonl_paths(output_dir: str) -> List[str]:
+    """The JSONL store of a key directory followed by its worker shards."""
+    paths = sorted(glob.glob(os.path.join(output_dir, SHARD_PATTERN)))
+    jsonl_path = os.path.join(output_dir, JSONL_FILENAME)
+    if os.path.exists(jsonl_path):
+        paths.insert(0, jsonl_path)
+    return paths
+
+
+def iter_records(output_dir: str) -> Iterator[Dict[str, Any]]:
+    """Yield every stored record of a key directory, file by file."""
+    json_path = os.path.join(output_dir, JSON_ARRAY_FILENAME)
+
+    paths = jsonl_paths(output_dir)
+    if paths:
+        for path in paths:
+            yield from _iter_jsonl(path)
+    elif os.path.exists(json_path):
+        try:
+            yield from iter_json_array(json_path)
+        except ValueError:
+            logger.warning(f"Could not parse existing data from {json_path}")
+
+
+def iter_record_file(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream the records of a JSONL file or a JSON array file."""
+    if path.endswith(".jsonl"):
+        return _iter_jsonl(path)
+    return iter_json_array(path)
+
+
+def iter_json_array(path: str) -> Iterator[Any]:
+    """
+    Yield the items of a JSON array file one at a time.
+
+    Only one item is held in memory at once, so arbitrarily large exports can
+    be read. Uses ijson when installed. Raises ValueError if the file does not
+    hold a JSON array.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        first = f.read(1)
+        while first and first.isspace():
+            first = f.read(1)
+        if first != "[":
+            raise ValueError(f"{path} does not contain a JSON array")
+
+        if ijson is not None:
+            f.seek(0)
+            yield from ijson.items(f, "item", use_float=True)
+            return
+
+        decoder = json.JSONDecoder()
+        buffer, position, eof = "", 0, False
+        while True:
+            # Skip separators, reading more when the buffer runs out
+            while True:
+                while position < len(buffer) and buffer[position] in " \t\r\n,":
+                    position += 1
+                if position < len(buffer) or eof:
+                    break
+                chunk = f.read(READ_CHUNK_SIZE)
+                eof = not chunk
+                buffer, position = buffer[position:] + chunk, 0
+            if position >= len(buffer):
+                raise ValueError(f"{path} ends before its JSON array is closed")
+            if buffer[position] == "]":
+                return
+
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+                # A number at the end of the buffer may continue in the next chunk
+                complete = end < len(buffer) or eof
+            except json.JSONDecodeError:
+                if eof:
+                    raise ValueError(f"Could not parse {path} at offset {position}")
+                complete = False
+            if not complete:
+                chunk = f.read(READ_CHUNK_SIZE)
+                eof = not chunk
+                buffer, position = buffer[position:] + chunk, 0
+                continue
+
+            yield item
+            position = end
+            if position > READ_CHUNK_SIZE:
+                buffer, position = buffer[position:], 0
+
+
+def export_json_array(output_dir: str, output_file: Optional[str] = None) -> int:
+    """
+    Compact the JSONL store into the JSON array format read by downstream tools.
+
+    Worker shards are merged in. The newest record (by ``extracted_at``, then
+    by position) for a ``source_url`` replaces earlier ones, so re-extracted URLs
+    appear once. The array is streamed to a temporary file and moved into place
+    atomically.
+
+    Returns:
+        Number of records written
+    """
+    output_file = output_file or os.path.join(output_dir, JSON_ARRAY_FILENAME)
+    paths = jsonl_paths(output_dir)
+    if not paths:
+        return 0
+
+    newest: Dict[str, Tuple[str, int]] = {}
+    for index, record in enumerate(_iter_paths(paths)):
+        url = record.get("source_url") or f"#{index}"
+        version = (record.get("extracted_at") or "", index)
+        if url not in newest or version >= newest[url]:
+            newest[url] = version
+    keep = {index for _, index in newest.values()}
+
+    written = 0
+    with tempfile.NamedTemporaryFile(
+        mode="w",
+        dir=os.path.dirname(output_file) or ".",
+        delete=False,
+        encoding="utf-8",
+    ) as temp_file:
+        temp_file.write("[")
+        for index, record in enumerate(_iter_paths(paths)):
+            if index not in keep:
+                continue
+            temp_file.write(",\n" if written else "\n")
+            serialized = json.dumps(record, indent=2, ensure_ascii=False)
+            temp_file.write("\n".join(f"  {line}" for line in serialized.splitlines()))
+            written += 1
+        temp_file.write("\n]\n" if written else "]\n")
+        temp_file.flush()
+        os.fsync(temp_file.fileno())
+    os.replace(temp_file.name, output_file)
+
+    logger.info(f"Exported {written} records to {output_file}")
+    return written
+
+
+def _iter_paths(paths: List[str]) -> Iterator[Dict[str, Any]]:
+    for path in paths:
+        yield from _iter_jsonl(path)
+
+
+def _iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # A crash can leave a truncated final line behind
+                logger.warning(f"Skipping unreadable line {line_number} in {path}")
+
+
+def _atomic_write_json(path: str, data: Any) -> None:
+    with tempfile.NamedTemporaryFile(
+        mode="w", dir=os.path.dirname(path) or ".", delete=False
+    ) as temp_file:
+        json.dump(data, temp_file, indent=2)
+    try:
+        shutil.move(temp_file.name, path)
+    except Exception as e:
+        logger.error(f"Error during atomic move: {e!s}")
+        os.unlink(temp_file.name)
+        raise
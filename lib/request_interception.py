@@ -0,0 +1,91 @@
+import logging
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from playwright.async_api import BrowserContext, Request, Response, Route
+
+from lib.schema import ResourcePolicy
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Typical transfer sizes used to estimate what blocked requests would have cost
+ESTIMATED_BYTES_BY_TYPE = {
+    "image": 60_000,
+    "media": 500_000,
+    "font": 40_000,
+    "stylesheet": 30_000,
+    "script": 50_000,
+}
+DEFAULT_ESTIMATED_BYTES = 10_000
+
+# Service workers bypass context routing, so they are blocked whenever a policy applies
+LIGHTWEIGHT_CONTEXT_OPTIONS = {
+    "service_workers": "block",
+    "viewport": {"width": 1280, "height": 800},
+}
+
+
+class RequestInterceptor:
+    """Applies a ResourcePolicy to a browser context and counts what it saved."""
+
+    def __init__(self, policy: Optional[ResourcePolicy] = None):
+        self.policy = policy or ResourcePolicy()
+        self.requests_allowed = 0
+        self.requests_blocked: Dict[str, int] = {}
+        self.estimated_bytes_avoided = 0
+        self.bytes_loaded = 0
+
+    async def install(self, context: BrowserContext) -> None:
+        await context.route("**/*", self._handle_route)
+        context.on("response", self._on_response)
+
+    def block_reason(self, url: str, resource_type: str) -> Optional[str]:
+        """Return why a request should be blocked, or None to let it through."""
+        if any(pattern in url for pattern in self.policy.url_allowlist):
+            return None
+        if resource_type in self.policy.blocked_resource_types:
+            return resource_type
+        host = (urlparse(url).hostname or "").lower()
+        for domain in self.policy.domain_denylist:
+            if host == domain or host.endswith(f".{domain}"):
+                return "denylist"
+        return None
+
+    async def _handle_route(self, route: Route, request: Request) -> None:
+        reason = self.block_reason(request.url, request.resource_type)
+        if reason is None:
+            self.requests_allowed += 1
+            await route.continue_()
+            return
+
+        self.requests_blocked[reason] = self.requests_blocked.get(reason, 0) + 1
+        self.estimated_bytes_avoided += ESTIMATED_BYTES_BY_TYPE.get(
+            request.resource_type, DEFAULT_ESTIMATED_BYTES
+        )
+        await route.abort("blockedbyclient")
+
+    def _on_response(self, response: Response) -> None:
+        content_length = response.headers.get("content-length")
+        if content_length and content_length.isdigit():
+            self.bytes_loaded += int(content_length)
+
+    def summary(self) -> Dict[str, object]:
+        return {
+            "requests_allowed": self.requests_allowed,
+            "requests_blocked": sum(self.requests_blocked.values()),
+            "blocked_by_reason": dict(self.requests_blocked),
+            "bytes_loaded": self.bytes_loaded,
+            "estimated_bytes_avoided": self.estimated_bytes_avoided,
+        }
+
+    def log_summary(self) -> None:
+        summary = self.summary()
+        logger.info(
+            f"Requests allowed: {summary['requests_allowed']}, "
+            f"blocked: {summary['requests_blocked']} {summary['blocked_by_reason']}, "
+            f"loaded {summary['bytes_loaded'] / 1e6:.1f}MB, "
+            f"avoided ~{summary['estimated_bytes_avoided'] / 1e6:.1f}MB"
+        )
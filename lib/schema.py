@@ -17,6 +17,36 @@ class WebElement(BaseModel):
     )
 
 
+class ResourcePolicy(BaseModel):
+    blocked_resource_types: List[str] = Field(
+        default_factory=lambda: ["image", "media", "font"],
+        description="Playwright resource types that are never fetched",
+    )
+    domain_denylist: List[str] = Field(
+        default_factory=lambda: [
+            "google-analytics.com",
+            "googletagmanager.com",
+            "doubleclick.net",
+            "googlesyndication.com",
+            "facebook.net",
+            "connect.facebook.net",
+            "hotjar.com",
+            "clarity.ms",
+            "hubspot.com",
+            "linkedin.com",
+            "newrelic.com",
+            "nr-data.net",
+            "segment.io",
+            "optimizely.com",
+        ],
+        description="Domains (and their subdomains) whose requests are aborted",
+    )
+    url_allowlist: List[str] = Field(
+        default_factory=list,
+        description="URL substrings that are always allowed, e.g. pagination XHR",
+    )
+
+
 class WebSearchSchema(BaseModel):
     do_perform_search: Optional[bool] = Field(
         default=True, description="Whether to perform a search"
@@ -31,6 +61,9 @@ class WebSearchSchema(BaseModel):
     post_search_steps: Optional[List[WebElement]] = Field(
         default=[], description="Clicks after searching"
     )
+    resource_policy: Optional[ResourcePolicy] = Field(
+        default=None, description="Request blocking overrides for this site"
+    )
 
 
 class PropertyData(BaseModel):
@@ -60,3 +93,6 @@ class PropertyData(BaseModel):
     broker_email: Optional[str] = Field(None, description="Broker's email address")
     broker_address: Optional[str] = Field(None, description="Broker's office address")
     source_url: Optional[str] = Field(None, description="URL of the source page")
+    extracted_at: Optional[str] = Field(
+        None, description="ISO timestamp of when the record was extracted"
+    )
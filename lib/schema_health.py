@@ -0,0 +1,345 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from playwright.async_api import Page
+from pydantic import BaseModel, Field
+
+from lib.browser_automation import EXTRACT_HREFS_SCRIPT
+from lib.playwright_browser_manager import BrowserPool
+from lib.request_interception import LIGHTWEIGHT_CONTEXT_OPTIONS, RequestInterceptor
+from lib.schema import WebElement, WebSearchSchema
+from lib.wait_strategies import PageSettler
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+HEALTH_FILENAME = "schema_health.json"
+HEALTHY = "healthy"
+DEGRADED = "degraded"
+BROKEN = "broken"
+
+# Short enough that a stale selector costs seconds, not a crawl's retries
+VALIDATION_TIMEOUT = 10000
+
+# Counts the matches of every selector in one round trip. Invalid selectors
+# report their error instead of failing the whole call.
+COUNT_SELECTORS_SCRIPT = """
+(selectors) => {
+    const results = {};
+    for (const selector of selectors) {
+        const result = { xpath: 0, css: 0, visible: 0, error: null };
+        if (selector.xpath) {
+            try {
+                const snapshot = document.evaluate(
+                    selector.xpath, document, null,
+                    XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null
+                );
+                result.xpath = snapshot.snapshotLength;
+                for (let i = 0; i < snapshot.snapshotLength; i++) {
+                    const node = snapshot.snapshotItem(i);
+                    if (node.getClientRects && node.getClientRects().length) {
+                        result.visible++;
+                    }
+                }
+            } catch (e) {
+                result.error = String(e);
+            }
+        }
+        if (selector.css) {
+            try {
+                result.css = document.querySelectorAll(selector.css).length;
+            } catch (e) {
+                result.error = result.error || String(e);
+            }
+        }
+        results[selector.name] = result;
+    }
+    return results;
+}
+"""
+
+
+class SchemaHealth(BaseModel):
+    key: str
+    status: str = Field(description="healthy, degraded or broken")
+    checked_at: str
+    reasons: List[str] = Field(default_factory=list)
+    search_page: Dict[str, Dict[str, Any]] = Field(
+        default_factory=dict, description="Selector matches on the search page"
+    )
+    results_page: Dict[str, Dict[str, Any]] = Field(
+        default_factory=dict, description="Selector matches after searching"
+    )
+    detail_links: int = 0
+    pagination_advances: Optional[bool] = None
+    duration_seconds: float = 0.0
+
+
+def _named_elements(schema: WebSearchSchema) -> Dict[str, WebElement]:
+    elements = {
+        "detail_page_link": schema.detail_page_link,
+        "submit_button": schema.submit_button,
+        "next_page_button": schema.next_page_button,
+    }
+    for group in ("pre_search_steps", "post_search_steps"):
+        for index, step in enumerate(getattr(schema, group) or []):
+            elements[f"{group}[{index}]"] = step
+    return elements
+
+
+async def count_selectors(
+    page: Page, elements: Dict[str, WebElement]
+) -> Dict[str, Dict[str, Any]]:
+    """Match counts of every element's XPath and CSS selector on ``page``."""
+    selectors = [
+        {"name": name, "xpath": element.xpath, "css": element.css_selector}
+        for name, element in elements.items()
+    ]
+    return await page.evaluate(COUNT_SELECTORS_SCRIPT, selectors)
+
+
+async def _click(page: Page, element: WebElement) -> bool:
+    selector = f"xpath={element.xpath}" if element.xpath else element.css_selector
+    try:
+        await page.locator(selector).first.click(timeout=VALIDATION_TIMEOUT)
+        await page.wait_for_load_state("domcontentloaded", timeout=VALIDATION_TIMEOUT)
+        return True
+    except Exception as e:
+        logger.info(f"Could not click {element.element_description}: {e!s}")
+        return False
+
+
+async def _detail_hrefs(page: Page, xpath: str) -> List[str]:
+    try:
+        result = await page.evaluate(EXTRACT_HREFS_SCRIPT, xpath)
+        return result["hrefs"]
+    except Exception:
+        return []
+
+
+async def _links_change(page: Page, xpath: str, previous: List[str]) -> bool:
+    """Wait for the detail links to differ from ``previous``, e.g. after paging."""
+    deadline = time.monotonic() + VALIDATION_TIMEOUT / 1000
+    while time.monotonic() < deadline:
+        hrefs = await _detail_hrefs(page, xpath)
+        if hrefs and hrefs != previous:
+            return True
+        await asyncio.sleep(0.5)
+    return False
+
+
+def _matches(counts: Dict[str, Any]) -> int:
+    return max(counts.get("xpath", 0), counts.get("css", 0))
+
+
+async def _run_steps(
+    page: Page,
+    group: str,
+    steps: List[WebElement],
+    counts: Dict[str, Dict[str, Any]],
+    health: SchemaHealth,
+) -> bool:
+    """
+    Click ``steps`` in order and return whether every click succeeded.
+
+    A step may only appear once the previous one was clicked, so steps that
+    ``counts`` found no match for are still tried before being reported.
+    """
+    completed = True
+    for index, step in enumerate(steps):
+        if await _click(page, step):
+            continue
+        name = f"{group}[{index}]"
+        if _matches(counts.get(name, {})):
+            health.reasons.append(f"{name} could not be clicked")
+        else:
+            health.reasons.append(f"{name} matches nothing")
+        completed = False
+    return completed
+
+
+async def check_schema(
+    key: str,
+    schema: WebSearchSchema,
+    page: Page,
+    settler: Optional[PageSettler] = None,
+) -> SchemaHealth:
+    """
+    Load the search page once and check every selector of ``schema``.
+
+    Selectors are counted on the search page and again after searching, each
+    time in a single evaluate call, then the next page button is clicked once
+    to see whether the detail links change. A key is broken when the search ran
+    to completion and yielded no detail links, or when the submit or next page
+    button matches nothing on a page that loaded. It is degraded when a step
+    could not be clicked, validation failed midway, pagination does not
+    advance, an XPath only still matches through its CSS fallback, or the page
+    did not load, none of which prove the schema wrong.
+    """
+    settler = settler or PageSettler(max_wait=VALIDATION_TIMEOUT / 1000)
+    elements = _named_elements(schema)
+    start = time.monotonic()
+    health = SchemaHealth(
+        key=key, status=HEALTHY, checked_at=datetime.now().isoformat()
+    )
+    # Whether the search itself ran, so that no detail links means the schema
+    # no longer finds them rather than that a step timed out
+    search_completed = False
+    # A button the schema needs that is missing from a loaded page
+    missing_button = False
+
+    try:
+        await settler.before_action(schema.search_page_url)
+        await page.goto(schema.search_page_url, timeout=VALIDATION_TIMEOUT * 3)
+        await settler.settle(page)
+        health.search_page = await count_selectors(page, elements)
+
+        search_completed = await _run_steps(
+            page,
+            "pre_search_steps",
+            schema.pre_search_steps or [],
+            health.search_page,
+            health,
+        )
+        if schema.do_perform_search:
+            if not _matches(health.search_page["submit_button"]):
+                health.reasons.append("submit_button matches nothing")
+                search_completed = False
+                missing_button = True
+            elif not await _click(page, schema.submit_button):
+                health.reasons.append("submit_button could not be clicked")
+                search_completed = False
+
+        detail_xpath = schema.detail_page_link.xpath
+        await settler.settle(page, selector=f"xpath={detail_xpath}")
+        post_search_steps = schema.post_search_steps or []
+        if post_search_steps:
+            post_counts = await count_selectors(
+                page,
+                {
+                    name: element
+                    for name, element in elements.items()
+                    if name.startswith("post_search_steps")
+                },
+            )
+            search_completed &= await _run_steps(
+                page, "post_search_steps", post_search_steps, post_counts, health
+            )
+        health.results_page = await count_selectors(page, elements)
+        # Evaluated directly so that a navigation still in progress raises
+        # instead of reading as no links
+        result = await page.evaluate(EXTRACT_HREFS_SCRIPT, detail_xpath)
+        first_page = result["hrefs"]
+        if not first_page and await _links_change(page, detail_xpath, []):
+            # Results loaded over XHR after the page settled
+            first_page = await _detail_hrefs(page, detail_xpath)
+        health.detail_links = len(first_page)
+
+        if not health.detail_links:
+            health.reasons.append("detail_page_link matches no links")
+        elif not _matches(health.results_page["next_page_button"]):
+            health.reasons.append("next_page_button matches nothing")
+            health.pagination_advances = False
+            missing_button = True
+        else:
+            advanced = await _click(page, schema.next_page_button)
+            if advanced:
+                advanced = await _links_change(page, detail_xpath, first_page)
+            health.pagination_advances = advanced
+            if not advanced:
+                health.reasons.append("next_page_button does not change the results")
+    except Exception as e:
+        health.reasons.append(f"validation failed: {e!s}")
+        search_completed = False
+
+    for name, counts in health.results_page.items():
+        if counts.get("error"):
+            health.reasons.append(f"{name} is invalid: {counts['error']}")
+        elif name in ("detail_page_link", "next_page_button"):
+            if counts["css"] and not counts["xpath"]:
+                health.reasons.append(f"{name} xpath is stale, only css matches")
+
+    if missing_button or (search_completed and not health.detail_links):
+        health.status = BROKEN
+    elif health.reasons or not health.detail_links:
+        health.status = DEGRADED
+    health.duration_seconds = round(time.monotonic() - start, 2)
+    return health
+
+
+def health_path(output_dir: str) -> str:
+    return os.path.join(output_dir, HEALTH_FILENAME)
+
+
+def save_health(health: SchemaHealth, output_dir: str) -> None:
+    os.makedirs(output_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=output_dir, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(health.model_dump(), f, indent=2)
+    os.replace(temp_path, health_path(output_dir))
+
+
+def load_health(output_dir: str) -> Optional[SchemaHealth]:
+    path = health_path(output_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return SchemaHealth(**json.load(f))
+    except (json.JSONDecodeError, ValueError) as e:
+        logger.warning(f"Could not read {path}: {e!s}")
+        return None
+
+
+def is_broken(output_dir: str) -> bool:
+    """Whether the last validation of the key's schema found it broken."""
+    health = load_health(output_dir)
+    return health is not None and health.status == BROKEN
+
+
+def clear_health(output_dir: str) -> None:
+    """Forget the last validation, e.g. once the schema was regenerated."""
+    path = health_path(output_dir)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+async def validate_schema(
+    key: str, browser_pool: Optional[BrowserPool] = None
+) -> SchemaHealth:
+    """Check the schema of ``key`` in a fresh context and save its health."""
+    output_dir = f"output/{key}"
+    with open(os.path.join(output_dir, "web_search_schema.json"), "r") as f:
+        schema = WebSearchSchema(**json.load(f))
+
+    owns_pool = browser_pool is None
+    if owns_pool:
+        browser_pool = BrowserPool(size=1, headless=False)
+    try:
+        async with browser_pool.context(**LIGHTWEIGHT_CONTEXT_OPTIONS) as context:
+            await RequestInterceptor(schema.resource_policy).install(context)
+            page = await context.new_page()
+            try:
+                health = await check_schema(key, schema, page)
+            finally:
+                await page.close()
+    finally:
+        if owns_pool:
+            await browser_pool.close()
+
+    save_health(health, output_dir)
+    log = logger.info if health.status == HEALTHY else logger.warning
+    log(
+        f"Schema of {key} is {health.status} ({health.detail_links} detail links, "
+        f"{health.duration_seconds}s)"
+        + (f": {'; '.join(health.reasons)}" if health.reasons else "")
+    )
+    return health
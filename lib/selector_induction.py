@@ -0,0 +1,575 @@
+import json
+import logging
+import os
+import re
+import tempfile
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional
+from urllib.parse import urljoin, urlparse
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+VOID_TAGS = {
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "link",
+    "meta",
+    "source",
+    "track",
+    "wbr",
+}
+SKIP_TEXT_TAGS = {"script", "style", "noscript", "template", "svg"}
+
+TEXT_FIELDS = (
+    "address",
+    "city",
+    "state",
+    "zip",
+    "property_type",
+    "property_description",
+    "broker",
+    "broker_phone",
+    "broker_email",
+    "broker_address",
+)
+NUMBER_FIELDS = ("price", "sqft", "beds", "baths")
+# Link fields are read from an attribute of the first matching element
+LINK_FIELDS = {"broker_url": ("a", "href")}
+# List fields are read from an attribute of every matching element
+LIST_FIELDS = {
+    "property_image_urls": ("img", "src", None),
+    "brochure_doc_urls": ("a", "href", re.compile(r"\.pdf(\?|#|$)", re.IGNORECASE)),
+}
+
+# Set by the pipeline rather than extracted from the page
+UNEXTRACTED_FIELDS = {"source_url", "extracted_at"}
+EMPTY = (None, "", [])
+
+NUMBER_PATTERN = re.compile(r"-?\d[\d,]*(?:\.\d+)?")
+# Ids such as "ember123" or "react-4f9a" change between page loads
+GENERATED_ID_PATTERN = re.compile(r"\d{3,}|[0-9a-f]{6,}", re.IGNORECASE)
+
+LEARNING = "learning"
+VALIDATING = "validating"
+ACTIVE = "active"
+
+
+class _Element:
+    __slots__ = ("tag", "attrs", "parent", "children", "texts", "_text")
+
+    def __init__(self, tag: str, attrs: Dict[str, str], parent: Optional["_Element"]):
+        self.tag = tag
+        self.attrs = attrs
+        self.parent = parent
+        self.children: List["_Element"] = []
+        self.texts: List[str] = []
+        self._text: Optional[str] = None
+
+    def text(self) -> str:
+        if self._text is None:
+            parts = list(self.texts)
+            for child in self.children:
+                parts.append(child.text())
+            self._text = " ".join(" ".join(parts).split())
+        return self._text
+
+    def classes(self) -> List[str]:
+        return sorted((self.attrs.get("class") or "").split())
+
+    def nth_of_type(self) -> int:
+        if self.parent is None:
+            return 1
+        siblings = [child for child in self.parent.children if child.tag == self.tag]
+        return siblings.index(self) + 1
+
+
+class _DomBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = _Element("#root", {}, None)
+        self.ids: Dict[str, _Element] = {}
+        self.elements: List[_Element] = []
+        self._stack = [self.root]
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if self._skip_depth:
+            if tag in SKIP_TEXT_TAGS:
+                self._skip_depth += 1
+            return
+        if tag in SKIP_TEXT_TAGS:
+            self._skip_depth = 1
+            return
+
+        attributes = {name: value or "" for name, value in attrs}
+        element = _Element(tag, attributes, self._stack[-1])
+        self._stack[-1].children.append(element)
+        self.elements.append(element)
+        if attributes.get("id"):
+            self.ids.setdefault(attributes["id"], element)
+        if tag not in VOID_TAGS:
+            self._stack.append(element)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and not self._skip_depth and self._stack[-1].tag == tag:
+            self._stack.pop()
+
+    def handle_endtag(self, tag):
+        if self._skip_depth:
+            if tag in SKIP_TEXT_TAGS:
+                self._skip_depth -= 1
+            return
+        # Unclosed elements above the matching start tag are closed implicitly
+        for index in range(len(self._stack) - 1, 0, -1):
+            if self._stack[index].tag == tag:
+                del self._stack[index:]
+                return
+
+    def handle_data(self, data):
+        if not self._skip_depth and data.strip():
+            self._stack[-1].texts.append(data)
+
+
+class ParsedPage:
+    """Minimal DOM used to learn and evaluate selectors without a browser."""
+
+    def __init__(self, html: str, url: str):
+        builder = _DomBuilder()
+        builder.feed(html)
+        builder.close()
+        self.url = url
+        self.root = builder.root
+        self.ids = builder.ids
+        self.elements = builder.elements
+
+    def select(self, steps: List[Dict[str, Any]]) -> List[_Element]:
+        nodes = [self.root]
+        for step in steps:
+            if "id" in step and "tag" not in step:
+                anchor = self.ids.get(step["id"])
+                nodes = [anchor] if anchor is not None else []
+                continue
+            matches = []
+            for node in nodes:
+                counts: Dict[str, int] = {}
+                for child in node.children:
+                    counts[child.tag] = counts.get(child.tag, 0) + 1
+                    if child.tag != step["tag"]:
+                        continue
+                    if "nth" in step and counts[child.tag] != step["nth"]:
+                        continue
+                    if "classes" in step and not set(step["classes"]).issubset(
+                        child.classes()
+                    ):
+                        continue
+                    matches.append(child)
+            nodes = matches
+            if not nodes:
+                break
+        return nodes
+
+
+def describe_selector(steps: List[Dict[str, Any]]) -> str:
+    """Render selector steps as CSS for logs and the cache file."""
+    parts = []
+    for step in steps:
+        if "tag" not in step:
+            parts.append(f"#{step['id']}")
+            continue
+        part = step["tag"] + "".join(f".{c}" for c in step.get("classes", []))
+        if "nth" in step:
+            part += f":nth-of-type({step['nth']})"
+        parts.append(part)
+    return " > ".join(parts)
+
+
+def _candidate_paths(element: _Element, is_list: bool) -> List[List[Dict[str, Any]]]:
+    """
+    Class based and positional paths from the nearest stable id (or the root).
+
+    List fields also get variants without ``nth-of-type`` on the last one to three
+    steps, so that one selector matches every image of a gallery.
+    """
+    positional: List[Dict[str, Any]] = []
+    by_class: List[Dict[str, Any]] = []
+    node = element
+    while node is not None and node.tag != "#root":
+        element_id = node.attrs.get("id")
+        if (
+            node is not element
+            and element_id
+            and not GENERATED_ID_PATTERN.search(element_id)
+        ):
+            positional.insert(0, {"id": element_id})
+            by_class.insert(0, {"id": element_id})
+            break
+        nth = node.nth_of_type()
+        positional.insert(0, {"tag": node.tag, "nth": nth})
+        classes = node.classes()
+        if classes:
+            by_class.insert(0, {"tag": node.tag, "classes": classes})
+        else:
+            by_class.insert(0, {"tag": node.tag, "nth": nth})
+        node = node.parent
+
+    if not is_list:
+        return [by_class, positional]
+
+    candidates = []
+    for steps in (by_class, positional):
+        for depth in (1, 2, 3):
+            general = [dict(step) for step in steps]
+            for step in general[-depth:]:
+                step.pop("nth", None)
+            candidates.append(general)
+    return candidates
+
+
+def _normalize_text(value: Any) -> str:
+    return " ".join(str(value).split()).casefold()
+
+
+def _to_number(value: Any) -> Optional[float]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    match = NUMBER_PATTERN.search(str(value or ""))
+    if not match:
+        return None
+    try:
+        return float(match.group().replace(",", ""))
+    except ValueError:
+        return None
+
+
+def _field_value(field: str, elements: List[_Element], page: ParsedPage) -> Any:
+    if field in LIST_FIELDS:
+        _, attribute, pattern = LIST_FIELDS[field]
+        urls = [
+            urljoin(page.url, e.attrs[attribute])
+            for e in elements
+            if e.attrs.get(attribute)
+        ]
+        if pattern is not None:
+            urls = [url for url in urls if pattern.search(url)]
+        return list(dict.fromkeys(urls))
+    if not elements:
+        return None
+    if field in LINK_FIELDS:
+        _, attribute = LINK_FIELDS[field]
+        value = elements[0].attrs.get(attribute)
+        return urljoin(page.url, value) if value else None
+    text = elements[0].text()
+    if field in NUMBER_FIELDS:
+        number = _to_number(text)
+        if number is not None and field == "beds":
+            return int(number)
+        return number
+    return text or None
+
+
+def _values_match(field: str, learned: Any, expected: Any) -> bool:
+    if field in LIST_FIELDS:
+        learned, expected = set(learned or []), set(expected or [])
+        if not expected:
+            return not learned
+        return len(learned & expected) / len(expected) >= 0.8
+    if field in NUMBER_FIELDS:
+        learned, expected = _to_number(learned), _to_number(expected)
+        if learned is None or expected is None:
+            return learned is expected
+        return abs(learned - expected) <= max(1.0, abs(expected) * 0.01)
+    if not learned or not expected:
+        return not learned and not expected
+    if field in LINK_FIELDS:
+        learned, expected = str(learned).rstrip("/"), str(expected).rstrip("/")
+    return _normalize_text(learned) == _normalize_text(expected)
+
+
+class _DomainState:
+    def __init__(self, data: Optional[Dict[str, Any]] = None):
+        data = data or {}
+        self.state: str = data.get("state", LEARNING)
+        self.selectors: Dict[str, List[Dict[str, Any]]] = data.get("selectors", {})
+        # Fields the LLM found on most learning pages of this domain; None for
+        # caches written before this was tracked, which are relearned
+        self.llm_fields: Optional[List[str]] = data.get("llm_fields")
+        if self.llm_fields is None:
+            self.state = LEARNING
+            self.selectors = {}
+        self.samples = 0
+        self.support: Dict[str, Dict[str, int]] = {}
+        self.field_samples: Dict[str, int] = {}
+        self.seen_fields: Dict[str, int] = {}
+        self.agreements: List[float] = []
+        self.pages_since_check = 0
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "selectors": self.selectors,
+            "llm_fields": self.llm_fields,
+            "described": {f: describe_selector(s) for f, s in self.selectors.items()},
+        }
+
+
+class SelectorCache:
+    """
+    Learns per-domain selectors for ``PropertyData`` fields from LLM results.
+
+    The first ``learn_samples`` LLM extractions of a domain vote for selectors
+    that reproduce each field. The winners are then checked against the next
+    ``validation_samples`` LLM extractions and, if they agree on at least
+    ``min_agreement`` of the fields, the domain switches to pure parsing. Pages
+    still go to the LLM while the LLM found fields on the domain that no
+    selector reproduces on at least ``min_support`` of the learning pages, such
+    as a paraphrased description; fields it found only now and then are
+    optional and left empty when no selector covers them. Every
+    ``spot_check_every`` pages still go to the LLM; when the rolling agreement
+    drops below ``min_agreement`` the domain starts learning again.
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        learn_samples: int = 5,
+        validation_samples: int = 5,
+        min_agreement: float = 0.9,
+        min_support: float = 0.6,
+        spot_check_every: int = 50,
+    ):
+        self.path = os.path.join(output_dir, "selector_cache.json")
+        self.learn_samples = learn_samples
+        self.validation_samples = validation_samples
+        self.min_agreement = min_agreement
+        self.min_support = min_support
+        self.spot_check_every = spot_check_every
+        self.domains: Dict[str, _DomainState] = {}
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    for domain, data in json.load(f).items():
+                        self.domains[domain] = _DomainState(data)
+            except (json.JSONDecodeError, OSError) as e:
+                logger.warning(f"Ignoring unreadable selector cache {self.path}: {e!s}")
+
+    def _domain(self, url: str) -> _DomainState:
+        return self.domains.setdefault(urlparse(url).netloc.lower(), _DomainState())
+
+    def should_parse(self, url: str) -> bool:
+        """Whether ``url`` can be extracted from learned selectors alone."""
+        state = self._domain(url)
+        if state.state != ACTIVE:
+            return False
+        state.pages_since_check += 1
+        if state.pages_since_check >= self.spot_check_every:
+            state.pages_since_check = 0
+            return False
+        return True
+
+    def uncovered(self, url: str) -> List[str]:
+        """Fields the LLM usually finds on ``url``'s domain that no selector covers."""
+        state = self._domain(url)
+        return [
+            field for field in state.llm_fields or [] if field not in state.selectors
+        ]
+
+    def extract(self, url: str, html: str) -> Dict[str, Any]:
+        state = self._domain(url)
+        page = ParsedPage(html, url)
+        values = {}
+        for field, steps in state.selectors.items():
+            value = _field_value(field, page.select(steps), page)
+            if value not in EMPTY:
+                values[field] = value
+        return values
+
+    def observe(self, url: str, html: str, llm_result: Dict[str, Any]) -> None:
+        """Feed an LLM extraction of ``url`` into learning or validation."""
+        state = self._domain(url)
+        page = ParsedPage(html, url)
+
+        if state.state == LEARNING:
+            self._learn(state, page, llm_result)
+            state.samples += 1
+            if state.samples >= self.learn_samples:
+                self._induce(url, state)
+            return
+
+        agreement = self._agreement(state, page, llm_result)
+        if agreement is None:
+            return
+        state.agreements = (state.agreements + [agreement])[-self.validation_samples :]
+        rolling = sum(state.agreements) / len(state.agreements)
+
+        if (
+            state.state == VALIDATING
+            and len(state.agreements) >= self.validation_samples
+        ):
+            if rolling >= self.min_agreement:
+                state.state = ACTIVE
+                logger.info(
+                    f"Selectors for {urlparse(url).netloc} validated ({rolling:.0%})"
+                )
+            else:
+                self._relearn(url, state, rolling)
+            self.save()
+        elif state.state == ACTIVE and rolling < self.min_agreement:
+            self._relearn(url, state, rolling)
+            self.save()
+
+    def _learn(
+        self, state: _DomainState, page: ParsedPage, llm_result: Dict[str, Any]
+    ) -> None:
+        for field, value in llm_result.items():
+            if field not in UNEXTRACTED_FIELDS and value not in EMPTY:
+                state.seen_fields[field] = state.seen_fields.get(field, 0) + 1
+
+        for field in TEXT_FIELDS + NUMBER_FIELDS:
+            expected = llm_result.get(field)
+            if expected in (None, ""):
+                continue
+            state.field_samples[field] = state.field_samples.get(field, 0) + 1
+            matches = [
+                element
+                for element in page.elements
+                if element.texts and _values_match(field, element.text(), expected)
+            ]
+            # The innermost match is the most specific one
+            matched = {id(element) for element in matches}
+            matches = [
+                element
+                for element in matches
+                if not any(id(child) in matched for child in element.children)
+            ]
+            self._vote(state, page, field, matches[:3], expected)
+
+        for field, (tag, attribute, _) in LIST_FIELDS.items():
+            expected = [urljoin(page.url, u) for u in llm_result.get(field) or []]
+            if not expected:
+                continue
+            state.field_samples[field] = state.field_samples.get(field, 0) + 1
+            wanted = set(expected)
+            matches = [
+                element
+                for element in page.elements
+                if element.tag == tag
+                and urljoin(page.url, element.attrs.get(attribute, "")) in wanted
+            ]
+            self._vote(state, page, field, matches[:1], expected)
+
+        for field, (tag, attribute) in LINK_FIELDS.items():
+            expected = llm_result.get(field)
+            if not expected:
+                continue
+            expected = urljoin(page.url, str(expected))
+            state.field_samples[field] = state.field_samples.get(field, 0) + 1
+            matches = [
+                element
+                for element in page.elements
+                if element.tag == tag
+                and element.attrs.get(attribute)
+                and _values_match(
+                    field, urljoin(page.url, element.attrs[attribute]), expected
+                )
+            ]
+            self._vote(state, page, field, matches[:3], expected)
+
+    def _vote(
+        self,
+        state: _DomainState,
+        page: ParsedPage,
+        field: str,
+        elements: List[_Element],
+        expected: Any,
+    ) -> None:
+        # Only paths that reproduce the LLM value on this page get a vote
+        votes = state.support.setdefault(field, {})
+        seen = set()
+        for element in elements:
+            for steps in _candidate_paths(element, field in LIST_FIELDS):
+                key = json.dumps(steps, sort_keys=True)
+                if key in seen:
+                    continue
+                seen.add(key)
+                value = _field_value(field, page.select(steps), page)
+                if _values_match(field, value, expected):
+                    votes[key] = votes.get(key, 0) + 1
+
+    def _induce(self, url: str, state: _DomainState) -> None:
+        selectors = {}
+        for field, votes in state.support.items():
+            samples = state.field_samples.get(field, 0)
+            if not votes:
+                continue
+            # Ties go to the first candidate, the class based and most specific one
+            best, count = max(votes.items(), key=lambda item: item[1])
+            if samples and count / samples >= self.min_support:
+                selectors[field] = json.loads(best)
+        state.selectors = selectors
+        state.llm_fields = [
+            field
+            for field, count in state.seen_fields.items()
+            if count / state.samples >= self.min_support
+        ]
+        state.state = VALIDATING if selectors else LEARNING
+        state.samples = 0
+        state.support = {}
+        state.field_samples = {}
+        state.seen_fields = {}
+        state.agreements = []
+        logger.info(
+            f"Learned {len(selectors)} selectors for {urlparse(url).netloc}: "
+            f"{', '.join(selectors) or 'none'}"
+        )
+        self.save()
+
+    def _agreement(
+        self, state: _DomainState, page: ParsedPage, llm_result: Dict[str, Any]
+    ) -> Optional[float]:
+        compared = matched = 0
+        for field, steps in state.selectors.items():
+            expected = llm_result.get(field)
+            learned = _field_value(field, page.select(steps), page)
+            if expected in EMPTY and learned in EMPTY:
+                continue
+            compared += 1
+            if field in LIST_FIELDS:
+                expected = [urljoin(page.url, u) for u in expected or []]
+            elif field in LINK_FIELDS and expected:
+                expected = urljoin(page.url, str(expected))
+            matched += _values_match(field, learned, expected)
+        return matched / compared if compared else None
+
+    def _relearn(self, url: str, state: _DomainState, agreement: float) -> None:
+        logger.info(
+            f"Selector agreement for {urlparse(url).netloc} fell to {agreement:.0%}, "
+            f"relearning"
+        )
+        state.state = LEARNING
+        state.selectors = {}
+        state.samples = 0
+        state.agreements = []
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            mode="w", dir=directory, delete=False, encoding="utf-8"
+        ) as temp_file:
+            json.dump(
+                {domain: state.to_json() for domain, state in self.domains.items()},
+                temp_file,
+                indent=4,
+            )
+        os.replace(temp_file.name, self.path)
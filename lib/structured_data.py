@@ -0,0 +1,461 @@
+import json
+import logging
+import os
+import re
+from html.parser import HTMLParser
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Fields the LLM extracts; it is asked only for those the markup lacks and
+# skipped when the markup has them all
+EXTRACTED_FIELDS = (
+    "address",
+    "city",
+    "state",
+    "zip",
+    "price",
+    "sqft",
+    "beds",
+    "baths",
+    "property_image_urls",
+    "brochure_doc_urls",
+    "property_type",
+    "property_description",
+    "broker",
+    "broker_url",
+    "broker_phone",
+    "broker_email",
+    "broker_address",
+)
+SOURCE_PRIORITY = ("json_ld", "microdata", "meta")
+# Sources that describe the listing itself; meta tags are page-level summaries
+# (one share image, the site description) and only fill gaps
+AUTHORITATIVE_SOURCES = {"json_ld", "microdata"}
+
+# JSON-LD types that describe the listing itself rather than the website
+LISTING_TYPES = {
+    "RealEstateListing",
+    "Offer",
+    "Product",
+    "Place",
+    "Residence",
+    "House",
+    "Apartment",
+    "SingleFamilyResidence",
+    "Accommodation",
+}
+# Microdata items that only describe part of the item around them
+ITEM_PART_TYPES = {
+    "PostalAddress",
+    "GeoCoordinates",
+    "QuantitativeValue",
+    "ImageObject",
+    "PriceSpecification",
+    "UnitPriceSpecification",
+}
+# Elements without an end tag, which never close an itemscope
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta"}
+
+SQUARE_METRE_UNITS = {"MTK", "M2", "SQM", "SQ M", "M²"}
+SQFT_PER_SQUARE_METRE = 10.7639
+NUMBER_PATTERN = re.compile(r"-?\d[\d,]*(?:\.\d+)?")
+
+# itemprop / OpenGraph names mapped onto PropertyData fields
+MICRODATA_FIELDS = {
+    "streetAddress": "address",
+    "addressLocality": "city",
+    "addressRegion": "state",
+    "postalCode": "zip",
+    "price": "price",
+    "floorSize": "sqft",
+    "numberOfBedrooms": "beds",
+    "numberOfRooms": "beds",
+    "numberOfBathroomsTotal": "baths",
+    "image": "property_image_urls",
+    "description": "property_description",
+    "telephone": "broker_phone",
+    "email": "broker_email",
+}
+META_FIELDS = {
+    "og:street-address": "address",
+    "og:locality": "city",
+    "og:region": "state",
+    "og:postal-code": "zip",
+    "product:price:amount": "price",
+    "og:price:amount": "price",
+    "og:image": "property_image_urls",
+    "og:image:secure_url": "property_image_urls",
+    "twitter:image": "property_image_urls",
+    "og:description": "property_description",
+    "description": "property_description",
+    "og:phone_number": "broker_phone",
+    "og:email": "broker_email",
+}
+LIST_FIELDS = {"property_image_urls", "brochure_doc_urls"}
+FLOAT_FIELDS = {"price", "sqft", "baths"}
+INT_FIELDS = {"beds"}
+EMPTY = (None, "", [])
+
+
+class _MarkupParser(HTMLParser):
+    """
+    Collects JSON-LD blocks, microdata properties and meta tags in one pass.
+
+    Only itemprops of an itemscope of a ``LISTING_TYPES`` itemtype, or of a part
+    of one such as its PostalAddress, are kept, so the address and telephone of
+    an Organization block in the footer are not taken for the listing's.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.json_ld: List[str] = []
+        self.microdata: List[Tuple[str, str]] = []
+        self.meta: List[Tuple[str, str]] = []
+        self._json_ld_buffer: Optional[List[str]] = None
+        self._text_props: List[Tuple[str, str, List[str]]] = []
+        # Open itemscopes as [tag, open elements of that tag, is a listing], the
+        # last being None for parts that belong to the enclosing item
+        self._scopes: List[List[Any]] = []
+
+    def handle_starttag(self, tag, attrs):
+        attributes = dict(attrs)
+        if tag == "script" and (attributes.get("type") or "").lower() == (
+            "application/ld+json"
+        ):
+            self._json_ld_buffer = []
+            return
+
+        if tag == "meta" and attributes.get("content"):
+            name = attributes.get("property") or attributes.get("name")
+            if name:
+                self.meta.append((name, attributes["content"]))
+
+        for scope in self._scopes:
+            if scope[0] == tag:
+                scope[1] += 1
+
+        itemprop = attributes.get("itemprop")
+        if itemprop and self._in_listing():
+            self._add_itemprop(tag, itemprop, attributes)
+
+        if "itemscope" in attributes and tag not in VOID_TAGS:
+            item_types = {
+                item_type.rstrip("/").rsplit("/", 1)[-1]
+                for item_type in (attributes.get("itemtype") or "").split()
+            }
+            if LISTING_TYPES & item_types:
+                is_listing = True
+            elif not item_types or item_types <= ITEM_PART_TYPES:
+                is_listing = None
+            else:
+                is_listing = False
+            self._scopes.append([tag, 1, is_listing])
+
+    def _in_listing(self) -> bool:
+        for _, _, is_listing in reversed(self._scopes):
+            if is_listing is not None:
+                return is_listing
+        return False
+
+    def _add_itemprop(self, tag: str, itemprop: str, attributes: Dict) -> None:
+        value = (
+            attributes.get("content")
+            or attributes.get("href")
+            or attributes.get("src")
+            or attributes.get("value")
+        )
+        if value:
+            for prop in itemprop.split():
+                self.microdata.append((prop, value))
+        elif "itemscope" not in attributes:
+            self._text_props.append((tag, itemprop, []))
+
+    def handle_endtag(self, tag):
+        if tag == "script" and self._json_ld_buffer is not None:
+            self.json_ld.append("".join(self._json_ld_buffer))
+            self._json_ld_buffer = None
+            return
+        for scope in self._scopes:
+            if scope[0] == tag:
+                scope[1] -= 1
+        self._scopes = [scope for scope in self._scopes if scope[1] > 0]
+        if self._text_props and self._text_props[-1][0] == tag:
+            _, itemprop, text = self._text_props.pop()
+            value = " ".join("".join(text).split())
+            if value:
+                for prop in itemprop.split():
+                    self.microdata.append((prop, value))
+
+    def handle_data(self, data):
+        if self._json_ld_buffer is not None:
+            self._json_ld_buffer.append(data)
+            return
+        for _, _, text in self._text_props:
+            text.append(data)
+
+
+class StructuredExtraction:
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self.provenance: Dict[str, str] = {}
+
+    def set(self, field: str, value: Any, source: str) -> None:
+        value = _coerce(field, value)
+        if value in EMPTY or field in self.fields:
+            return
+        self.fields[field] = value
+        self.provenance[field] = source
+
+    def missing(self, fields: Iterable[str] = EXTRACTED_FIELDS) -> List[str]:
+        # A share image from a meta tag is not the listing's gallery
+        return [
+            field
+            for field in fields
+            if field not in self.fields
+            or (field in LIST_FIELDS and self.provenance[field] == "meta")
+        ]
+
+    def merge(
+        self, data: Dict[str, Any], source: str
+    ) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """
+        Combine ``data`` extracted by ``source`` (the LLM or learned selectors)
+        with the structured fields, returning the record and its provenance.
+
+        JSON-LD and microdata values replace ``data``'s, meta tags only fill
+        fields ``data`` left empty, and list fields such as the image gallery
+        are unioned.
+        """
+        merged = dict(data)
+        provenance = {
+            field: source for field, value in data.items() if value not in EMPTY
+        }
+        for field, value in self.fields.items():
+            current = merged.get(field)
+            if current in EMPTY:
+                merged[field] = value
+                provenance[field] = self.provenance[field]
+            elif field in LIST_FIELDS:
+                current = current if isinstance(current, list) else [current]
+                merged[field] = list(dict.fromkeys([*current, *value]))
+            elif self.provenance[field] in AUTHORITATIVE_SOURCES:
+                merged[field] = value
+                provenance[field] = self.provenance[field]
+        return merged, provenance
+
+
+def extract_structured_markup(html: str) -> StructuredExtraction:
+    """
+    Read ``PropertyData`` fields from JSON-LD, microdata and meta tags.
+
+    Sources are applied in ``SOURCE_PRIORITY`` order, so a field found in JSON-LD
+    is never overwritten by a meta tag.
+    """
+    parser = _MarkupParser()
+    parser.feed(html)
+    parser.close()
+
+    extraction = StructuredExtraction()
+    for block in parser.json_ld:
+        try:
+            data = json.loads(block)
+        except json.JSONDecodeError:
+            continue
+        for node in _iter_nodes(data):
+            _apply_json_ld_node(extraction, node)
+
+    for prop, value in parser.microdata:
+        field = MICRODATA_FIELDS.get(prop)
+        if field:
+            extraction.set(field, value, "microdata")
+
+    images = [
+        value
+        for name, value in parser.meta
+        if META_FIELDS.get(name) == "property_image_urls"
+    ]
+    for name, value in parser.meta:
+        field = META_FIELDS.get(name)
+        if field == "property_image_urls":
+            extraction.set(field, images, "meta")
+        elif field:
+            extraction.set(field, value, "meta")
+
+    return extraction
+
+
+def _iter_nodes(data: Any) -> Iterable[Dict[str, Any]]:
+    if isinstance(data, list):
+        for item in data:
+            yield from _iter_nodes(item)
+    elif isinstance(data, dict):
+        yield data
+        if "@graph" in data:
+            yield from _iter_nodes(data["@graph"])
+
+
+def _types(node: Dict[str, Any]) -> List[str]:
+    node_type = node.get("@type") or []
+    return node_type if isinstance(node_type, list) else [node_type]
+
+
+def _apply_json_ld_node(extraction: StructuredExtraction, node: Dict[str, Any]) -> None:
+    # Addresses and organizations elsewhere on the page are usually the broker's
+    # office or the site publisher, so they are only read through the listing
+    if not LISTING_TYPES.intersection(_types(node)):
+        return
+
+    address = node.get("address")
+    if isinstance(address, dict):
+        _apply_address(extraction, address)
+    elif isinstance(address, str):
+        extraction.set("address", address, "json_ld")
+
+    for item in _iter_nodes(node.get("itemOffered") or node.get("mainEntity") or []):
+        _apply_json_ld_node(extraction, item)
+
+    offers = node.get("offers")
+    for offer in _iter_nodes(offers or []):
+        extraction.set("price", offer.get("price"), "json_ld")
+        for key in ("seller", "offeredBy"):
+            if isinstance(offer.get(key), dict):
+                _apply_broker(extraction, offer[key])
+    extraction.set("price", node.get("price"), "json_ld")
+
+    floor_size = node.get("floorSize")
+    if isinstance(floor_size, dict):
+        value = _to_number(floor_size.get("value"))
+        unit = str(floor_size.get("unitCode") or floor_size.get("unitText") or "")
+        if value is not None and unit.upper() in SQUARE_METRE_UNITS:
+            value = round(value * SQFT_PER_SQUARE_METRE, 2)
+        extraction.set("sqft", value, "json_ld")
+    elif floor_size is not None:
+        extraction.set("sqft", floor_size, "json_ld")
+
+    extraction.set(
+        "beds", node.get("numberOfBedrooms") or node.get("numberOfRooms"), "json_ld"
+    )
+    extraction.set(
+        "baths",
+        node.get("numberOfBathroomsTotal") or node.get("numberOfFullBathrooms"),
+        "json_ld",
+    )
+    extraction.set("property_image_urls", _image_urls(node.get("image")), "json_ld")
+    extraction.set("property_description", node.get("description"), "json_ld")
+
+    for key in ("broker", "agent", "seller", "realEstateAgent"):
+        if isinstance(node.get(key), dict):
+            _apply_broker(extraction, node[key])
+
+
+def _apply_address(extraction: StructuredExtraction, address: Dict[str, Any]) -> None:
+    extraction.set("address", address.get("streetAddress"), "json_ld")
+    extraction.set("city", address.get("addressLocality"), "json_ld")
+    extraction.set("state", address.get("addressRegion"), "json_ld")
+    extraction.set("zip", address.get("postalCode"), "json_ld")
+
+
+def _apply_broker(extraction: StructuredExtraction, broker: Dict[str, Any]) -> None:
+    extraction.set("broker", broker.get("name"), "json_ld")
+    extraction.set("broker_url", broker.get("url"), "json_ld")
+    extraction.set("broker_phone", broker.get("telephone"), "json_ld")
+    extraction.set("broker_email", broker.get("email"), "json_ld")
+    address = broker.get("address")
+    if isinstance(address, dict):
+        parts = [
+            address.get(key)
+            for key in (
+                "streetAddress",
+                "addressLocality",
+                "addressRegion",
+                "postalCode",
+            )
+        ]
+        address = ", ".join(str(part) for part in parts if part)
+    extraction.set("broker_address", address, "json_ld")
+
+
+def _image_urls(image: Any) -> List[str]:
+    if not image:
+        return []
+    if isinstance(image, str):
+        return [image]
+    if isinstance(image, dict):
+        url = image.get("url") or image.get("contentUrl")
+        return [url] if isinstance(url, str) else []
+    if isinstance(image, list):
+        return [url for item in image for url in _image_urls(item)]
+    return []
+
+
+def _to_number(value: Any) -> Optional[float]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if not isinstance(value, str):
+        return None
+    match = NUMBER_PATTERN.search(value)
+    if not match:
+        return None
+    try:
+        return float(match.group().replace(",", ""))
+    except ValueError:
+        return None
+
+
+def _coerce(field: str, value: Any) -> Any:
+    if value is None:
+        return None
+    if field in FLOAT_FIELDS:
+        return _to_number(value)
+    if field in INT_FIELDS:
+        number = _to_number(value)
+        return int(number) if number is not None else None
+    if field in LIST_FIELDS:
+        values = value if isinstance(value, list) else [value]
+        return list(dict.fromkeys(str(v).strip() for v in values if v))
+    if isinstance(value, (dict, list)):
+        return None
+    return str(value).strip()
+
+
+class ExtractionStats:
+    """Per-run hit rates of the structured-data fast path and field provenance."""
+
+    def __init__(self):
+        self.records = 0
+        self.llm_calls = 0
+        self.field_sources: Dict[str, Dict[str, int]] = {}
+
+    def record(self, provenance: Dict[str, str], used_llm: bool) -> None:
+        self.records += 1
+        if used_llm:
+            self.llm_calls += 1
+        for field, source in provenance.items():
+            sources = self.field_sources.setdefault(field, {})
+            sources[source] = sources.get(source, 0) + 1
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "records": self.records,
+            "llm_calls": self.llm_calls,
+            "llm_skipped": self.records - self.llm_calls,
+            "fast_path_hit_rate": round(
+                (self.records - self.llm_calls) / self.records, 3
+            )
+            if self.records
+            else 0.0,
+            "field_sources": self.field_sources,
+        }
+
+    def save(self, output_dir: str) -> None:
+        summary = self.summary()
+        with open(os.path.join(output_dir, "extraction_stats.json"), "w") as f:
+            json.dump(summary, f, indent=4)
+        logger.info(
+            f"Structured data fast path: {summary['llm_skipped']} of "
+            f"{summary['records']} records extracted without the LLM"
+        )
@@ -0,0 +1,193 @@
+import json
+import logging
+import os
+from typing import Dict, Iterable, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Query parameters that never identify a listing. Short names such as ``ref``
+# or ``sid`` are listing ids on some sites, so they are stripped per domain
+# through ``DomainRule.strip_params`` only
+TRACKING_PARAM_PREFIXES = ("utm_", "mc_", "pk_", "hsa_")
+TRACKING_PARAMS = {
+    "gclid",
+    "gbraid",
+    "wbraid",
+    "dclid",
+    "fbclid",
+    "msclkid",
+    "yclid",
+    "_ga",
+    "_gl",
+    "_hsenc",
+    "_hsmi",
+    "referrer",
+    "jsessionid",
+    "phpsessid",
+    "aspsessionid",
+    "sessionid",
+    "session_id",
+    "cfid",
+    "cftoken",
+}
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+CANONICAL_INDEX_FILENAME = "canonical_urls.jsonl"
+
+
+class DomainRule:
+    """Canonicalization overrides for one domain and its subdomains."""
+
+    def __init__(
+        self,
+        strip_params: Iterable[str] = (),
+        keep_params: Optional[Iterable[str]] = None,
+        drop_query: bool = False,
+        strip_trailing_slash: bool = True,
+        lowercase_path: bool = False,
+    ):
+        self.strip_params = {param.lower() for param in strip_params}
+        self.keep_params = (
+            {param.lower() for param in keep_params} if keep_params else None
+        )
+        self.drop_query = drop_query
+        self.strip_trailing_slash = strip_trailing_slash
+        self.lowercase_path = lowercase_path
+
+
+DEFAULT_RULE = DomainRule()
+
+# Detail pages of these brokers carry no query string, so any query is tracking
+DOMAIN_RULES: Dict[str, DomainRule] = {
+    "avisonyoung.us": DomainRule(drop_query=True),
+    "cbcworldwide.com": DomainRule(drop_query=True),
+    "cbre.com": DomainRule(drop_query=True),
+    "transwestern.com": DomainRule(drop_query=True),
+}
+
+
+def rule_for_host(
+    host: str, rules: Optional[Dict[str, DomainRule]] = None
+) -> DomainRule:
+    rules = DOMAIN_RULES if rules is None else rules
+    labels = host.split(".")
+    for i in range(len(labels) - 1):
+        rule = rules.get(".".join(labels[i:]))
+        if rule:
+            return rule
+    return DEFAULT_RULE
+
+
+def canonicalize_url(url: str, rules: Optional[Dict[str, DomainRule]] = None) -> str:
+    """
+    Reduce a listing URL to its canonical form.
+
+    Surrounding whitespace, fragments, tracking and session parameters, default
+    ports and ``;jsessionid=`` path parameters are removed, the scheme and host
+    are lower-cased and the remaining query parameters are sorted.
+    """
+    url = url.strip()
+    if not url:
+        return url
+
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    rule = rule_for_host(host, rules)
+
+    netloc = host
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{host}:{parts.port}"
+    if parts.username:
+        netloc = f"{parts.username}@{netloc}"
+
+    path = parts.path.split(";", 1)[0] or "/"
+    if rule.strip_trailing_slash and len(path) > 1:
+        path = path.rstrip("/") or "/"
+    if rule.lowercase_path:
+        path = path.lower()
+
+    query = ""
+    if not rule.drop_query:
+        params = [
+            (name, value)
+            for name, value in parse_qsl(parts.query, keep_blank_values=True)
+            if _keep_param(name.lower(), rule)
+        ]
+        query = urlencode(sorted(params))
+
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def _keep_param(name: str, rule: DomainRule) -> bool:
+    if rule.keep_params is not None:
+        return name in rule.keep_params
+    if name in rule.strip_params or name in TRACKING_PARAMS:
+        return False
+    return not name.startswith(TRACKING_PARAM_PREFIXES)
+
+
+def is_plausible_canonical(url: str, canonical_url: str) -> bool:
+    """
+    Reject ``<link rel="canonical">`` targets that cannot be the same listing,
+    such as another site or a home page some sites declare for every page.
+    """
+    source, target = urlsplit(url.strip()), urlsplit(canonical_url.strip())
+    if target.scheme not in ("http", "https") or not target.hostname:
+        return False
+    return (
+        _bare_host(source.hostname) == _bare_host(target.hostname)
+        and target.path.strip("/") != ""
+    )
+
+
+def _bare_host(host: Optional[str]) -> str:
+    host = (host or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+class CanonicalUrlIndex:
+    """
+    Persistent canonical URL mapping for a key directory.
+
+    Rule-based canonicalization is recomputed on the fly; only aliases learned
+    from ``<link rel="canonical">`` are stored, one JSON line per alias, in
+    ``canonical_urls.jsonl``.
+    """
+
+    def __init__(self, output_dir: str, rules: Optional[Dict[str, DomainRule]] = None):
+        self.path = os.path.join(output_dir, CANONICAL_INDEX_FILENAME)
+        self.rules = rules
+        self._aliases: Dict[str, str] = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._aliases[entry["url"]] = entry["canonical"]
+
+    def __len__(self) -> int:
+        return len(self._aliases)
+
+    def canonical(self, url: str) -> str:
+        canonical = canonicalize_url(url, self.rules)
+        return self._aliases.get(canonical, canonical)
+
+    def record_alias(self, url: str, canonical_url: str) -> str:
+        """Remember that ``url`` declares ``canonical_url`` as its canonical page."""
+        url = canonicalize_url(url, self.rules)
+        canonical_url = canonicalize_url(canonical_url, self.rules)
+        if url == canonical_url or self._aliases.get(url) == canonical_url:
+            return canonical_url
+
+        self._aliases[url] = canonical_url
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"url": url, "canonical": canonical_url}) + "\n")
+        return canonical_url
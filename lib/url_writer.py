@@ -0,0 +1,150 @@
+import asyncio
+import fcntl
+import hashlib
+import logging
+import math
+import os
+import time
+from typing import Callable, List, Optional
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter for de-duplicating very large crawls."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, int(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (first + i * second) % self.size
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+
+class UrlWriter:
+    """
+    Buffered, de-duplicating writer for a key's ``extracted_urls.txt``.
+
+    URLs already in the file or seen during the run are dropped. New URLs are
+    buffered and appended once ``flush_size`` URLs are pending or every
+    ``flush_interval`` seconds, so a killed run loses at most one interval.
+    Crawls expected to exceed ``bloom_threshold`` URLs use a Bloom filter for
+    the seen-set; a false positive drops roughly one URL in ``1 / error_rate``.
+    With ``canonicalize``, URLs are de-duplicated and written in canonical form.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        flush_size: int = 100,
+        flush_interval: float = 2.0,
+        bloom_threshold: int = 1_000_000,
+        expected_urls: Optional[int] = None,
+        canonicalize: Optional[Callable[[str], str]] = None,
+    ):
+        self.path = path
+        self.canonicalize = canonicalize
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.bloom_threshold = bloom_threshold
+        self.expected_urls = expected_urls
+        self.seen = set()
+        self.saved = 0
+        self.duplicates = 0
+        self._buffer: List[str] = []
+        self._last_flush = time.monotonic()
+        self._flusher: Optional[asyncio.Task] = None
+
+    async def start(self) -> "UrlWriter":
+        existing = self._read_existing()
+        expected = max(self.expected_urls or 0, len(existing))
+        if expected >= self.bloom_threshold:
+            self.seen = BloomFilter(capacity=expected * 2)
+        for url in existing:
+            self.seen.add(url)
+        logger.info(f"Loaded {len(existing)} known urls from {self.path}")
+
+        self._flusher = asyncio.create_task(self._flush_periodically())
+        return self
+
+    async def close(self) -> None:
+        if self._flusher:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        self.flush()
+        logger.info(
+            f"Saved {self.saved} new urls to {self.path}, "
+            f"skipped {self.duplicates} duplicates"
+        )
+
+    def add(self, url: str) -> bool:
+        """Queue ``url`` for writing; return False if it was already known."""
+        url = self._canonical(url)
+        if not url or url in self.seen:
+            self.duplicates += 1
+            return False
+
+        self.seen.add(url)
+        self._buffer.append(url)
+        if len(self._buffer) >= self.flush_size:
+            self.flush()
+        return True
+
+    def flush(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+
+        lines = "".join(f"{url}\n" for url in self._buffer)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                file.write(lines)
+                file.flush()
+                os.fsync(file.fileno())
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+        self.saved += len(self._buffer)
+        self._buffer = []
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def _canonical(self, url: str) -> str:
+        url = url.strip()
+        if url and self.canonicalize:
+            return self.canonicalize(url)
+        return url
+
+    def _read_existing(self) -> List[str]:
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "r", encoding="utf-8") as file:
+            return [self._canonical(line) for line in file if line.strip()]
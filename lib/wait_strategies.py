@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+from playwright.async_api import Page
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Fixed sleep the event-driven waits replace, used to report time saved
+BASELINE_WAIT = 5.0
+
+DOM_QUIESCENCE_SCRIPT = """
+([quietMs, timeoutMs]) => new Promise((resolve) => {
+    let quietTimer = null;
+    let capTimer = null;
+    const observer = new MutationObserver(() => {
+        clearTimeout(quietTimer);
+        quietTimer = setTimeout(done, quietMs);
+    });
+    function done() {
+        observer.disconnect();
+        clearTimeout(quietTimer);
+        clearTimeout(capTimer);
+        resolve(true);
+    }
+    observer.observe(document, {
+        childList: true, subtree: true, attributes: true, characterData: true
+    });
+    quietTimer = setTimeout(done, quietMs);
+    capTimer = setTimeout(done, timeoutMs);
+})
+"""
+
+
+class WaitStrategy:
+    """Waits until a page reaches some observable state."""
+
+    name = "wait"
+
+    async def wait(self, page: Page, timeout: float) -> bool:
+        """Return True if the state was reached within ``timeout`` seconds."""
+        raise NotImplementedError
+
+
+class NetworkIdleWait(WaitStrategy):
+    """Waits until there are no network connections for 500ms."""
+
+    name = "network_idle"
+
+    async def wait(self, page: Page, timeout: float) -> bool:
+        try:
+            await page.wait_for_load_state("networkidle", timeout=timeout * 1000)
+            return True
+        except Exception as e:
+            logger.debug(f"Network did not go idle: {e!s}")
+            return False
+
+
+class DomQuiescenceWait(WaitStrategy):
+    """Waits until the DOM has not mutated for ``quiet_ms`` milliseconds."""
+
+    name = "dom_quiescence"
+
+    def __init__(self, quiet_ms: int = 500):
+        self.quiet_ms = quiet_ms
+
+    async def wait(self, page: Page, timeout: float) -> bool:
+        try:
+            return await page.evaluate(
+                DOM_QUIESCENCE_SCRIPT, [self.quiet_ms, int(timeout * 1000)]
+            )
+        except Exception as e:
+            # The execution context is destroyed when the step navigates away
+            logger.debug(f"DOM quiescence check interrupted: {e!s}")
+            try:
+                await page.wait_for_load_state(
+                    "domcontentloaded", timeout=timeout * 1000
+                )
+                return True
+            except Exception:
+                return False
+
+
+class SelectorWait(WaitStrategy):
+    """Waits until an element matching ``selector`` is attached."""
+
+    name = "selector"
+
+    def __init__(self, selector: str):
+        self.selector = selector
+
+    async def wait(self, page: Page, timeout: float) -> bool:
+        try:
+            await page.wait_for_selector(self.selector, timeout=timeout * 1000)
+            return True
+        except Exception as e:
+            logger.debug(f"Selector {self.selector} did not appear: {e!s}")
+            return False
+
+
+class PolitenessBudget:
+    """Enforces a minimum interval between actions against the same domain."""
+
+    def __init__(self, min_interval: float = 1.0):
+        self.min_interval = min_interval
+        self._last_action: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def acquire(self, url: str) -> float:
+        """Wait for the domain's turn and return the time spent waiting."""
+        domain = urlparse(url).netloc
+        lock = self._locks.setdefault(domain, asyncio.Lock())
+        async with lock:
+            elapsed = time.monotonic() - self._last_action.get(domain, 0.0)
+            delay = max(0.0, self.min_interval - elapsed)
+            if delay:
+                await asyncio.sleep(delay)
+            self._last_action[domain] = time.monotonic()
+            return delay
+
+
+# Shared so that every automation in the process respects the same budget
+default_politeness_budget = PolitenessBudget()
+
+
+class WaitStats:
+    def __init__(self):
+        self.calls: Dict[str, int] = {}
+        self.waited: Dict[str, float] = {}
+        self.saved: Dict[str, float] = {}
+
+    def record(self, name: str, waited: float, baseline: float) -> None:
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.waited[name] = self.waited.get(name, 0.0) + waited
+        self.saved[name] = self.saved.get(name, 0.0) + (baseline - waited)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {
+            name: {
+                "calls": self.calls[name],
+                "waited_seconds": round(self.waited[name], 2),
+                "saved_seconds": round(self.saved[name], 2),
+            }
+            for name in self.calls
+        }
+
+
+class PageSettler:
+    """
+    Replaces fixed sleeps with waits that end as soon as the page is ready.
+
+    Without a selector, the page is considered settled once the network is idle
+    and the DOM has stopped mutating. ``min_delay`` keeps a floor on every wait
+    for rate limiting, and ``max_wait`` caps each strategy. Time saved is measured
+    against ``baseline``, the fixed sleep this replaces.
+    """
+
+    def __init__(
+        self,
+        strategies: Optional[List[WaitStrategy]] = None,
+        politeness: Optional[PolitenessBudget] = None,
+        min_delay: float = 0.0,
+        max_wait: float = 10.0,
+        baseline: float = BASELINE_WAIT,
+    ):
+        self.strategies = strategies or [NetworkIdleWait(), DomQuiescenceWait()]
+        self.politeness = politeness or default_politeness_budget
+        self.min_delay = min_delay
+        self.max_wait = max_wait
+        self.baseline = baseline
+        self.stats = WaitStats()
+
+    async def before_action(self, url: str) -> None:
+        """Respect the per-domain politeness budget before acting on ``url``."""
+        waited = await self.politeness.acquire(url)
+        if waited:
+            self.stats.record("politeness", waited, 0.0)
+
+    async def settle(self, page: Page, selector: Optional[str] = None) -> float:
+        """Wait until ``page`` is ready and return the seconds spent."""
+        strategies = [SelectorWait(selector)] if selector else self.strategies
+        name = "+".join(strategy.name for strategy in strategies)
+
+        start = time.monotonic()
+        for strategy in strategies:
+            remaining = self.max_wait - (time.monotonic() - start)
+            if remaining <= 0:
+                break
+            await strategy.wait(page, remaining)
+
+        elapsed = time.monotonic() - start
+        if elapsed < self.min_delay:
+            await asyncio.sleep(self.min_delay - elapsed)
+            elapsed = self.min_delay
+
+        self.stats.record(name, elapsed, self.baseline)
+        return elapsed
+
+    def log_summary(self) -> None:
+        for name, values in self.stats.summary().items():
+            logger.info(
+                f"Wait strategy {name}: {values['calls']} waits, "
+                f"{values['waited_seconds']}s waited, {values['saved_seconds']}s saved"
+            )
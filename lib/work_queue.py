@@ -0,0 +1,282 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from pydantic import BaseModel, Field
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_PATH = "output/work_queue.sqlite"
+
+# Pipeline stages, in order; finishing one enqueues the next for the same key
+SCHEMA = "schema"
+URLS = "urls"
+EXTRACT = "extract"
+STAGES = (SCHEMA, URLS, EXTRACT)
+NEXT_STAGE = {SCHEMA: URLS, URLS: EXTRACT}
+
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+STATES = (PENDING, IN_FLIGHT, DONE, FAILED)
+
+# Matches only the claim a task came from: slots of one worker share its id,
+# and every claim increments attempts
+LEASE_HELD = "id = ? AND state = ? AND lease_owner = ? AND attempts = ?"
+
+
+class Task(BaseModel):
+    id: int
+    stage: str
+    key: str
+    payload: Dict[str, Any] = Field(default_factory=dict)
+    attempts: int = Field(default=0, description="Claims so far, including this one")
+    lease_owner: Optional[str] = None
+    lease_expires: Optional[float] = None
+
+    def lease(self) -> tuple:
+        """Parameters of ``LEASE_HELD`` for this claim."""
+        return (self.id, IN_FLIGHT, self.lease_owner, self.attempts)
+
+
+class WorkQueue:
+    """
+    SQLite-backed queue of pipeline tasks shared by every worker on the host.
+
+    Each ``(stage, key)`` is one task that moves from pending to in_flight when a
+    worker claims it, holding a lease for ``lease_seconds``. Leases that are not
+    renewed (the worker died) expire and the task is claimed again. Failed
+    tasks wait ``retry_backoff * 2 ** (attempts - 1)`` seconds before their next
+    attempt, and are marked failed after ``max_attempts``.
+
+    Workers on several hosts can share one queue file on a network filesystem
+    with ``network_fs``, which switches from WAL (needs shared memory, so a
+    single host) to rollback journaling; the filesystem must support locks.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_QUEUE_PATH,
+        lease_seconds: float = 900.0,
+        max_attempts: int = 3,
+        retry_backoff: float = 60.0,
+        network_fs: bool = False,
+    ):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Transactions are managed explicitly so claims can take a write lock
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self._conn.execute(f"PRAGMA journal_mode={'DELETE' if network_fs else 'WAL'}")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                stage TEXT NOT NULL,
+                key TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                retry_at REAL NOT NULL DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires REAL,
+                last_error TEXT,
+                updated_at REAL NOT NULL,
+                UNIQUE (stage, key)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS tasks_claim ON tasks(state, retry_at)"
+        )
+
+    def enqueue(
+        self,
+        stage: str,
+        key: str,
+        payload: Optional[Dict[str, Any]] = None,
+        requeue: bool = False,
+    ) -> bool:
+        """
+        Add a task and return whether it was queued.
+
+        An existing task for ``(stage, key)`` is left alone unless ``requeue``
+        is set and it is not in flight, in which case it becomes pending again.
+        """
+        now = time.time()
+        data = json.dumps(payload or {})
+        cursor = self._conn.execute(
+            "INSERT OR IGNORE INTO tasks (stage, key, payload, state, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (stage, key, data, PENDING, now),
+        )
+        if cursor.rowcount:
+            return True
+        if not requeue:
+            return False
+        cursor = self._conn.execute(
+            "UPDATE tasks SET state = ?, payload = ?, attempts = 0, retry_at = 0, "
+            "last_error = NULL, updated_at = ? "
+            "WHERE stage = ? AND key = ? AND state != ?",
+            (PENDING, data, now, stage, key, IN_FLIGHT),
+        )
+        return bool(cursor.rowcount)
+
+    def claim(
+        self, worker_id: str, stages: Optional[Iterable[str]] = None
+    ) -> Optional[Task]:
+        """Lease the oldest ready task of ``stages``, or return None."""
+        stages = list(stages or STAGES)
+        placeholders = ", ".join("?" for _ in stages)
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._expire_leases(now)
+            row = self._conn.execute(
+                "SELECT id, stage, key, payload, attempts FROM tasks "
+                f"WHERE state = ? AND retry_at <= ? AND stage IN ({placeholders}) "
+                "ORDER BY retry_at, id LIMIT 1",
+                (PENDING, now, *stages),
+            ).fetchone()
+            if row is None:
+                self._conn.execute("COMMIT")
+                return None
+            task = Task(
+                id=row[0],
+                stage=row[1],
+                key=row[2],
+                payload=json.loads(row[3]),
+                attempts=row[4] + 1,
+                lease_owner=worker_id,
+                lease_expires=now + self.lease_seconds,
+            )
+            self._conn.execute(
+                "UPDATE tasks SET state = ?, attempts = ?, lease_owner = ?, "
+                "lease_expires = ?, updated_at = ? WHERE id = ?",
+                (IN_FLIGHT, task.attempts, worker_id, task.lease_expires, now, task.id),
+            )
+            self._conn.execute("COMMIT")
+            return task
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _expire_leases(self, now: float) -> None:
+        expired = self._conn.execute(
+            "SELECT id, stage, key, lease_owner FROM tasks "
+            "WHERE state = ? AND lease_expires < ?",
+            (IN_FLIGHT, now),
+        ).fetchall()
+        for task_id, stage, key, owner in expired:
+            logger.warning(f"Lease of {stage}:{key} held by {owner} expired")
+            self._conn.execute(
+                "UPDATE tasks SET state = ?, lease_owner = NULL, lease_expires = NULL, "
+                "last_error = ?, updated_at = ? WHERE id = ?",
+                (PENDING, f"lease held by {owner} expired", now, task_id),
+            )
+
+    def heartbeat(self, task: Task) -> bool:
+        """Extend the lease of ``task``; False means another worker took it over."""
+        lease_expires = time.time() + self.lease_seconds
+        cursor = self._conn.execute(
+            f"UPDATE tasks SET lease_expires = ? WHERE {LEASE_HELD}",
+            (lease_expires, *task.lease()),
+        )
+        if cursor.rowcount:
+            # Only a renewal that went through extends the lease
+            task.lease_expires = lease_expires
+        return bool(cursor.rowcount)
+
+    def complete(self, task: Task) -> bool:
+        """
+        Mark ``task`` done and queue the next stage for its key.
+
+        Returns False, changing nothing, if the lease was lost in the meantime;
+        the worker that took the task over completes it instead.
+        """
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = self._conn.execute(
+                "UPDATE tasks SET state = ?, lease_owner = NULL, lease_expires = NULL, "
+                f"last_error = NULL, updated_at = ? WHERE {LEASE_HELD}",
+                (DONE, time.time(), *task.lease()),
+            )
+            owned = bool(cursor.rowcount)
+            next_stage = NEXT_STAGE.get(task.stage)
+            if owned and next_stage:
+                self.enqueue(next_stage, task.key, task.payload, requeue=True)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        if not owned:
+            logger.warning(f"Lease of {task.stage}:{task.key} was lost, not completing")
+        return owned
+
+    def fail(self, task: Task, error: str) -> bool:
+        """
+        Schedule a retry with exponential backoff, or give up on ``task``.
+
+        Returns False, changing nothing, if the lease was lost in the meantime.
+        """
+        now = time.time()
+        if task.attempts >= self.max_attempts:
+            state, retry_at = FAILED, 0.0
+        else:
+            state = PENDING
+            retry_at = now + self.retry_backoff * 2 ** (task.attempts - 1)
+        cursor = self._conn.execute(
+            "UPDATE tasks SET state = ?, retry_at = ?, lease_owner = NULL, "
+            "lease_expires = NULL, last_error = ?, updated_at = ? "
+            f"WHERE {LEASE_HELD}",
+            (state, retry_at, error, now, *task.lease()),
+        )
+        if not cursor.rowcount:
+            logger.warning(f"Lease of {task.stage}:{task.key} was lost, not failing")
+            return False
+        if state == FAILED:
+            logger.error(
+                f"Task {task.stage}:{task.key} failed after {task.attempts} "
+                f"attempts: {error}"
+            )
+        else:
+            logger.warning(
+                f"Task {task.stage}:{task.key} failed (attempt {task.attempts}), "
+                f"retrying in {retry_at - now:.0f}s: {error}"
+            )
+        return True
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        counts = {stage: {state: 0 for state in STATES} for stage in STAGES}
+        for stage, state, count in self._conn.execute(
+            "SELECT stage, state, COUNT(*) FROM tasks GROUP BY stage, state"
+        ):
+            counts.setdefault(stage, {state: 0 for state in STATES})[state] = count
+        return counts
+
+    def unfinished(self) -> int:
+        """Tasks that are pending or in flight, i.e. the work left to do."""
+        (count,) = self._conn.execute(
+            "SELECT COUNT(*) FROM tasks WHERE state IN (?, ?)", (PENDING, IN_FLIGHT)
+        ).fetchone()
+        return count
+
+    def log_summary(self) -> None:
+        for stage, states in self.counts().items():
+            logger.info(
+                f"Queue {stage}: "
+                + ", ".join(f"{count} {state}" for state, count in states.items())
+            )
+
+    def close(self) -> None:
+        self._conn.close()
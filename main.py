@@ -1,28 +1,51 @@
+import argparse
 import asyncio
 import json
 import os
 
 from lib.file_utils import create_nested_directory
+from lib.playwright_browser_manager import BrowserPool
+from lib.schema_health import clear_health, is_broken, validate_schema
+from lib.work_queue import DEFAULT_QUEUE_PATH, STAGES, WorkQueue
 from scripts.create_web_search_schema import generate_search_page_schema
 from scripts.extract_urls import extract_urls
+from scripts.queue_worker import (
+    BROKER_WEBSITES_FILE,
+    run_worker_processes,
+    seed_queue,
+)
 
 
 async def process_single_key(key, url):
     if not os.path.exists(f"output/{key}/web_search_schema.json"):
         create_nested_directory(f"output/{key}")
         await generate_search_page_schema(key, url)
+    elif is_broken(f"output/{key}"):
+        # A cached response would return the same stale schema
+        print(f"Regenerating the broken schema of {key}")
+        await generate_search_page_schema(key, url, bypass_cache=True)
+        clear_health(f"output/{key}")
     # await extract_urls(key)
 
 
-async def extract_urls_in_parallel(urls, max_concurrent=5):
+async def extract_urls_in_parallel(
+    urls, max_concurrent=5, pool_size=2, incremental=False
+):
     semaphore = asyncio.Semaphore(max_concurrent)
 
-    async def bounded_process(key):
-        async with semaphore:
-            await extract_urls(key)
+    async with BrowserPool(size=pool_size, headless=False) as browser_pool:
 
-    tasks = [bounded_process(obj["key"]) for obj in urls]
-    await asyncio.gather(*tasks)
+        async def bounded_process(key):
+            if is_broken(f"output/{key}"):
+                print(f"Skipping {key}: its schema is broken, run schema to regenerate")
+                return
+            async with semaphore:
+                await extract_urls(
+                    key, browser_pool=browser_pool, incremental=incremental
+                )
+
+        tasks = [bounded_process(obj["key"]) for obj in urls]
+        await asyncio.gather(*tasks)
 
 
 async def process_keys_in_parallel(urls, max_concurrent=5):
@@ -36,20 +59,116 @@ async def process_keys_in_parallel(urls, max_concurrent=5):
     await asyncio.gather(*tasks)
 
 
+async def validate_schemas_in_parallel(keys, max_concurrent=5, pool_size=2):
+    semaphore = asyncio.Semaphore(max_concurrent)
+
+    async with BrowserPool(size=pool_size, headless=False) as browser_pool:
+
+        async def bounded_validate(key):
+            async with semaphore:
+                return await validate_schema(key, browser_pool=browser_pool)
+
+        results = await asyncio.gather(*(bounded_validate(key) for key in keys))
+    for health in results:
+        print(
+            f"{health.key}: {health.status}"
+            + (f" ({'; '.join(health.reasons)})" if health.reasons else "")
+        )
+
+
+async def launch_validate_run(keys=None, max_concurrent=5):
+    if not keys:
+        with open("output/extracted_broker_websites.json", "r") as f:
+            keys = [obj["key"] for obj in json.load(f)]
+    keys = [k for k in keys if os.path.exists(f"output/{k}/web_search_schema.json")]
+    await validate_schemas_in_parallel(keys, max_concurrent=max_concurrent)
+
+
 async def launch_schema_run_for_all_keys():
     with open("output/extracted_broker_websites.json", "r") as f:
         urls = json.load(f)
     await process_keys_in_parallel(urls)
 
 
-async def launch_extract_run_for_all_keys():
+async def launch_extract_run_for_all_keys(incremental=False):
     with open("output/extracted_broker_websites.json", "r") as f:
         urls = json.load(f)
-    await extract_urls_in_parallel(urls)
+    await extract_urls_in_parallel(urls, incremental=incremental)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Broker listing pipeline")
+    parser.add_argument("--queue", default=DEFAULT_QUEUE_PATH, help="Work queue file")
+    parser.add_argument(
+        "--network-fs",
+        action="store_true",
+        help="The queue and LLM cache files are shared with other hosts over a "
+        "network filesystem",
+    )
+    commands = parser.add_subparsers(dest="command")
+
+    commands.add_parser("schema", help="Generate missing search schemas (default)")
+    urls = commands.add_parser("urls", help="Extract listing urls for every broker")
+    urls.add_argument("--incremental", action="store_true")
+
+    enqueue = commands.add_parser("enqueue", help="Queue brokers for a stage")
+    enqueue.add_argument("--stage", choices=STAGES, default=STAGES[0])
+    enqueue.add_argument("--brokers", default=BROKER_WEBSITES_FILE)
+    enqueue.add_argument(
+        "--requeue", action="store_true", help="Queue again tasks that already ran"
+    )
+
+    worker = commands.add_parser("worker", help="Run queued tasks")
+    worker.add_argument("--concurrency", type=int, default=4)
+    worker.add_argument(
+        "--processes", type=int, default=1, help="Worker processes to launch"
+    )
+    worker.add_argument("--stages", nargs="+", choices=STAGES)
+    worker.add_argument("--pool-size", type=int, default=2)
+    worker.add_argument("--incremental", action="store_true")
+    worker.add_argument(
+        "--until-empty", action="store_true", help="Exit once the queue is drained"
+    )
+
+    validate = commands.add_parser(
+        "validate-schema", help="Check schema selectors without a full crawl"
+    )
+    validate.add_argument("--keys", nargs="+", help="Brokers to check (default: all)")
+    validate.add_argument("--concurrency", type=int, default=5)
+
+    commands.add_parser("status", help="Show task counts per stage")
+    return parser.parse_args(argv)
 
 
 def main():
-    asyncio.run(launch_schema_run_for_all_keys())
+    args = parse_args()
+    if args.command == "urls":
+        asyncio.run(launch_extract_run_for_all_keys(incremental=args.incremental))
+    elif args.command == "enqueue":
+        queue = WorkQueue(args.queue, network_fs=args.network_fs)
+        seed_queue(queue, args.brokers, stage=args.stage, requeue=args.requeue)
+        queue.log_summary()
+        queue.close()
+    elif args.command == "worker":
+        run_worker_processes(
+            args.processes,
+            queue_path=args.queue,
+            concurrency=args.concurrency,
+            stages=args.stages,
+            until_empty=args.until_empty,
+            pool_size=args.pool_size,
+            incremental=args.incremental,
+            network_fs=args.network_fs,
+        )
+    elif args.command == "validate-schema":
+        asyncio.run(launch_validate_run(args.keys, max_concurrent=args.concurrency))
+    elif args.command == "status":
+        queue = WorkQueue(args.queue, network_fs=args.network_fs)
+        for stage, states in queue.counts().items():
+            print(f"{stage}: " + ", ".join(f"{n} {s}" for s, n in states.items()))
+        queue.close()
+    else:
+        asyncio.run(launch_schema_run_for_all_keys())
 
 
 if __name__ == "__main__":
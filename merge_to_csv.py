@@ -6,11 +6,32 @@ Handles URL prefixing for relative URLs using the source_url domain.
 
 import csv
 import glob
+import hashlib
 import json
 import os
-from typing import Any, Dict, List
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
 from urllib.parse import urljoin, urlparse
 
+from lib.batch_normalizer import (
+    URL_LIST_FIELDS,
+    iter_batches,
+    join_lists,
+    normalize_batch,
+)
+from lib.record_store import iter_record_file, jsonl_paths
+from lib.url_canonicalizer import CanonicalUrlIndex
+
+try:
+    from lib.schema import PropertyData
+except ImportError:  # Columns then come from a pre-scan of the data files
+    PropertyData = None
+
+MANIFEST_FILENAME = "merge_manifest.json"
+# Converted inputs, kept between runs so unchanged files are not parsed again
+PARTS_DIRNAME = ".merge_parts"
+
 
 def extract_base_url(source_url: str) -> str:
     """
@@ -135,82 +156,375 @@ def find_json_files(output_dir: str = "output") -> List[str]:
     return glob.glob(pattern)
 
 
-def merge_json_to_csv(output_file: str = "merged_properties.csv"):
+def find_data_files(output_dir: str = "output") -> List[str]:
     """
-    Merge all extracted_data.json files into a single CSV file.
+    Find the record files to merge, one key directory at a time.
+
+    The compacted extracted_data.json is used where it exists; otherwise the
+    JSONL record store (main file and worker shards) of an unfinished run.
 
     Args:
-        output_file: The output CSV file path
+        output_dir: The output directory to search
+
+    Returns:
+        List of paths to JSON array and JSONL files
+    """
+    data_files = []
+    for key_dir in sorted(glob.glob(os.path.join(output_dir, "*", ""))):
+        json_path = os.path.join(key_dir, "extracted_data.json")
+        if os.path.exists(json_path):
+            data_files.append(json_path)
+        else:
+            data_files.extend(jsonl_paths(key_dir))
+    return data_files
+
+
+def get_fieldnames(
+    data_files: List[str],
+    max_workers: Optional[int] = None,
+    file_fields: Optional[Dict[str, List[str]]] = None,
+) -> List[str]:
     """
-    json_files = find_json_files()
+    Columns of the merged CSV, in sorted order.
 
-    if not json_files:
-        print("No extracted_data.json files found in the output directory.")
-        return
+    Taken from the PropertyData model when it can be imported, otherwise from a
+    streaming pre-scan of the record keys in every file. Files already in
+    ``file_fields`` are not scanned again; scanned files are added to it.
+    """
+    if PropertyData is not None:
+        return sorted(PropertyData.model_fields)
+    file_fields = {} if file_fields is None else file_fields
+    to_scan = [data_file for data_file in data_files if data_file not in file_fields]
+    for data_file, fields in zip(to_scan, _map(_scan_fields, to_scan, max_workers)):
+        file_fields[data_file] = sorted(fields)
+    fields = set()
+    for data_file in data_files:
+        fields.update(file_fields[data_file])
+    return sorted(fields)
+
+
+def _scan_fields(data_file: str) -> Set[str]:
+    fields = set()
+    try:
+        for record in iter_record_file(data_file):
+            if isinstance(record, dict):
+                fields.update(record.keys())
+    except Exception as e:
+        print(f"Error scanning {data_file}: {e}")
+    return fields
 
-    print(f"Found {len(json_files)} JSON files to merge:")
-    for file_path in json_files:
-        print(f"  - {file_path}")
 
-    all_records = []
-    total_processed = 0
+def listing_key(canonical_url: str) -> str:
+    """Short, stable hash of a canonical listing URL for de-duplication."""
+    return hashlib.blake2b(canonical_url.encode("utf-8"), digest_size=8).hexdigest()
 
-    # Process each JSON file
-    for json_file in json_files:
-        print(f"\nProcessing {json_file}...")
 
-        try:
-            with open(json_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
+def _write_part(task: Tuple[str, str, List[str]]) -> Dict[str, Any]:
+    """
+    Stream one data file into a headerless CSV part.
+
+    Records are normalized in column batches by ``lib.batch_normalizer``,
+    which matches ``process_record`` and also parses price and sqft strings.
+    Next to each row, the ``.keys`` file holds a hash of the row's canonical
+    listing URL (empty when there is none) and the row's length in bytes, so
+    parts can be concatenated without parsing the CSV again while duplicates
+    across files are dropped.
+    """
+    data_file, part_file, fieldnames = task
+    result = {"data_file": data_file, "part_file": part_file, "error": None}
+    known_fields = set(fieldnames)
+    extra_fields = set()
+    rows = discarded = 0
+    row_buffer = _RowBuffer()
+    writer = csv.writer(row_buffer)
+    try:
+        # Variants of the same listing URL are merged once
+        url_index = CanonicalUrlIndex(os.path.dirname(data_file))
+        with open(part_file, "wb") as part, open(
+            part_file + ".keys", "w", encoding="utf-8"
+        ) as keys:
+            for batch in iter_batches(iter_record_file(data_file)):
+                normalized = normalize_batch(batch)
+                discarded += len(batch) - len(normalized)
+                if not normalized:
+                    continue
+                extra_fields.update(normalized.columns.keys() - known_fields)
+                for name in URL_LIST_FIELDS:
+                    if name in normalized.columns:
+                        normalized.columns[name] = join_lists(normalized.columns[name])
+                source_urls = normalized.column("source_url")
+                for row, url in zip(normalized.rows(fieldnames), source_urls):
+                    writer.writerow(row)
+                    data = row_buffer.pop().encode("utf-8")
+                    part.write(data)
+                    key = listing_key(url_index.canonical(url)) if url else ""
+                    keys.write(f"{key}\t{len(data)}\n")
+                rows += len(normalized)
+    except Exception as e:
+        result["error"] = str(e)
+    result.update(rows=rows, discarded=discarded, extra_fields=sorted(extra_fields))
+    return result
 
-            if not isinstance(data, list):
-                print(f"Warning: {json_file} does not contain a list. Skipping.")
-                continue
 
-            # Process each record in the file
-            file_records = 0
-            for record in data:
-                if isinstance(record, dict):
-                    processed_record = process_record(record)
-                    if processed_record:
-                        all_records.append(processed_record)
-                        file_records += 1
+class _RowBuffer:
+    """File-like target for csv.writer that hands back each written row."""
 
-            print(
-                f"  Processed {file_records} records (after discarding null addresses)"
-            )
-            total_processed += file_records
+    def __init__(self):
+        self._row = ""
 
-        except Exception as e:
-            print(f"Error processing {json_file}: {e}")
-            continue
+    def write(self, text: str) -> None:
+        self._row += text
 
-    if not all_records:
-        print("No valid records found to write to CSV.")
+    def pop(self) -> str:
+        row, self._row = self._row, ""
+        return row
+
+
+def _map(function, items: List[Any], max_workers: Optional[int]) -> Iterator[Any]:
+    """Map over ``items`` in worker processes, yielding results in order."""
+    if len(items) <= 1 or max_workers == 1:
+        yield from map(function, items)
         return
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        yield from pool.map(function, items)
+
+
+def _append_part(out, part_file: str, seen_listings: Set[str]) -> Tuple[int, int]:
+    """Copy the rows of a part to ``out``, skipping listings already seen."""
+    file_records = 0
+    duplicates = 0
+    with open(part_file, "rb") as part, open(
+        part_file + ".keys", encoding="utf-8"
+    ) as keys:
+        for line in keys:
+            key, _, length = line.rstrip("\n").partition("\t")
+            row = part.read(int(length))
+            if key:
+                if key in seen_listings:
+                    duplicates += 1
+                    continue
+                seen_listings.add(key)
+            out.write(row)
+            file_records += 1
+    return file_records, duplicates
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint(path: str, previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Size, mtime and sha256 of an input file.
 
-    # Get all unique field names
-    all_fields = set()
-    for record in all_records:
-        all_fields.update(record.keys())
+    The hash of ``previous`` is reused when size and mtime still match, so
+    unchanged files are not read; a touched but identical file is hashed and
+    still counts as unchanged.
+    """
+    stat = os.stat(path)
+    fields = {"size": stat.st_size, "mtime": stat.st_mtime}
+    if previous and all(previous.get(name) == value for name, value in fields.items()):
+        fields["sha256"] = previous["sha256"]
+    else:
+        fields["sha256"] = file_sha256(path)
+    return fields
+
+
+def load_manifest(output_dir: str = "output") -> Dict[str, Any]:
+    path = os.path.join(output_dir, MANIFEST_FILENAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        print(f"Warning: could not parse {path}, merging everything")
+        return {}
 
-    # Sort fields for consistent column order
-    fieldnames = sorted(all_fields)
 
-    # Write to CSV
-    print(f"\nWriting {len(all_records)} records to {output_file}...")
+def save_manifest(manifest: Dict[str, Any], output_dir: str = "output") -> None:
+    path = os.path.join(output_dir, MANIFEST_FILENAME)
+    fd, temp_path = tempfile.mkstemp(dir=output_dir, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp_path, path)
 
-    try:
-        with open(output_file, "w", newline="", encoding="utf-8") as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(all_records)
 
-        print(f"Successfully created {output_file} with {len(all_records)} records")
-        print(f"Columns: {', '.join(fieldnames)}")
+def _part_path(parts_dir: str, data_file: str) -> str:
+    name = hashlib.sha1(os.path.abspath(data_file).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(parts_dir, f"{name}.csv")
+
+
+def _csv_line(row: List[str]) -> bytes:
+    buffer = _RowBuffer()
+    csv.writer(buffer).writerow(row)
+    return buffer.pop().encode("utf-8")
+
+
+def merge_json_to_csv(
+    output_file: str = "merged_properties.csv",
+    output_dir: str = "output",
+    max_workers: Optional[int] = None,
+    full: bool = False,
+):
+    """
+    Merge all extracted data files into a single CSV file.
+
+    Records are streamed from each file and written out as they are parsed, so
+    memory stays flat however large the corpus is; only a short hash per
+    listing is kept to drop duplicate URLs across files. Files are converted
+    in parallel, one per worker process, into CSV parts that are kept in
+    ``<output_dir>/.merge_parts``.
+
+    The merge manifest records each input's size, mtime, sha256 and row range
+    in the output. On the next run only inputs whose content changed are
+    converted again; the output is then rebuilt by copying the stored parts,
+    or left alone when nothing changed.
+
+    Args:
+        output_file: The output CSV file path
+        output_dir: The directory holding one subdirectory per key
+        max_workers: Worker processes (defaults to the CPU count)
+        full: Ignore the manifest and convert every input again
+    """
+    data_files = find_data_files(output_dir)
+
+    if not data_files:
+        print("No extracted data files found in the output directory.")
+        return
 
+    print(f"Found {len(data_files)} data files to merge:")
+    for file_path in data_files:
+        print(f"  - {file_path}")
+
+    manifest = {} if full else load_manifest(output_dir)
+    previous = manifest.get("inputs", {})
+    parts_dir = os.path.join(output_dir, PARTS_DIRNAME)
+    os.makedirs(parts_dir, exist_ok=True)
+
+    inputs: Dict[str, Dict[str, Any]] = {}
+    unchanged: Dict[str, Dict[str, Any]] = {}
+    for data_file in data_files:
+        old = previous.get(data_file)
+        entry = fingerprint(data_file, old)
+        entry["part"] = _part_path(parts_dir, data_file)
+        if old and old["sha256"] == entry["sha256"]:
+            unchanged[data_file] = old
+        inputs[data_file] = entry
+
+    file_fields = {
+        data_file: old["fields"]
+        for data_file, old in unchanged.items()
+        if old.get("fields") is not None
+    }
+    fieldnames = get_fieldnames(data_files, max_workers, file_fields)
+    if not fieldnames:
+        print("No valid records found to write to CSV.")
+        return
+    if PropertyData is None:
+        for data_file, entry in inputs.items():
+            entry["fields"] = file_fields[data_file]
+
+    changed = []
+    for data_file, entry in inputs.items():
+        old = unchanged.get(data_file)
+        # Parts are written in column order, so new columns invalidate them all
+        if (
+            old
+            and manifest.get("fieldnames") == fieldnames
+            and os.path.exists(entry["part"] + ".keys")
+        ):
+            entry["discarded"] = old["discarded"]
+        else:
+            changed.append(data_file)
+
+    removed = set(previous) - set(inputs)
+    for data_file in removed:
+        for path in (
+            previous[data_file]["part"],
+            previous[data_file]["part"] + ".keys",
+        ):
+            if os.path.exists(path):
+                os.remove(path)
+
+    output_path = os.path.abspath(output_file)
+    if (
+        not changed
+        and not removed
+        and manifest.get("output_file") == output_path
+        and os.path.exists(output_path)
+        and os.path.getsize(output_path) == manifest.get("output_size")
+    ):
+        print(f"\nAll inputs unchanged; {output_file} is up to date")
+        # Remember new mtimes of touched files so they are not hashed again
+        for data_file, entry in inputs.items():
+            entry["rows"] = previous[data_file].get("rows")
+        save_manifest({**manifest, "inputs": inputs}, output_dir)
+        return
+
+    print(f"\n{len(changed)} of {len(data_files)} data files changed")
+    tasks = [
+        (data_file, inputs[data_file]["part"], fieldnames) for data_file in changed
+    ]
+    for result in _map(_write_part, tasks, max_workers):
+        data_file = result["data_file"]
+        print(f"\nProcessing {data_file}...")
+        if result["error"]:
+            print(f"Error processing {data_file}: {result['error']}")
+            del inputs[data_file]
+            continue
+        if result["extra_fields"]:
+            print(
+                "  Ignoring fields outside the schema: "
+                + ", ".join(result["extra_fields"])
+            )
+        inputs[data_file]["discarded"] = result["discarded"]
+
+    total_processed = 0
+    seen_listings = set()
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(output_path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as csvfile:
+            csvfile.write(_csv_line(fieldnames))
+            for data_file, entry in inputs.items():
+                file_records, duplicates = _append_part(
+                    csvfile, entry["part"], seen_listings
+                )
+                entry["rows"] = [total_processed, total_processed + file_records]
+                total_processed += file_records
+                status = "" if data_file in changed else " (unchanged)"
+                print(
+                    f"  {data_file}{status}: {file_records} records (after "
+                    f"discarding {entry['discarded']} null addresses and "
+                    f"{duplicates} duplicate urls)"
+                )
+
+        if not total_processed:
+            print("No valid records found to write to CSV.")
+            return
+        os.replace(temp_path, output_path)
     except Exception as e:
         print(f"Error writing CSV file: {e}")
+        return
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    save_manifest(
+        {
+            "output_file": output_path,
+            "output_size": os.path.getsize(output_path),
+            "fieldnames": fieldnames,
+            "inputs": inputs,
+        },
+        output_dir,
+    )
+    print(f"Successfully created {output_file} with {total_processed} records")
+    print(f"Columns: {', '.join(fieldnames)}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Script to export all extracted data as a Parquet dataset, one partition per key.
+Keeps the PropertyData column types instead of flattening them into CSV text.
+"""
+
+import os
+import shutil
+import typing
+from typing import Any, Dict, List, Optional, Set
+
+from lib.batch_normalizer import parse_price, parse_sqft
+from lib.record_store import iter_record_file
+from lib.schema import PropertyData
+from lib.url_canonicalizer import CanonicalUrlIndex
+from merge_to_csv import extract_base_url, find_data_files, fix_url_list, listing_key
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # The CSV merge works without it
+    pa = None
+    pq = None
+
+PARTITION_COLUMN = "broker_key"
+# Rows are sorted by these columns so each row group covers a narrow range of
+# them, and its min/max statistics let readers skip it
+SORT_COLUMNS = ("state", "city", "price")
+URL_LIST_FIELDS = ("property_image_urls", "brochure_doc_urls")
+# Parsed as the CSV merge parses them, so "$1.2M" or "2,500 SF" match there
+NUMBER_PARSERS = {"price": parse_price, "sqft": parse_sqft}
+
+
+def _arrow_type(annotation: Any) -> "pa.DataType":
+    """Arrow type of a PropertyData field annotation, unwrapping Optional."""
+    args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+    if typing.get_origin(annotation) is typing.Union and len(args) == 1:
+        return _arrow_type(args[0])
+    if typing.get_origin(annotation) is list:
+        return pa.list_(_arrow_type(args[0]) if args else pa.string())
+    if annotation is float:
+        return pa.float64()
+    if annotation is int:
+        return pa.int64()
+    if annotation is bool:
+        return pa.bool_()
+    return pa.string()
+
+
+def property_schema() -> "pa.Schema":
+    """Arrow schema of a PropertyData record, columns in sorted order."""
+    return pa.schema(
+        [
+            pa.field(name, _arrow_type(field.annotation))
+            for name, field in sorted(PropertyData.model_fields.items())
+        ]
+    )
+
+
+def _coerce(value: Any, arrow_type: "pa.DataType") -> Any:
+    """Convert a raw record value to ``arrow_type``, or None if it does not fit."""
+    if value is None or value == "":
+        return None
+    try:
+        if pa.types.is_list(arrow_type):
+            if isinstance(value, str):
+                value = value.split("\n")
+            return [str(item) for item in value if item]
+        if pa.types.is_floating(arrow_type):
+            return float(str(value).replace(",", "").replace("$", "").strip())
+        if pa.types.is_integer(arrow_type):
+            return int(float(str(value).replace(",", "").strip()))
+        if pa.types.is_boolean(arrow_type):
+            return bool(value)
+    except (TypeError, ValueError):
+        return None
+    return str(value)
+
+
+def record_to_row(
+    record: Dict[str, Any], schema: "pa.Schema"
+) -> Optional[Dict[str, Any]]:
+    """
+    Type a record for the Parquet export with absolute URLs.
+    Returns None if the record should be discarded.
+
+    Args:
+        record: The record dictionary
+        schema: The Arrow schema of the export
+
+    Returns:
+        Row with one value per schema column, or None to discard
+    """
+    # Discard if address is null or empty, as the CSV merge does
+    if not record.get("address"):
+        return None
+
+    row = {field.name: _coerce(record.get(field.name), field.type) for field in schema}
+    for name, parse in NUMBER_PARSERS.items():
+        if name in row:
+            row[name] = parse(record.get(name))
+    base_url = extract_base_url(record.get("source_url", ""))
+    for name in URL_LIST_FIELDS:
+        if row.get(name):
+            row[name] = fix_url_list(row[name], base_url)
+    return row
+
+
+def _group_by_key(data_files: List[str]) -> Dict[str, List[str]]:
+    groups: Dict[str, List[str]] = {}
+    for data_file in data_files:
+        key = os.path.basename(os.path.dirname(data_file))
+        groups.setdefault(key, []).append(data_file)
+    return groups
+
+
+def write_partition(
+    key: str,
+    data_files: List[str],
+    dataset_dir: str,
+    schema: "pa.Schema",
+    seen_listings: Set[str],
+    row_group_size: int = 10000,
+) -> Dict[str, int]:
+    """
+    Write the records of one key as ``<dataset_dir>/broker_key=<key>/``.
+
+    Records are streamed from ``data_files`` into typed columns, sorted by
+    state, city and price, and written with row-group statistics.
+    """
+    columns: Dict[str, List[Any]] = {field.name: [] for field in schema}
+    stats = {"rows": 0, "discarded": 0, "duplicates": 0}
+    # Variants of the same listing URL are exported once
+    url_index = CanonicalUrlIndex(os.path.dirname(data_files[0]))
+    for data_file in data_files:
+        for record in iter_record_file(data_file):
+            if not isinstance(record, dict):
+                continue
+            row = record_to_row(record, schema)
+            if row is None:
+                stats["discarded"] += 1
+                continue
+            source_url = record.get("source_url")
+            if source_url:
+                url_key = listing_key(url_index.canonical(source_url))
+                if url_key in seen_listings:
+                    stats["duplicates"] += 1
+                    continue
+                seen_listings.add(url_key)
+            for name, value in row.items():
+                columns[name].append(value)
+            stats["rows"] += 1
+
+    partition_dir = os.path.join(dataset_dir, f"{PARTITION_COLUMN}={key}")
+    if not stats["rows"]:
+        shutil.rmtree(partition_dir, ignore_errors=True)
+        return stats
+
+    table = pa.Table.from_pydict(columns, schema=schema).sort_by(
+        [(name, "ascending") for name in SORT_COLUMNS]
+    )
+    os.makedirs(partition_dir, exist_ok=True)
+    part_path = os.path.join(partition_dir, "part-0.parquet")
+    temp_path = part_path + ".tmp"
+    pq.write_table(
+        table,
+        temp_path,
+        row_group_size=row_group_size,
+        compression="zstd",
+        write_statistics=True,
+    )
+    os.replace(temp_path, part_path)
+    return stats
+
+
+def merge_json_to_parquet(
+    dataset_dir: str = "merged_properties.parquet",
+    output_dir: str = "output",
+    row_group_size: int = 10000,
+):
+    """
+    Export all extracted data files as a Parquet dataset partitioned by key.
+
+    Each key becomes a hive-style ``broker_key=<key>`` partition, so readers
+    such as ``pyarrow.dataset``, DuckDB or Spark get the key as a column.
+
+    Args:
+        dataset_dir: The directory of the Parquet dataset
+        output_dir: The directory holding one subdirectory per key
+        row_group_size: Rows per row group; smaller groups prune more finely
+    """
+    if pa is None:
+        print("pyarrow is required for the Parquet export: pip install pyarrow")
+        return
+
+    groups = _group_by_key(find_data_files(output_dir))
+    if not groups:
+        print("No extracted data files found in the output directory.")
+        return
+
+    print(f"Found {len(groups)} keys to export to {dataset_dir}")
+    schema = property_schema()
+    seen_listings = set()
+    total_rows = 0
+    for key, data_files in sorted(groups.items()):
+        print(f"\nProcessing {key}...")
+        try:
+            stats = write_partition(
+                key, data_files, dataset_dir, schema, seen_listings, row_group_size
+            )
+        except Exception as e:
+            print(f"Error processing {key}: {e}")
+            continue
+        print(
+            f"  Exported {stats['rows']} records (after discarding "
+            f"{stats['discarded']} null addresses and {stats['duplicates']} "
+            "duplicate urls)"
+        )
+        total_rows += stats["rows"]
+
+    print(f"Successfully exported {total_rows} records to {dataset_dir}")
+
+
+if __name__ == "__main__":
+    merge_json_to_parquet()
@@ -3,14 +3,16 @@ import logging
 import os
 import random
 from datetime import datetime
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from browser_use import Agent, Browser, BrowserConfig, Controller
 from langchain_anthropic import ChatAnthropic
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 
+from lib.adaptive_limiter import default_llm_limiter
 from lib.file_utils import create_nested_directory
+from lib.llm_cache import LLMCache
 from lib.schema import WebSearchSchema
 
 logging.basicConfig(
@@ -39,7 +41,9 @@ default_websearch_schema_prompt = """
 """
 
 
-async def generate_search_page_schema(key: str, url: str):
+async def generate_search_page_schema(
+    key: str, url: str, bypass_cache: bool = False, network_fs: bool = False
+):
     logger.info(f"Creating websearch schema for : {url}")
 
     logger.info("Starting browser automation")
@@ -95,16 +99,25 @@ async def generate_search_page_schema(key: str, url: str):
 
         # Generate the navigation schema
         logger.info("Getting web search schema from LangChain")
-        raw_web_search_schema = await chain.ainvoke(
-            {
-                "timestamp": datetime.now().strftime("%H:%M:%S"),
-                "schema": raw_schema.model_dump_json(),
-                "traversal_path": f"{get_simple_traversal_path()}",
-            }
-        )
+        llm_cache = LLMCache(bypass=bypass_cache, network_fs=network_fs)
+        try:
+            raw_web_search_schema, _ = await llm_cache.ainvoke(
+                chain,
+                {
+                    "timestamp": datetime.now().strftime("%H:%M:%S"),
+                    "schema": raw_schema.model_dump_json(),
+                    "traversal_path": f"{get_simple_traversal_path()}",
+                },
+                limiter=default_llm_limiter,
+            )
 
-        logger.info(f"Raw Web Search schema: {raw_web_search_schema}")
-        web_search_schema = await clean_web_search_schema(raw_web_search_schema, llm)
+            logger.info(f"Raw Web Search schema: {raw_web_search_schema}")
+            web_search_schema = await clean_web_search_schema(
+                raw_web_search_schema, llm, llm_cache
+            )
+        finally:
+            llm_cache.log_summary()
+            llm_cache.close()
         logger.info(f"Cleaned Web Search schema: {web_search_schema}")
 
         logger.info(f"Web Search schema created for {url}")
@@ -119,6 +132,7 @@ async def generate_search_page_schema(key: str, url: str):
 async def clean_web_search_schema(
     json_data: Dict[str, Any],
     llm: ChatAnthropic,
+    llm_cache: Optional[LLMCache] = None,
 ) -> WebSearchSchema:
     try_count = 0
     while try_count < 10:
@@ -169,13 +183,18 @@ async def clean_web_search_schema(
         chain = prompt | llm | JsonOutputParser()
 
         # Generate cleaned schema
-        response = await chain.ainvoke(
-            {
-                "timestamp": datetime.now().strftime("%H:%M:%S"),
-                "schema": json_data,
-                "get_sample_web_search_example": f"{get_sample_web_search_example()}",
-            }
-        )
+        inputs = {
+            "timestamp": datetime.now().strftime("%H:%M:%S"),
+            "schema": json_data,
+            "get_sample_web_search_example": f"{get_sample_web_search_example()}",
+        }
+        cache_key = None
+        if llm_cache:
+            response, cache_key = await llm_cache.ainvoke(
+                chain, inputs, limiter=default_llm_limiter
+            )
+        else:
+            response = await chain.ainvoke(inputs)
 
         try:
             return WebSearchSchema(**response)
@@ -183,6 +202,9 @@ async def clean_web_search_schema(
             logger.error(
                 f"Error cleaning and parsing navigation schema: \n response : {response} \n {e}"
             )
+            # Otherwise the retry would get the same invalid response back
+            if cache_key:
+                llm_cache.invalidate(cache_key)
             try_count += 1
             continue
     raise Exception("Failed to clean and parse web_search_schema")
@@ -9,6 +9,8 @@ from langchain_anthropic import ChatAnthropic
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 
+from lib.llm_cache import LLMCache
+
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
@@ -18,7 +20,7 @@ controller = Controller(
 )
 browser_config = BrowserConfig(headless=False)
 
-async def extract_broker_websites(url: str):
+async def extract_broker_websites(url: str, bypass_cache: bool = False):
     logger.info(f"Extracting broker websites for : {url}")
 
     logger.info("Starting browser automation")
@@ -52,12 +54,18 @@ async def extract_broker_websites(url: str):
 
         # Generate the navigation schema
     logger.info("Getting web search schema from LangChain")
-    raw_broker_website_list = await chain.ainvoke(
+    llm_cache = LLMCache(bypass=bypass_cache)
+    try:
+        raw_broker_website_list, _ = await llm_cache.ainvoke(
+            chain,
             {
                 "timestamp": datetime.now().strftime("%H:%M:%S"),
                 "html_file": raw_html,
-            }
+            },
         )
+    finally:
+        llm_cache.log_summary()
+        llm_cache.close()
 
     logger.info(f"Raw broker website list: {raw_broker_website_list}")
 
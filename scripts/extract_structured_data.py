@@ -1,18 +1,38 @@
 import asyncio
-import fcntl
-import json
 import logging
 import os
-import shutil
-import tempfile
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import List, Optional
 
 from browser_use import Browser, BrowserConfig
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
 
+from lib.adaptive_limiter import (
+    THROTTLE_STATUSES,
+    AdaptiveLimiter,
+    default_fetch_limiter,
+    default_llm_limiter,
+    parse_retry_after,
+)
+from lib.done_index import DoneIndex
+from lib.html_reducer import estimate_tokens, reduce_html
+from lib.http_fetcher import (
+    BROWSER,
+    HTTP,
+    PROBE,
+    FetchStrategyStore,
+    HttpFetcher,
+    find_canonical_link,
+)
+from lib.llm_cache import LLMCache, describe_chain
+from lib.pipeline import FetchExtractPipeline
+from lib.record_store import RecordSink, export_json_array, open_record_sink
 from lib.schema import PropertyData
+from lib.selector_induction import SelectorCache
+from lib.structured_data import ExtractionStats, extract_structured_markup
+from lib.url_canonicalizer import CanonicalUrlIndex, is_plausible_canonical
 
 # Configure logging
 logging.basicConfig(
@@ -22,102 +42,258 @@ logger = logging.getLogger(__name__)
 
 browser_config = BrowserConfig(headless=False)
 
-
-def save_extracted_data(key: str, data: dict, url: str):
-    """Save a single extracted data record to the output file using atomic writes."""
-    output_file = f"output/{key}/extracted_data.json"
-    lock_file = f"{output_file}.lock"
-
-    # Create directory if it doesn't exist
-    os.makedirs(os.path.dirname(output_file), exist_ok=True)
-
-    # Create a temporary file for atomic write
-    with tempfile.NamedTemporaryFile(mode="w", delete=False) as temp_file:
-        temp_filename = temp_file.name
-
-        # Acquire file lock
-        with open(lock_file, "w") as lock:
-            try:
-                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
-
-                # Read existing data if file exists
-                existing_data = []
-                if os.path.exists(output_file):
-                    try:
-                        with open(output_file, "r") as f:
-                            existing_data = json.load(f)
-                    except json.JSONDecodeError:
-                        logger.warning(
-                            f"Could not parse existing data from {output_file}, starting fresh"
-                        )
-
-                # Add new data
-                existing_data.append(data)
-
-                # Write to temporary file
-                json.dump(existing_data, temp_file, indent=2)
-
-                # Release the lock
-                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
-            except Exception as e:
-                logger.error(f"Error during file operation: {str(e)}")
-                raise
-            finally:
-                # Ensure lock is released even if an error occurs
-                try:
-                    fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
-                except:
-                    pass
-
-    # Atomic move of temporary file to target file
-    try:
-        shutil.move(temp_filename, output_file)
-    except Exception as e:
-        logger.error(f"Error during atomic move: {str(e)}")
-        # Clean up temporary file if move fails
-        os.unlink(temp_filename)
-        raise
-
-    logger.info(f"Saved data for URL {url} to {output_file}")
-
-
-async def process_single_url(url: str, browser, chain: JsonOutputParser, key: str):
-    """Process a single URL and extract structured data."""
-    logger.info(f"Processing URL: {url}")
-
+# JSON format of each field in the prompt; pages are asked only for the fields
+# their JSON-LD, microdata and meta tags lack
+FIELD_FORMATS = {
+    "address": '"string or null"',
+    "city": '"string or null"',
+    "state": '"string or null"',
+    "zip": '"string or null"',
+    "price": "number or null",
+    "sqft": "number or null",
+    "beds": "integer or null",
+    "baths": "number or null",
+    "property_image_urls": '["url1", "url2", ...]',
+    "brochure_doc_urls": '["url1", "url2", ...]',
+    "property_type": '"string or null"',
+    "property_description": '"string or null"',
+    "broker": '"string or null"',
+    "broker_url": '"string or null"',
+    "broker_phone": '"string or null"',
+    "broker_email": '"string or null"',
+    "broker_address": '"string or null"',
+}
+
+CANONICAL_LINK_SCRIPT = """
+() => {
+    const link = document.querySelector("link[rel='canonical']");
+    return link ? link.href : null;
+}
+"""
+
+
+class PageSnapshot:
+    """Rendered HTML of a listing page, taken so the page can close before the LLM."""
+
+    def __init__(self, url: str, canonical_url: str, html: str):
+        self.url = url
+        self.canonical_url = canonical_url
+        self.html = html
+
+
+def json_format(fields: List[str]) -> str:
+    """The prompt's JSON format block, listing only ``fields``."""
+    lines = [f'    "{field}": {FIELD_FORMATS[field]}' for field in fields]
+    return "{\n" + ",\n".join(lines) + "\n}"
+
+
+def _resolve_canonical(
+    url: str,
+    declared_url: Optional[str],
+    url_index: CanonicalUrlIndex,
+    done_index: DoneIndex,
+) -> Optional[str]:
+    """Return the canonical URL of ``url``, or None if it is already extracted."""
+    # Variants of one listing share a canonical URL; extract it only once
+    canonical_url = url_index.canonical(url)
+    if declared_url and is_plausible_canonical(url, declared_url):
+        canonical_url = url_index.record_alias(url, declared_url)
+    if done_index.is_done(canonical_url):
+        logger.info(f"Skipping {url}, {canonical_url} is already extracted")
+        return None
+    return canonical_url
+
+
+async def fetch_page(
+    url: str,
+    browser,
+    url_index: CanonicalUrlIndex,
+    done_index: DoneIndex,
+    http_fetcher: Optional[HttpFetcher] = None,
+    fetch_strategies: Optional[FetchStrategyStore] = None,
+    limiter: Optional[AdaptiveLimiter] = None,
+) -> Optional[PageSnapshot]:
+    """
+    Snapshot the HTML of ``url``, or return None if it is already extracted.
+
+    Domains whose probes showed the listing data is server-rendered are fetched
+    with ``http_fetcher``; all others are rendered in ``browser``, holding a
+    ``limiter`` slot for the domain while the page loads.
+    """
+    strategy = BROWSER
+    if http_fetcher and http_fetcher.available and fetch_strategies:
+        strategy = fetch_strategies.strategy(url)
+
+    if strategy == HTTP:
+        html = await http_fetcher.fetch(url)
+        fetch_strategies.record_http_result(url, html is not None)
+        if html is not None:
+            logger.info(f"Fetched URL over HTTP: {url}")
+            fetch_strategies.record_fetch(HTTP)
+            canonical_url = _resolve_canonical(
+                url, find_canonical_link(html, url), url_index, done_index
+            )
+            return PageSnapshot(url, canonical_url, html) if canonical_url else None
+
+    logger.info(f"Rendering URL: {url}")
+    page = None
     try:
         # Create new page and navigate to URL
-        page = await browser.new_page()
-        await page.goto(url)
-        await page.wait_for_load_state("load")
-
-        # Get page content
-        html_content = await page.content()
-
-        # Extract structured data using LangChain
-        raw_data = await chain.ainvoke(
-            {
-                "timestamp": datetime.now().strftime("%H:%M:%S"),
-                "html_content": html_content,
-            }
-        )
-
-        # Validate and convert data using Pydantic model
-        data = PropertyData(**raw_data)
-        data.source_url = url
-        data_dict = data.model_dump()
-
-        # Save data immediately after successful extraction
-        save_extracted_data(key, data_dict, url)
-        logger.info(f"Successfully extracted data from: {url}")
-    except Exception as e:
-        logger.error(f"Error extracting data from {url}: {str(e)}")
+        if limiter:
+            async with limiter.slot(url, channel="browser") as slot:
+                page = await browser.new_page()
+                response = await page.goto(url)
+                await page.wait_for_load_state("load")
+                if response and response.status in THROTTLE_STATUSES:
+                    slot.throttled(
+                        parse_retry_after(response.headers.get("retry-after"))
+                    )
+        else:
+            page = await browser.new_page()
+            await page.goto(url)
+            await page.wait_for_load_state("load")
+
+        declared_url = await page.evaluate(CANONICAL_LINK_SCRIPT)
+        canonical_url = _resolve_canonical(url, declared_url, url_index, done_index)
+        if not canonical_url:
+            return None
+        html = await page.content()
     finally:
-        # Close the page
-        await page.close()
+        # Close the page before the snapshot waits for the LLM
+        if page:
+            await page.close()
+
+    if fetch_strategies:
+        fetch_strategies.record_fetch(BROWSER)
+    if strategy == PROBE:
+        fetch_strategies.record_probe(url, await http_fetcher.fetch(url), html)
+    return PageSnapshot(url, canonical_url, html)
+
+
+async def extract_page(
+    snapshot: PageSnapshot,
+    chain: JsonOutputParser,
+    sink: RecordSink,
+    done_index: DoneIndex,
+    stats: ExtractionStats,
+    focus_main: bool = False,
+    selector_cache: Optional[SelectorCache] = None,
+    llm_cache: Optional[LLMCache] = None,
+    llm_limiter: Optional[AdaptiveLimiter] = None,
+):
+    """Extract structured data from a page snapshot and append it to ``sink``."""
+    url, raw_html = snapshot.url, snapshot.html
+
+    # JSON-LD, microdata and meta tags are read without the LLM
+    structured = extract_structured_markup(raw_html)
+    missing_fields = structured.missing()
+
+    raw_data = {}
+    llm_source = "llm"
+    used_llm = False
+    cache_key = None
+    if missing_fields and selector_cache and selector_cache.should_parse(url):
+        # Selectors learned from earlier LLM results on this domain
+        raw_data = selector_cache.extract(url, raw_html)
+        llm_source = "selector"
+        uncovered = [
+            field
+            for field in selector_cache.uncovered(url)
+            if field not in structured.fields and raw_data.get(field) in (None, "", [])
+        ]
+        if uncovered:
+            # Only the LLM finds these fields on this domain
+            logger.info(f"No selectors for {', '.join(uncovered)}, using the LLM")
+            raw_data = {}
+            llm_source = "llm"
+    if missing_fields and llm_source == "llm":
+        # Strip everything the LLM does not need
+        html_content = reduce_html(raw_html, focus_main=focus_main)
+        logger.info(
+            f"Reduced {url} from {estimate_tokens(raw_html)} to "
+            f"{estimate_tokens(html_content)} tokens, "
+            f"missing fields: {', '.join(missing_fields)}"
+        )
 
+        # Extract structured data using LangChain
+        inputs = {
+            "timestamp": datetime.now().strftime("%H:%M:%S"),
+            "html_content": html_content,
+            "json_format": json_format(missing_fields),
+        }
+        if llm_cache:
+            raw_data, cache_key = await llm_cache.ainvoke(
+                chain, inputs, limiter=llm_limiter
+            )
+        elif llm_limiter:
+            async with llm_limiter.slot(describe_chain(chain)[0] or "llm"):
+                raw_data = await chain.ainvoke(inputs)
+        else:
+            raw_data = await chain.ainvoke(inputs)
+        used_llm = True
+
+    # Validate and convert data using Pydantic model
+    try:
+        merged, provenance = structured.merge(raw_data, llm_source)
+        data = PropertyData(**merged)
+    except Exception:
+        # Otherwise every later run would get the same invalid response back
+        if cache_key:
+            llm_cache.invalidate(cache_key)
+        raise
+    if used_llm and selector_cache:
+        # Only responses that validated are learned from
+        selector_cache.observe(url, raw_html, raw_data)
+    data.source_url = snapshot.canonical_url
+    data.extracted_at = datetime.now().isoformat()
+    data_dict = data.model_dump()
+
+    # Another alias of the listing may have finished while this one waited
+    if done_index.is_done(snapshot.canonical_url):
+        logger.info(f"Dropping {url}, {snapshot.canonical_url} was just extracted")
+        return
 
-async def extract_structured_data(key: str):
+    # Save data immediately after successful extraction
+    sink.append(data_dict)
+    done_index.mark_done(snapshot.canonical_url)
+    stats.record(provenance, used_llm=used_llm)
+    logger.info(f"Successfully extracted data from: {url}")
+
+
+async def extract_structured_data(
+    key: str,
+    ttl_days: Optional[float] = None,
+    force: bool = False,
+    focus_main: bool = False,
+    bypass_cache: bool = False,
+    fetch_concurrency: int = 8,
+    extract_concurrency: int = 16,
+    queue_size: Optional[int] = None,
+    http_fetch: bool = True,
+    fetch_limiter: Optional[AdaptiveLimiter] = None,
+    llm_limiter: Optional[AdaptiveLimiter] = None,
+    shard: Optional[str] = None,
+    network_fs: bool = False,
+):
+    """
+    Extract structured data for every harvested URL of ``key``.
+
+    URLs that already have a record are skipped unless ``force`` is set, or the
+    record is older than ``ttl_days``. ``focus_main`` limits the HTML sent to the
+    LLM to the page's main content region when it has one. Once selectors
+    learned from LLM results are validated for a domain, its pages are parsed
+    without the LLM (see ``SelectorCache``). LLM responses are cached on disk;
+    ``bypass_cache`` ignores cached responses and refreshes them.
+
+    Pages are rendered by up to ``fetch_concurrency`` workers and closed as soon
+    as their HTML is snapshotted; up to ``extract_concurrency`` workers run the
+    LLM on the snapshots, at most ``queue_size`` of which wait in between. The
+    number of requests actually in flight per domain and per model is tuned by
+    ``fetch_limiter`` and ``llm_limiter`` (shared AIMD limiters by default). With
+    ``http_fetch`` each domain is probed and, where its listing data does not
+    need JavaScript, fetched with a pooled HTTP client instead of the browser.
+    ``network_fs`` opens the LLM cache for sharing over a network filesystem.
+    """
     logger.info(f"Extracting structured data for key: {key}")
 
     # Read URLs from the extracted_urls.txt file
@@ -129,6 +305,23 @@ async def extract_structured_data(key: str):
     with open(urls_file, "r") as f:
         urls = [line.strip() for line in f.readlines()]
 
+    url_index = CanonicalUrlIndex(f"output/{key}")
+    if force:
+        done_index = DoneIndex(canonicalize=url_index.canonical)
+    else:
+        ttl = timedelta(days=ttl_days) if ttl_days is not None else None
+        done_index = DoneIndex.from_record_store(
+            f"output/{key}", ttl=ttl, url_index=url_index
+        )
+    total_urls = len(urls)
+    urls = done_index.pending(urls)
+    logger.info(
+        f"{len(urls)} of {total_urls} urls need extraction "
+        f"({total_urls - len(urls)} already done or duplicated)"
+    )
+    if not urls:
+        return
+
     # Initialize browser
     browser = Browser(config=browser_config)
     playwright_browser = await browser.get_playwright_browser()
@@ -146,25 +339,7 @@ async def extract_structured_data(key: str):
         If any field is not found, set it to null.
         
         Required JSON Format:
-        {{
-            "address": "string or null",
-            "city": "string or null",
-            "state": "string or null",
-            "zip": "string or null",
-            "price": number or null,
-            "sqft": number or null,
-            "beds": integer or null,
-            "baths": number or null,
-            "property_image_urls": ["url1", "url2", ...],
-            "brochure_doc_urls": ["url1", "url2", ...],
-            "property_type": "string or null",
-            "property_description": "string or null",
-            "broker": "string or null",
-            "broker_url": "string or null",
-            "broker_phone": "string or null",
-            "broker_email": "string or null",
-            "broker_address": "string or null"
-        }}
+        {json_format}
         
         Important Notes:
         1. Return ONLY the JSON object, no other text or explanation
@@ -178,21 +353,66 @@ async def extract_structured_data(key: str):
 
     chain = prompt | llm | JsonOutputParser()
 
-    # Create a semaphore to limit concurrency
-    semaphore = asyncio.Semaphore(10)
+    async def fetch(url):
+        return await fetch_page(
+            url,
+            playwright_browser,
+            url_index,
+            done_index,
+            http_fetcher=http_fetcher,
+            fetch_strategies=fetch_strategies,
+            limiter=fetch_limiter,
+        )
 
-    async def process_with_semaphore(url):
-        async with semaphore:
-            await process_single_url(url, playwright_browser, chain, key)
+    async def extract(snapshot):
+        await extract_page(
+            snapshot,
+            chain,
+            sink,
+            done_index,
+            stats,
+            focus_main=focus_main,
+            selector_cache=selector_cache,
+            llm_cache=llm_cache,
+            llm_limiter=llm_limiter,
+        )
 
+    fetch_limiter = fetch_limiter or default_fetch_limiter
+    llm_limiter = llm_limiter or default_llm_limiter
+    pipeline = FetchExtractPipeline(
+        fetch,
+        extract,
+        fetch_concurrency=fetch_concurrency,
+        extract_concurrency=extract_concurrency,
+        queue_size=queue_size,
+    )
+
+    sink = open_record_sink(f"output/{key}", shard=shard)
+    stats = ExtractionStats()
+    selector_cache = SelectorCache(f"output/{key}")
+    llm_cache = LLMCache(bypass=bypass_cache, network_fs=network_fs)
+    http_fetcher = HttpFetcher(limiter=fetch_limiter) if http_fetch else None
+    fetch_strategies = FetchStrategyStore(f"output/{key}")
     try:
-        # Create tasks for all URLs
-        tasks = [process_with_semaphore(url) for url in urls]
-        # Wait for all tasks to complete
-        await asyncio.gather(*tasks)
+        if http_fetcher:
+            await http_fetcher.start()
+        await pipeline.run(urls)
     finally:
         # Close browser
         await playwright_browser.close()
+        if http_fetcher:
+            await http_fetcher.close()
+        sink.close()
+        stats.save(f"output/{key}")
+        pipeline.log_summary()
+        fetch_strategies.log_summary()
+        fetch_limiter.log_summary()
+        llm_limiter.log_summary()
+        selector_cache.save()
+        llm_cache.log_summary()
+        llm_cache.close()
+        # Keep extracted_data.json in the JSON array format read downstream
+        export_json_array(f"output/{key}")
 
 
 def main():
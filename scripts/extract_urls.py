@@ -1,10 +1,12 @@
 import asyncio
 import json
 import logging
+from typing import Optional
 
 from lib.browser_automation import BrowserAutomation
 from lib.file_utils import create_nested_directory
-from lib.playwright_browser_manager import PlaywrightBrowserManager
+from lib.playwright_browser_manager import BrowserPool
+from lib.request_interception import LIGHTWEIGHT_CONTEXT_OPTIONS
 from lib.schema import WebSearchSchema
 
 # Configure logging
@@ -14,20 +16,30 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-async def extract_urls(key: str):
+async def extract_urls(
+    key: str,
+    browser_pool: Optional[BrowserPool] = None,
+    incremental: bool = False,
+):
     web_search_schema = json.load(open(f"output/{key}/web_search_schema.json"))
     web_search_schema = WebSearchSchema(**web_search_schema)
     logger.info(f"web_search_schema : {web_search_schema}")
 
+    # Without a shared pool, use a single-browser pool that is shut down afterwards
+    owns_pool = browser_pool is None
+    if owns_pool:
+        browser_pool = BrowserPool(size=1, headless=False)
+
     try:
-        automation = BrowserAutomation(
-            browser=await PlaywrightBrowserManager().setup_browser(
-                headless=False,
-            ),
-            schema=web_search_schema,
-            output_path=f"output/{key}",
-        )
-        await automation.execute()
+        async with browser_pool.context(**LIGHTWEIGHT_CONTEXT_OPTIONS) as context:
+            automation = BrowserAutomation(
+                browser=None,
+                schema=web_search_schema,
+                output_path=f"output/{key}",
+                context=context,
+                incremental=incremental,
+            )
+            await automation.execute()
 
         return {
             "status": "success",
@@ -46,6 +58,8 @@ async def extract_urls(key: str):
             },
         }
     finally:
+        if owns_pool:
+            await browser_pool.close()
         logger.info("Extraction completed")
 
 
@@ -0,0 +1,223 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import time
+from typing import Iterable, Optional
+
+from lib.file_utils import create_nested_directory
+from lib.playwright_browser_manager import BrowserPool
+from lib.schema_health import clear_health, is_broken
+from lib.work_queue import (
+    DEFAULT_QUEUE_PATH,
+    EXTRACT,
+    SCHEMA,
+    STAGES,
+    URLS,
+    Task,
+    WorkQueue,
+)
+from scripts.create_web_search_schema import generate_search_page_schema
+from scripts.extract_structured_data import extract_structured_data
+from scripts.extract_urls import extract_urls
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+BROKER_WEBSITES_FILE = "output/extracted_broker_websites.json"
+# Wait between heartbeats that failed, e.g. on a locked or unreachable queue
+HEARTBEAT_RETRY_SECONDS = 10.0
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def seed_queue(
+    queue: WorkQueue,
+    brokers_file: str = BROKER_WEBSITES_FILE,
+    stage: str = SCHEMA,
+    requeue: bool = False,
+) -> int:
+    """Queue ``stage`` for every broker in ``brokers_file`` and return how many."""
+    with open(brokers_file, "r") as f:
+        brokers = json.load(f)
+    queued = 0
+    for broker in brokers:
+        payload = {"url": broker["url"]}
+        queued += queue.enqueue(stage, broker["key"], payload, requeue=requeue)
+    logger.info(f"Queued {queued} of {len(brokers)} brokers for {stage}")
+    return queued
+
+
+async def run_task(
+    task: Task,
+    browser_pool: BrowserPool,
+    incremental: bool,
+    network_fs: bool = False,
+) -> None:
+    """Run one pipeline stage for one key; raises when the stage failed."""
+    key = task.key
+    if task.stage == SCHEMA:
+        if not os.path.exists(f"output/{key}/web_search_schema.json"):
+            create_nested_directory(f"output/{key}")
+            await generate_search_page_schema(
+                key, task.payload["url"], network_fs=network_fs
+            )
+        elif is_broken(f"output/{key}"):
+            await generate_search_page_schema(
+                key, task.payload["url"], bypass_cache=True, network_fs=network_fs
+            )
+            clear_health(f"output/{key}")
+    elif task.stage == URLS:
+        result = await extract_urls(
+            key, browser_pool=browser_pool, incremental=incremental
+        )
+        if result["status"] != "success":
+            raise Exception(result["metadata"].get("error", "URL extraction failed"))
+    elif task.stage == EXTRACT:
+        # Each worker appends to its own shard of the record store
+        await extract_structured_data(
+            key, shard=task.lease_owner, network_fs=network_fs
+        )
+    else:
+        raise ValueError(f"Unknown stage {task.stage}")
+
+
+async def _keep_lease(
+    queue: WorkQueue, task: Task, running: asyncio.Task, lost: asyncio.Event
+) -> None:
+    """Renew the lease of ``task`` and cancel ``running`` once it is lost."""
+    interval = queue.lease_seconds / 3
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            held = queue.heartbeat(task)
+        except Exception as e:
+            # "database is locked" or an I/O error on a network filesystem; the
+            # lease is still ours until it expires
+            logger.warning(
+                f"Could not renew the lease of {task.stage}:{task.key}: {e!s}"
+            )
+            if time.time() < task.lease_expires:
+                interval = min(HEARTBEAT_RETRY_SECONDS, queue.lease_seconds / 3)
+                continue
+            held = False
+        if not held:
+            # Another worker may already be running the key; stop writing its files
+            logger.warning(f"Lost the lease of {task.stage}:{task.key}, cancelling")
+            lost.set()
+            running.cancel()
+            return
+        interval = queue.lease_seconds / 3
+
+
+async def run_worker(
+    queue_path: str = DEFAULT_QUEUE_PATH,
+    concurrency: int = 4,
+    stages: Optional[Iterable[str]] = None,
+    worker_id: Optional[str] = None,
+    until_empty: bool = False,
+    poll_interval: float = 5.0,
+    pool_size: int = 2,
+    incremental: bool = False,
+    network_fs: bool = False,
+) -> None:
+    """
+    Pull tasks from the work queue and run them, ``concurrency`` at a time.
+
+    Stages of different keys run side by side, and a finished stage queues the
+    next one for its key. Leases are renewed while a task runs, so a worker
+    that dies only delays its tasks until the lease expires. With
+    ``until_empty`` the worker exits once nothing is pending or in flight.
+    """
+    queue = WorkQueue(queue_path, network_fs=network_fs)
+    worker_id = worker_id or default_worker_id()
+    stages = list(stages or STAGES)
+    logger.info(f"Worker {worker_id} started for stages {', '.join(stages)}")
+
+    async def slot(browser_pool: BrowserPool):
+        while True:
+            task = queue.claim(worker_id, stages)
+            if task is None:
+                if until_empty and queue.unfinished() == 0:
+                    return
+                await asyncio.sleep(poll_interval)
+                continue
+
+            logger.info(f"Running {task.stage}:{task.key} (attempt {task.attempts})")
+            running = asyncio.create_task(
+                run_task(task, browser_pool, incremental, network_fs)
+            )
+            lost = asyncio.Event()
+            lease = asyncio.create_task(_keep_lease(queue, task, running, lost))
+            try:
+                await running
+                queue.complete(task)
+            except asyncio.CancelledError:
+                # Anything but a lost lease, e.g. the worker shutting down
+                if not lost.is_set():
+                    raise
+                # The lease was lost and the task cancelled; its new owner runs it
+            except Exception as e:
+                logger.error(f"Task {task.stage}:{task.key} failed: {e!s}")
+                queue.fail(task, str(e))
+            finally:
+                lease.cancel()
+
+    try:
+        async with BrowserPool(size=pool_size, headless=False) as browser_pool:
+            await asyncio.gather(*(slot(browser_pool) for _ in range(concurrency)))
+    finally:
+        queue.log_summary()
+        queue.close()
+
+
+def _worker_process(kwargs: dict) -> None:
+    asyncio.run(run_worker(**kwargs))
+
+
+def run_worker_processes(processes: int, **kwargs) -> None:
+    """
+    Run ``processes`` workers, each with its own event loop and browser pool.
+
+    Python-side parsing and validation then use one core per worker instead of
+    sharing the main process. Workers coordinate only through the work queue,
+    so the same command can also run on other hosts sharing ``output/``.
+    """
+    if processes <= 1:
+        asyncio.run(run_worker(**kwargs))
+        return
+
+    # Spawned workers start clean instead of inheriting a forked event loop
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(
+            target=_worker_process, args=(kwargs,), name=f"queue-worker-{index}"
+        )
+        for index in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+        raise
+    failed = [worker.name for worker in workers if worker.exitcode]
+    if failed:
+        logger.error(f"Workers exited with errors: {', '.join(failed)}")
+
+
+def main():
+    asyncio.run(run_worker(until_empty=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the adaptive per-domain limits
+"""
+
+import asyncio
+
+from lib.adaptive_limiter import AdaptiveLimiter
+
+URL = "https://www.example.com/listing"
+
+
+async def _fetch(limiter: AdaptiveLimiter, seconds: float, channel: str) -> None:
+    async with limiter.slot(URL, channel=channel):
+        await asyncio.sleep(seconds)
+
+
+def test_adaptive_limiter():
+    """Test that slower requests do not collapse the limit as latency spikes"""
+
+    async def run():
+        # HTTP probes and browser renders of one domain, interleaved
+        limiter = AdaptiveLimiter("fetch")
+        for _ in range(12):
+            await _fetch(limiter, 0.01, "http")
+            await _fetch(limiter, 0.1, "browser")
+        metrics = limiter.metrics()
+        assert metrics["www.example.com [http]"]["decreases"] == 0, metrics
+        assert metrics["www.example.com [browser]"]["decreases"] == 0, metrics
+        assert metrics["www.example.com [browser]"]["limit"] > 2.0, metrics
+
+        # Pages of the domain get heavier for good: the baseline follows
+        limiter = AdaptiveLimiter("fetch")
+        for _ in range(10):
+            await _fetch(limiter, 0.01, "browser")
+        for _ in range(20):
+            await _fetch(limiter, 0.05, "browser")
+        decreases = limiter.metrics()["www.example.com [browser]"]["decreases"]
+        for _ in range(10):
+            await _fetch(limiter, 0.05, "browser")
+        metrics = limiter.metrics()["www.example.com [browser]"]
+        assert metrics["decreases"] == decreases, metrics
+        assert metrics["limit"] > 1.0, metrics
+
+    asyncio.run(run())
+
+    print("✅ Adaptive limiter tests completed!")
+
+
+if __name__ == "__main__":
+    test_adaptive_limiter()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Test script to verify batched normalization against process_record
+"""
+
+from lib.batch_normalizer import ColumnBatch, normalize_batch, parse_price, parse_sqft
+from merge_to_csv import process_record
+
+
+def test_batch_normalizer():
+    """Test that column batches normalize like process_record"""
+
+    records = [
+        {
+            "address": "1 Main St",
+            "price": 250000.0,
+            "property_image_urls": ["/a.jpg", "//cdn.example.com/b.jpg", "c/d.jpg"],
+            "brochure_doc_urls": ["/docs/../flyer.pdf"],
+            "source_url": "https://www.example.com/listing/1?ref=x",
+        },
+        {"address": "", "source_url": "https://www.example.com/listing/2"},
+        {
+            "address": "3 Main St",
+            "property_image_urls": [],
+            "source_url": "http://other.com:8080/3",
+        },
+        {"address": "4 Main St", "brochure_doc_urls": ["https://x.com/f.pdf"]},
+    ]
+
+    normalized = normalize_batch(ColumnBatch.from_records(records))
+    expected = [process_record(record) for record in records]
+    expected = [record for record in expected if record]
+    assert len(normalized) == len(expected) == 3
+
+    for index, record in enumerate(expected):
+        for name, value in record.items():
+            actual = normalized.column(name)[index]
+            if isinstance(actual, list):
+                actual = "\n".join(actual)
+            assert actual == value, (name, actual, value)
+
+    assert parse_price("$1.2M") == 1200000.0
+    assert parse_price("$1,250,000 - $1.5M") == 1250000.0
+    assert parse_price("Call for pricing") is None
+    assert parse_sqft("12,500 SF") == 12500.0
+    assert parse_sqft("2 acres") == 87120.0
+    assert parse_sqft("100 m2") == 1076.39
+
+    print("✅ Batch normalizer tests completed!")
+
+
+if __name__ == "__main__":
+    test_batch_normalizer()
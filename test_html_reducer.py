@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Test script to verify page HTML reduction
+"""
+
+from lib.html_reducer import reduce_html
+
+
+def test_html_reducer():
+    """Test that banners are dropped without dropping the page around them"""
+
+    html = """
+    <html>
+      <body class="home cookie-consent-shown">
+        <nav>Buy Lease Contact</nav>
+        <main id="newsletter-wrapper">
+          <h1>123 Main St</h1>
+          <img src="/a.jpg" class="photo">
+          <script>track()</script>
+        </main>
+        <div id="onetrust-consent-sdk"><p>We use cookies</p></div>
+        <div class="cookie-banner">Accept all</div>
+        <div role="dialog" class="modal" id="gdpr-preferences">Preferences</div>
+        <div style="position: fixed" class="newsletter">Subscribe</div>
+        <div role="dialog" class="gallery">Photo 1 of 12</div>
+      </body>
+    </html>
+    """
+    reduced = reduce_html(html)
+    # A banner class on body or main describes page state, not a banner
+    assert "123 Main St" in reduced
+    assert '<img src="/a.jpg">' in reduced
+    assert "Photo 1 of 12" in reduced
+    for dropped in (
+        "Buy Lease",
+        "track()",
+        "We use cookies",
+        "Accept all",
+        "Preferences",
+        "Subscribe",
+    ):
+        assert dropped not in reduced, dropped
+
+    assert reduce_html(html, focus_main=True).startswith("123 Main St")
+
+    print("✅ HTML reducer tests completed!")
+
+
+if __name__ == "__main__":
+    test_html_reducer()
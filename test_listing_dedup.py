@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Test script to verify cross-broker listing deduplication
+"""
+
+import json
+import os
+import tempfile
+
+from lib.listing_dedup import ListingDeduplicator, normalize_address
+
+
+def test_listing_dedup():
+    """Test address, image and url blocking and the merged records"""
+
+    assert (
+        normalize_address("123 North Main Street, Suite 200, Austin TX")
+        == "123 n main st ste 200"
+    )
+    assert normalize_address("123 N. Main St. #200") == "123 n main st ste 200"
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        data = {
+            "cbre": [
+                {
+                    "address": "123 North Main Street",
+                    "zip": "78701",
+                    "price": 1000000.0,
+                    "property_image_urls": ["https://cdn.example.com/a.jpg"],
+                    "source_url": "https://cbre.com/p/1",
+                },
+                {
+                    "address": "500 Elm Ave",
+                    "zip": "78702",
+                    "property_image_urls": ["https://cdn.example.com/logo.png"],
+                    "source_url": "https://cbre.com/p/2",
+                },
+                {
+                    "address": "123 N Main St",
+                    "zip": "78701",
+                    "source_url": "https://cbre.com/p/1?utm_source=x",
+                },
+            ],
+            "colliers": [
+                {
+                    "address": "123 N Main St, Austin, TX 78701",
+                    "sqft": 5000.0,
+                    "property_image_urls": ["https://cdn.example.com/b.jpg"],
+                    "source_url": "https://colliers.com/l/9",
+                },
+                {
+                    "address": "9 Oak Road",
+                    "city": "Dallas",
+                    "state": "TX",
+                    "property_image_urls": ["http://cdn.example.com/a.jpg?w=800"],
+                    "source_url": "https://colliers.com/l/10",
+                },
+                {"address": "", "source_url": "https://colliers.com/l/11"},
+            ],
+            "jll": [
+                {
+                    "address": "77 Pine St",
+                    "zip": "10005",
+                    "property_image_urls": ["https://cdn.example.com/logo.png"],
+                    "source_url": "https://jll.com/x",
+                },
+                {
+                    "address": "123 Main St",
+                    "zip": "78701",
+                    "property_image_urls": ["https://cdn.example.com/b.jpg"],
+                    "source_url": "https://jll.com/y",
+                },
+            ],
+        }
+        sources = []
+        for key, records in data.items():
+            os.makedirs(os.path.join(output_dir, key))
+            path = os.path.join(output_dir, key, "extracted_data.json")
+            with open(path, "w") as f:
+                json.dump(records, f)
+            sources.append((key, path))
+
+        deduplicator = ListingDeduplicator(sources, max_image_block=1)
+        merged = list(deduplicator.iter_merged(records_per_bucket=2))
+        # Every shared image is above max_image_block
+        assert deduplicator.stats == {"records": 7, "url": 1, "address": 1, "image": 0}
+        assert len(merged) == 5
+
+        deduplicator = ListingDeduplicator(sources)
+        merged = {record["address"]: record for record in deduplicator.iter_merged()}
+        # Only "123 Main St" shares an image from the same zip and street number;
+        # the logo (Austin and New York) and a.jpg (Austin and Dallas) do not merge
+        assert deduplicator.stats["image"] == 1
+        assert sorted(merged) == [
+            "123 North Main Street",
+            "500 Elm Ave",
+            "77 Pine St",
+            "9 Oak Road",
+        ]
+        main_st = merged["123 North Main Street"]
+        assert main_st["price"] == 1000000.0 and main_st["sqft"] == 5000.0
+        assert [source["key"] for source in main_st["sources"]] == [
+            "cbre",
+            "cbre",
+            "colliers",
+            "jll",
+        ]
+        assert len(main_st["property_image_urls"]) == 2
+
+    print("✅ Listing deduplication tests completed!")
+
+
+if __name__ == "__main__":
+    test_listing_dedup()
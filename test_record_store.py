@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the append-only record store
+"""
+
+import json
+import os
+import tempfile
+
+from lib.record_store import export_json_array, iter_records, open_record_sink
+
+
+def test_record_store():
+    """Test appending, legacy import and JSON array export"""
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        legacy = [{"address": "1 Main St", "source_url": "https://example.com/a"}]
+        with open(os.path.join(output_dir, "extracted_data.json"), "w") as f:
+            json.dump(legacy, f)
+
+        with open_record_sink(output_dir) as sink:
+            sink.append({"address": "2 Main St", "source_url": "https://example.com/b"})
+            sink.append(
+                {"address": "1 Main Street", "source_url": "https://example.com/a"}
+            )
+
+        records = list(iter_records(output_dir))
+        assert [r["address"] for r in records] == [
+            "1 Main St",
+            "2 Main St",
+            "1 Main Street",
+        ]
+
+        assert export_json_array(output_dir) == 2
+        with open(os.path.join(output_dir, "extracted_data.json")) as f:
+            exported = json.load(f)
+        assert [r["address"] for r in exported] == ["2 Main St", "1 Main Street"]
+
+        # Reopening must not import the legacy array a second time
+        with open_record_sink(output_dir):
+            pass
+        assert len(list(iter_records(output_dir))) == 3
+
+        # Worker shards are merged, keeping the most recently extracted record
+        with open_record_sink(output_dir, shard="host-1") as sink:
+            sink.append(
+                {
+                    "address": "2 Main Street",
+                    "source_url": "https://example.com/b",
+                    "extracted_at": "2025-01-02T00:00:00",
+                }
+            )
+        with open_record_sink(output_dir, shard="host-2") as sink:
+            sink.append(
+                {
+                    "address": "2 Main",
+                    "source_url": "https://example.com/b",
+                    "extracted_at": "2025-01-01T00:00:00",
+                }
+            )
+        assert len(list(iter_records(output_dir))) == 5
+        assert export_json_array(output_dir) == 2
+        with open(os.path.join(output_dir, "extracted_data.json")) as f:
+            exported = json.load(f)
+        assert sorted(r["address"] for r in exported) == [
+            "1 Main Street",
+            "2 Main Street",
+        ]
+
+    print("✅ Record store tests completed!")
+
+
+if __name__ == "__main__":
+    test_record_store()
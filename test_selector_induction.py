@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Test script to verify selectors learned from LLM extractions
+"""
+
+import tempfile
+
+from lib.selector_induction import SelectorCache
+
+
+def _page(number: int) -> str:
+    return f"""
+    <html>
+      <body>
+        <div class="listing">
+          <h1 class="address">{number} Main St</h1>
+          <span class="price">${number},000</span>
+          <p class="description">Office space number {number}</p>
+        </div>
+      </body>
+    </html>
+    """
+
+
+def _llm_result(number: int, description: str) -> dict:
+    return {
+        "address": f"{number} Main St",
+        "price": number * 1000.0,
+        "property_description": description,
+    }
+
+
+def test_selector_induction():
+    """Test that only fields the LLM usually finds keep pages on the LLM"""
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        cache = SelectorCache(output_dir)
+
+        # An email on one page in ten is optional and has no selector
+        url = "https://www.cbre.com/listing/{}"
+        for number in range(1, 11):
+            result = _llm_result(number, f"Office space number {number}")
+            if number == 3:
+                result["broker_email"] = "jane@cbre.com"
+            cache.observe(url.format(number), _page(number), result)
+
+        assert cache.should_parse(url.format(11))
+        assert cache.uncovered(url.format(11)) == []
+        assert cache.extract(url.format(11), _page(11)) == {
+            "address": "11 Main St",
+            "price": 11000.0,
+            "property_description": "Office space number 11",
+        }
+
+        # A description the LLM paraphrases on every page has no selector
+        url = "https://www.jll.com/listing/{}"
+        for number in range(1, 11):
+            result = _llm_result(number, f"A bright office, listing {number}")
+            cache.observe(url.format(number), _page(number), result)
+
+        assert cache.should_parse(url.format(11))
+        assert cache.uncovered(url.format(11)) == ["property_description"]
+
+    print("✅ Selector induction tests completed!")
+
+
+if __name__ == "__main__":
+    test_selector_induction()
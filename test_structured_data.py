@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Test script to verify reading listing fields from page markup
+"""
+
+from lib.structured_data import extract_structured_markup
+
+
+def test_structured_data():
+    """Test that microdata outside the listing item is ignored"""
+
+    html = """
+    <html>
+      <body>
+        <div itemscope itemtype="https://schema.org/Product">
+          <h1 itemprop="name">Main Street Offices</h1>
+          <div itemprop="address" itemscope itemtype="https://schema.org/PostalAddress">
+            <span itemprop="streetAddress">123 Main St</span>
+            <span itemprop="addressLocality">Austin</span>
+          </div>
+          <div itemprop="offers" itemscope itemtype="https://schema.org/Offer">
+            <meta itemprop="price" content="1200000">
+            <div itemprop="seller" itemscope itemtype="https://schema.org/Organization">
+              <span itemprop="telephone">555-0100</span>
+            </div>
+          </div>
+          <img itemprop="image" src="https://cdn.example.com/a.jpg">
+        </div>
+        <footer itemscope itemtype="https://schema.org/Organization">
+          <div itemprop="address" itemscope itemtype="https://schema.org/PostalAddress">
+            <span itemprop="streetAddress">1 Corporate Plaza</span>
+            <span itemprop="postalCode">10001</span>
+          </div>
+          <span itemprop="email">info@broker.example.com</span>
+        </footer>
+        <span itemprop="addressRegion">NY</span>
+      </body>
+    </html>
+    """
+    extraction = extract_structured_markup(html)
+    assert extraction.fields == {
+        "address": "123 Main St",
+        "city": "Austin",
+        "price": 1200000.0,
+        "property_image_urls": ["https://cdn.example.com/a.jpg"],
+    }, extraction.fields
+
+    # Fields the markup lacks are still left for the LLM
+    missing = extraction.missing()
+    assert "address" not in missing
+    for field in ("zip", "beds", "baths", "property_type", "broker_email"):
+        assert field in missing, field
+
+    print("✅ Structured data tests completed!")
+
+
+if __name__ == "__main__":
+    test_structured_data()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Test script to verify URL canonicalization
+"""
+
+import tempfile
+
+from lib.url_canonicalizer import (
+    CanonicalUrlIndex,
+    DomainRule,
+    canonicalize_url,
+    is_plausible_canonical,
+)
+
+
+def test_url_canonicalization():
+    """Test canonical forms of common listing URL variants"""
+
+    assert (
+        canonicalize_url(
+            " HTTPS://Example.com:443/listing/42/?utm_source=x&b=2&a=1&gclid=y#photos \n"
+        )
+        == "https://example.com/listing/42?a=1&b=2"
+    )
+    assert (
+        canonicalize_url("https://example.com/listing;jsessionid=ABC?id=7")
+        == "https://example.com/listing?id=7"
+    )
+    # Per-domain rule: cbre detail pages never need a query string
+    assert (
+        canonicalize_url("https://www.cbre.com/properties/details/US-1/a?x=1")
+        == "https://www.cbre.com/properties/details/US-1/a"
+    )
+    # Short names may identify the listing unless a domain rule strips them
+    assert (
+        canonicalize_url("https://example.com/listing?ref=42&sid=7")
+        == "https://example.com/listing?ref=42&sid=7"
+    )
+    rules = {"example.com": DomainRule(strip_params=("ref", "sid"))}
+    assert (
+        canonicalize_url("https://www.example.com/listing?ref=home&sid=9&id=4", rules)
+        == "https://www.example.com/listing?id=4"
+    )
+
+    assert is_plausible_canonical(
+        "https://www.example.com/a?x=1", "https://example.com/a"
+    )
+    assert not is_plausible_canonical("https://example.com/a", "https://example.com/")
+    assert not is_plausible_canonical("https://example.com/a", "https://other.com/a")
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        index = CanonicalUrlIndex(output_dir)
+        index.record_alias("https://example.com/a?variant=2", "https://example.com/a")
+        reloaded = CanonicalUrlIndex(output_dir)
+        assert reloaded.canonical("https://example.com/a?variant=2#top") == (
+            "https://example.com/a"
+        )
+
+    print("✅ URL canonicalization tests completed!")
+
+
+if __name__ == "__main__":
+    test_url_canonicalization()